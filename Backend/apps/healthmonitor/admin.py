@@ -1,5 +1,243 @@
-from django.contrib import admin
-from .models import Patient, Measurement, Prediction
-admin.site.register(Patient)
-admin.site.register(Measurement)
-admin.site.register(Prediction)
+"""
+Admin for healthmonitor data, built to stay responsive with millions of rows:
+changelists never run COUNT(*) over a whole table (EstimatedCountPaginator),
+list one shard at a time (ShardFilter, defaulting to the first shard),
+related rows are joined instead of fetched per row, foreign keys use raw id
+inputs, and filters only offer indexed columns with fixed choices.
+"""
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from core.sharding import current_shard, fan_out, shard_aliases, sharding_enabled, use_shard
+from . import recent
+from .ingest import rescore_measurements
+from .models import Patient, Measurement, Prediction, PatientRiskState, ShardAssignment
+
+# below this many rows an exact COUNT(*) is cheap enough
+EXACT_COUNT_LIMIT = 10000
+# filtered changelists count at most this many matches
+FILTERED_COUNT_CAP = 100000
+RISK_LABELS = ('low', 'medium', 'high', 'invalid')
+
+
+def estimated_row_count(model, using):
+    """The planner's row estimate for `model`'s table, or None where the backend keeps none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Unfiltered changelists use the table statistics once they exceed EXACT_COUNT_LIMIT;
+    filtered ones count at most FILTERED_COUNT_CAP matches.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not qs.query.where:
+            estimate = estimated_row_count(qs.model, qs.db)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+            return qs.count()
+        return qs.order_by().values('pk')[:FILTERED_COUNT_CAP].count()
+
+
+def selected_shard(request):
+    """Shard the changelist reads from: the ?shard= choice, else the first configured alias."""
+    alias = request.GET.get(ShardFilter.parameter_name)
+    return alias if alias in shard_aliases() else shard_aliases()[0]
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    Pick the shard the changelist reads from (applied in ShardedModelAdmin.get_queryset).
+    A changelist shows one shard at a time, so there is no "All" choice and the first
+    shard is selected until another one is picked.
+    """
+    title = 'shard (lists one shard at a time)'
+    parameter_name = 'shard'
+
+    def __init__(self, request, params, model, model_admin):
+        self.selected = selected_shard(request)
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()]
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': lookup == self.selected,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset
+
+
+class RiskLabelFilter(admin.SimpleListFilter):
+    """Fixed choices, so rendering the filter does not scan for distinct labels."""
+    title = 'risk label'
+    parameter_name = 'risk_label'
+    field_path = 'risk_label'
+
+    def lookups(self, request, model_admin):
+        return [(label, label) for label in RISK_LABELS]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field_path: self.value()})
+        return queryset
+
+
+class MeasurementRiskLabelFilter(RiskLabelFilter):
+    field_path = 'prediction__risk_label'
+
+
+class ShardedModelAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER  # facet counts are a COUNT(*) per filter choice
+    ordering = ('-id',)
+
+    def get_list_filter(self, request):
+        filters = super().get_list_filter(request)
+        return (ShardFilter, *filters) if sharding_enabled() else filters
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if not sharding_enabled() or current_shard() is not None:
+            return qs  # inside get_object's fan_out, which already picked the shard
+        return qs.using(selected_shard(request))
+
+    def get_object(self, request, object_id, from_field=None):
+        if not sharding_enabled():
+            return super().get_object(request, object_id, from_field)
+        # ids are unique across shards; look on all of them in parallel
+        found = fan_out(lambda alias: super(ShardedModelAdmin, self).get_object(request, object_id, from_field))
+        return next((obj for obj in found.values() if obj is not None), None)
+
+
+class ReadingAdmin(ShardedModelAdmin):
+    """
+    Admin for a patient's readings. Edits and deletes update the patient the way the API
+    views do: the risk state is recomputed, data_modified_at moves (so clients holding an
+    ETag / Last-Modified get the new data instead of a 304) and the patient's readings are
+    dropped from the vitals ring (reloaded from the database on the next read).
+    """
+    patient_path = 'patient'
+
+    def readings_changed(self, db, patient_ids):
+        with use_shard(db):
+            for patient in Patient.all_objects.filter(pk__in=patient_ids):
+                PatientRiskState.refresh(patient)
+            Patient.touch(patient_ids)
+        for patient_id in patient_ids:
+            recent.forget(patient_id)
+
+    def patient_ids(self, queryset):
+        return set(queryset.values_list(self.patient_path, flat=True))
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        db = obj._state.db
+        self.readings_changed(db, self.patient_ids(self.model._base_manager.using(db).filter(pk=obj.pk)))
+
+    def delete_model(self, request, obj):
+        db = obj._state.db
+        patient_ids = self.patient_ids(self.model._base_manager.using(db).filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        self.readings_changed(db, patient_ids)
+
+    def delete_queryset(self, request, queryset):
+        patient_ids = self.patient_ids(queryset)
+        super().delete_queryset(request, queryset)
+        self.readings_changed(queryset.db, patient_ids)
+
+
+@admin.register(Patient)
+class PatientAdmin(ShardedModelAdmin):
+    # user_id rather than user: users live on default, patients possibly on another shard
+    list_display = ('id', 'full_name', 'user_id', 'dob', 'data_modified_at')
+    search_fields = ('full_name',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('deleted_at', 'data_modified_at')
+
+    def save_model(self, request, obj, form, change):
+        obj.data_modified_at = timezone.now()
+        super().save_model(request, obj, form, change)
+        recent.forget(obj.pk)  # the ring checks ownership against the user it was filled for
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        for patient in queryset:
+            patient.soft_delete()
+
+    def get_deleted_objects(self, objs, request):
+        # deletion is soft and the data is purged in the background, so skip the
+        # collector that would load every measurement to list it
+        return [str(obj) for obj in objs], {}, set(), []
+
+
+@admin.register(Measurement)
+class MeasurementAdmin(ReadingAdmin):
+    list_display = ('id', 'patient', 'timestamp', 'heart_rate', 'spo2', 'systolic', 'diastolic',
+                    'respiratory_rate', 'temperature', 'risk')
+    list_select_related = ('patient', 'prediction')
+    list_filter = (MeasurementRiskLabelFilter,)
+    raw_id_fields = ('patient',)
+    date_hierarchy = 'timestamp'
+    actions = ('rescore_selected',)
+
+    @admin.display(description='risk', ordering='prediction__risk_score')
+    def risk(self, obj):
+        prediction = getattr(obj, 'prediction', None)
+        return f'{prediction.risk_label} ({prediction.risk_score})' if prediction else '-'
+
+    @admin.action(description='Re-score selected measurements with the current model')
+    def rescore_selected(self, request, queryset):
+        rescored, changed = rescore_measurements(queryset)
+        self.message_user(request, f'Re-scored {rescored} measurements; {changed} labels changed.', messages.SUCCESS)
+
+
+@admin.register(Prediction)
+class PredictionAdmin(ReadingAdmin):
+    patient_path = 'measurement__patient'
+    list_display = ('id', 'measurement', 'risk_label', 'risk_score', 'created_at')
+    list_select_related = ('measurement__patient',)
+    list_filter = (RiskLabelFilter,)
+    raw_id_fields = ('measurement',)
+    actions = ('rescore_selected',)
+
+    @admin.action(description='Re-score the measurements of selected predictions')
+    def rescore_selected(self, request, queryset):
+        measurements = Measurement.objects.using(queryset.db).filter(
+            id__in=queryset.values('measurement_id'))
+        rescored, changed = rescore_measurements(measurements)
+        self.message_user(request, f'Re-scored {rescored} measurements; {changed} labels changed.', messages.SUCCESS)
+
+
+@admin.register(ShardAssignment)
+class ShardAssignmentAdmin(admin.ModelAdmin):
+    list_display = ('user', 'alias', 'locked', 'updated_at')
+    list_filter = ('alias', 'locked')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
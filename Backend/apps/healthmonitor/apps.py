@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class HealthMonitorConfig(AppConfig):
+    name = 'apps.healthmonitor'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registers the system checks)
@@ -0,0 +1,18 @@
+from django.core.checks import Tags, Warning, register
+
+from core.db_routers import cache_is_shared, replica_configured
+from core.sharding import sharding_enabled
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """The replica sticky window and the shard map only work across workers with a shared cache."""
+    if cache_is_shared() or not (replica_configured() or sharding_enabled()):
+        return []
+    return [Warning(
+        'A read replica or shards are configured, but the default cache is local to each process: '
+        'read-your-own-writes and shard moves are only seen by the worker that made them.',
+        hint='Set CACHE_BACKEND / CACHE_LOCATION to a shared cache (Redis, Memcached) when running '
+             'more than one worker process.',
+        id='healthmonitor.W001',
+    )]
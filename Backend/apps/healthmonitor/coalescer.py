@@ -0,0 +1,179 @@
+"""
+Group commit for single-reading ingest (INGEST_COALESCE).
+
+Request threads hand their validated reading to the process's IngestCoalescer
+and block. A background thread gathers submissions for up to
+INGEST_COALESCE_MAX_WAIT_MS after the first one, or until
+INGEST_COALESCE_MAX_BATCH are waiting, scores them with one
+HealthAI.predict_batch call, and stores them with one transaction per database
+(ingest.store_scored_group). It then wakes every request with its own
+measurement. If a group cannot be stored, its readings are retried one by one,
+so a bad row only fails its own request. A request waits at most
+INGEST_COALESCE_TIMEOUT_SECONDS for its group to be picked up (then it is
+withdrawn and answered 503) and as long again for it to be stored.
+
+Coalescing needs several requests in flight in the same process, so run
+threaded workers (e.g. gunicorn --threads) or ASGI; with one request per
+process it only adds the wait.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, router
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.ai_model import FEATURE_KEYS, HealthAI
+from .ingest import store_scored_group
+from .models import Measurement
+
+logger = logging.getLogger(__name__)
+
+
+class IngestTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The reading was not stored in time. Retry shortly.'
+    default_code = 'ingest_timeout'
+
+
+class _Submission:
+    __slots__ = ('db', 'patient', 'data', 'explain', 'done', 'measurement', 'explanation', 'error',
+                 'lock', 'state')
+
+    def __init__(self, db, patient, data, explain):
+        self.db, self.patient, self.data, self.explain = db, patient, data, explain
+        self.done = threading.Event()
+        self.measurement = self.explanation = self.error = None
+        self.lock = threading.Lock()
+        self.state = 'queued'  # -> 'claimed' by the collector, or 'withdrawn' by a request that gave up
+
+    def move(self, frm, to):
+        with self.lock:
+            if self.state != frm:
+                return False
+            self.state = to
+            return True
+
+
+class IngestCoalescer:
+    def __init__(self, max_batch=64, max_wait=0.005, timeout=10.0):
+        self.max_batch, self.max_wait, self.timeout = max_batch, max_wait, timeout
+        self.queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'groups': 0, 'measurements': 0, 'largest_group': 0, 'failed_groups': 0, 'timeouts': 0}
+
+    def submit(self, patient, validated_data, explain=False):
+        """
+        Stores one reading with the next group and returns (measurement, explanation):
+        the saved measurement with `prediction` attached, and its explanation when asked.
+        """
+        item = _Submission(router.db_for_write(Measurement, instance=patient), patient, validated_data, explain)
+        self._ensure_thread()
+        self.queue.put(item)
+        if not item.done.wait(self.timeout):
+            self.stats['timeouts'] += 1
+            if item.move('queued', 'withdrawn'):
+                raise IngestTimeout()
+            # already being stored; it cannot be withdrawn any more
+            if not item.done.wait(self.timeout):
+                raise IngestTimeout('Storing the reading is taking too long; it may still be saved.')
+        if item.error is not None:
+            raise item.error
+        return item.measurement, item.explanation
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='ingest-coalescer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            batch = [item for item in batch if item.move('queued', 'claimed')]
+            if not batch:
+                continue
+            try:
+                self._flush(batch)
+            except Exception as e:
+                logger.exception("Ingest group failed: %s", e)
+                for item in batch:
+                    if item.measurement is None and item.error is None:
+                        item.error = e
+            finally:
+                for item in batch:
+                    item.done.set()
+
+    def _flush(self, batch):
+        # this thread outlives requests, so it has to retire stale connections itself
+        close_old_connections()
+        X = np.array([[np.nan if item.data.get(k) is None else item.data[k] for k in FEATURE_KEYS]
+                      for item in batch], dtype=np.float64)
+        explain = any(item.explain for item in batch)
+        result = HealthAI().predict_batch(X, explain=explain)
+
+        groups = {}
+        for i, item in enumerate(batch):
+            groups.setdefault(item.db, []).append(i)
+        for db, rows in groups.items():
+            try:
+                self._store(db, [batch[i] for i in rows], result, rows)
+            except Exception as e:
+                self.stats['failed_groups'] += 1
+                logger.warning("Ingest group of %d on %s failed (%s); storing one by one", len(rows), db, e)
+                for i in rows:
+                    try:
+                        self._store(db, [batch[i]], result, [i])
+                    except Exception as e:
+                        batch[i].error = e
+        self.stats['groups'] += 1
+        self.stats['measurements'] += len(batch)
+        self.stats['largest_group'] = max(self.stats['largest_group'], len(batch))
+
+    @staticmethod
+    def _store(db, items, result, rows):
+        # fresh instances on every attempt: a rolled-back insert leaves ids behind on the old ones
+        measurements = [Measurement(patient=item.patient, **item.data) for item in items]
+        store_scored_group(db, measurements, {k: result[k][rows] for k in ('risk_score', 'risk_label')})
+        for item, m, i in zip(items, measurements, rows):
+            item.measurement = m
+            if item.explain:
+                item.explanation = HealthAI.explanation(result['baseline'], result['contributions'][i])
+
+
+_coalescers = {}
+_coalescers_lock = threading.Lock()
+
+
+def get_coalescer():
+    """This process's IngestCoalescer, or None when INGEST_COALESCE is off."""
+    if not getattr(settings, 'INGEST_COALESCE', False):
+        return None
+    # keyed by pid: the collector thread does not survive a fork
+    pid = os.getpid()
+    if pid not in _coalescers:
+        with _coalescers_lock:
+            if pid not in _coalescers:
+                _coalescers.clear()
+                _coalescers[pid] = IngestCoalescer(
+                    max_batch=settings.INGEST_COALESCE_MAX_BATCH,
+                    max_wait=settings.INGEST_COALESCE_MAX_WAIT_MS / 1000.0,
+                    timeout=settings.INGEST_COALESCE_TIMEOUT_SECONDS)
+    return _coalescers[pid]
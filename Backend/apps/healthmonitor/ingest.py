@@ -0,0 +1,195 @@
+"""
+Batch ingest helpers shared by the binary wire format and other bulk writers:
+vectorized validation against MeasurementSerializer's bounds, single-transaction
+inserts of measurements with their predictions (for one patient, or a group commit
+across patients), and batch re-scoring of stored ones.
+"""
+import numpy as np
+from django.db import connections, router, transaction
+from core.ai_model import FEATURE_KEYS, HealthAI
+from core.sharding import use_shard
+from .models import Patient, Measurement, Prediction, PatientRiskState
+from .serializers import MeasurementSerializer
+from . import recent
+
+OPTIONAL_FEATURES = ('respiratory_rate', 'temperature')
+INTEGER_FEATURES = ('systolic', 'diastolic')
+MAX_REPORTED_ERRORS = 20
+INSERT_BATCH_SIZE = 1000
+
+
+def serializer_bounds():
+    """(min, max) per vital taken from MeasurementSerializer, so both ingest paths agree."""
+    fields = MeasurementSerializer().fields
+    return {k: (fields[k].min_value, fields[k].max_value) for k in FEATURE_KEYS}
+
+
+def validate_vitals(X):
+    """
+    Validates an (n, 6) matrix in FEATURE_KEYS order (NaN = absent).
+    Returns a list of error messages (empty when every row is valid).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    errors = []
+    bad = np.zeros(len(X), dtype=bool)
+    for j, (k, (low, high)) in enumerate(zip(FEATURE_KEYS, serializer_bounds().values())):
+        col = X[:, j]
+        missing = np.isnan(col)
+        with np.errstate(invalid='ignore'):
+            out_of_range = ~missing & ((col < low) | (col > high))
+        checks = [(out_of_range, f'{k} must be between {low} and {high}.')]
+        if k not in OPTIONAL_FEATURES:
+            checks.append((missing, f'{k} is required.'))
+        if k in INTEGER_FEATURES:
+            checks.append((~missing & (col != np.round(col)), f'{k} must be an integer.'))
+        for mask, message in checks:
+            for i in np.flatnonzero(mask & ~bad)[:MAX_REPORTED_ERRORS - len(errors)]:
+                errors.append(f'record {i}: {message}')
+            bad |= mask
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                return errors
+    return errors
+
+
+def _mysql_id_step(connection):
+    """
+    Spacing of the ids one multi-row INSERT gets on MySQL, or None when they may not be
+    consecutive. InnoDB hands a statement with a known row count one consecutive block
+    (auto_increment_increment apart) only in the traditional (0) or consecutive (1)
+    innodb_autoinc_lock_mode; interleaved (2, MySQL 8's default) can split the block
+    between concurrent statements.
+    """
+    cached = getattr(connection, '_healthmonitor_id_step', False)
+    if cached is not False:
+        return cached
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment')
+        lock_mode, increment = cursor.fetchone()
+    step = int(increment) if int(lock_mode) <= 1 else None
+    connection._healthmonitor_id_step = step
+    return step
+
+
+def _bulk_insert_measurements(db, measurements):
+    """
+    Inserts unsaved measurements with multi-row INSERTs and sets their ids. Backends that
+    cannot return ids from a bulk insert (MySQL) recover them from LAST_INSERT_ID(), the
+    first id of the block, where the autoinc lock mode keeps the block consecutive.
+    """
+    connection = connections[db]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Measurement.objects.using(db).bulk_create(measurements, batch_size=INSERT_BATCH_SIZE)
+        return
+    step = _mysql_id_step(connection) if connection.vendor == 'mysql' else None
+    if step is None:
+        # ids of a bulk insert cannot be recovered; one INSERT per row, still in one transaction
+        for m in measurements:
+            m.save(using=db)
+        return
+    for start in range(0, len(measurements), INSERT_BATCH_SIZE):
+        batch = measurements[start:start + INSERT_BATCH_SIZE]
+        Measurement.objects.using(db).bulk_create(batch, batch_size=len(batch))  # one statement
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT LAST_INSERT_ID()')
+            first = cursor.fetchone()[0]
+        for i, m in enumerate(batch):
+            m.pk = first + i * step
+            m._state.adding, m._state.db = False, db
+
+
+def _insert_scored(db, measurements, result):
+    """Inserts unsaved measurements and one prediction each inside the caller's transaction."""
+    _bulk_insert_measurements(db, measurements)
+    predictions = [
+        Prediction(measurement=m, risk_score=float(score), risk_label=label)
+        for m, score, label in zip(measurements, result['risk_score'], result['risk_label'])
+    ]
+    Prediction.objects.using(db).bulk_create(predictions, batch_size=INSERT_BATCH_SIZE)
+    for m, p in zip(measurements, predictions):
+        m.prediction = p
+
+
+def store_scored_measurements(patient, X, result):
+    """
+    Inserts one Measurement + Prediction per row of X inside a single transaction and
+    advances the patient's risk state. `result` is the output of HealthAI.predict_batch.
+    Returns the list of created measurements (with `prediction` attached).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    db = router.db_for_write(Measurement, instance=patient)
+    measurements = [
+        Measurement(patient=patient, **{k: (None if np.isnan(v) else float(v)) for k, v in zip(FEATURE_KEYS, row)})
+        for row in X
+    ]
+    if not measurements:
+        return measurements
+    with transaction.atomic(using=db):
+        _insert_scored(db, measurements, result)
+        PatientRiskState.record(measurements[-1], measurements[-1].prediction)
+        Patient.touch([patient.pk])
+        recent.publish(patient, measurements)
+    return measurements
+
+
+def store_scored_group(db, measurements, result):
+    """
+    Group commit: inserts unsaved measurements of any number of patients on `db`, with
+    their predictions (`result` from HealthAI.predict_batch, row per measurement), in one
+    transaction and advances each patient's risk state to their newest reading.
+    """
+    with use_shard(db), transaction.atomic(using=db):
+        _insert_scored(db, measurements, result)
+        by_patient = {}
+        for m in measurements:
+            by_patient.setdefault(m.patient_id, []).append(m)
+        for patient_measurements in by_patient.values():
+            newest = patient_measurements[-1]
+            PatientRiskState.record(newest, newest.prediction)
+            recent.publish(newest.patient, patient_measurements)
+        Patient.touch(by_patient)
+    return measurements
+
+
+def rescore_measurements(queryset, batch_size=5000):
+    """
+    Re-runs batch inference over the measurements in `queryset` (keyset batches, one
+    transaction each), overwrites or creates their predictions and refreshes the risk
+    state of the affected patients. Returns (rescored, labels_changed).
+    """
+    ai = HealthAI(use_cache=False, monitor_drift=False)
+    db = queryset.db
+    rescored = changed = 0
+    patient_ids = set()
+    columns = ('id', 'patient_id', *FEATURE_KEYS, 'prediction__id', 'prediction__risk_label')
+    with use_shard(db):
+        last_id = None
+        while True:
+            batch = queryset.order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            rows = list(batch.values_list(*columns)[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            X = np.array([row[2:8] for row in rows], dtype=np.float64)  # None -> nan
+            result = ai.predict_batch(X)
+
+            updated, created = [], []
+            for row, score, label in zip(rows, result['risk_score'], result['risk_label']):
+                prediction_id, old_label = row[8], row[9]
+                if prediction_id is None:
+                    created.append(Prediction(measurement_id=row[0], risk_score=float(score), risk_label=label))
+                else:
+                    updated.append(Prediction(id=prediction_id, risk_score=float(score), risk_label=label))
+                    changed += label != old_label
+            with transaction.atomic(using=db):
+                Prediction.objects.using(db).bulk_update(updated, ['risk_score', 'risk_label'], batch_size=1000)
+                Prediction.objects.using(db).bulk_create(created, batch_size=1000)
+            rescored += len(rows)
+            patient_ids.update(row[1] for row in rows)
+
+        for patient in Patient.objects.using(db).filter(pk__in=patient_ids):
+            PatientRiskState.refresh(patient)
+            recent.forget(patient.pk)
+        Patient.touch(patient_ids)
+    return rescored, changed
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ai_model import drift_report
+
+
+class Command(BaseCommand):
+    help = 'Compare the live input distribution (merged drift snapshot) with the training reference (PSI / KS).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+        parser.add_argument('--reset', action='store_true', help='Start a new monitoring window after reporting')
+
+    def handle(self, *args, **options):
+        report = drift_report(reset=options['reset'])
+        if report is None:
+            raise CommandError('No drift reference found; run scripts/train_model.py to create drift_reference.npz.')
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{'feature':<18}{'psi':>8}{'ks':>8}{'ref median':>12}{'live median':>13}{'live n':>10}  status")
+        for feature, row in report['features'].items():
+            line = (f"{feature:<18}{row['psi']:>8.4f}{row['ks']:>8.4f}"
+                    f"{_fmt(row['reference_median']):>12}{_fmt(row['current_median']):>13}{row['current_count']:>10}  {row['status']}")
+            style = self.style.ERROR if row['status'] == 'significant' else (
+                self.style.WARNING if row['status'] == 'moderate' else (lambda s: s))
+            self.stdout.write(style(line))
+        if options['reset']:
+            self.stdout.write('Snapshot reset; a new monitoring window has started.')
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.1f}'
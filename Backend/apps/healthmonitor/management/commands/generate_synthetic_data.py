@@ -0,0 +1,286 @@
+import csv
+import os
+import tempfile
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.healthmonitor.ingest import serializer_bounds
+from apps.healthmonitor.models import Patient, Measurement, Prediction, PatientRiskState
+from core.ai_model import FEATURE_KEYS, FEATURE_RESOLUTION, HealthAI
+from core.sharding import SHARD_ID_STRIDE, next_shard_id, shard_for_user, sharding_enabled
+
+DATA_CSV = os.path.join(settings.BASE_DIR, 'data', 'medical_training_dataset_5000.csv')
+
+FIRST_NAMES = ['Ahmed', 'Sara', 'Omar', 'Mona', 'Youssef', 'Laila', 'Karim', 'Nour', 'Hassan', 'Salma',
+               'John', 'Maria', 'David', 'Emma', 'Ali', 'Fatma', 'Mostafa', 'Hana', 'Tarek', 'Dina']
+LAST_NAMES = ['Ali', 'Hassan', 'Ibrahim', 'Mahmoud', 'Saleh', 'Farouk', 'Nasser', 'Smith', 'Garcia', 'Khalil']
+
+
+class VitalsModel:
+    """
+    Generative model of vital-sign time series fitted to the training CSV:
+    correlated AR(1) noise around a per-patient baseline, plus deterioration
+    episodes that ramp the patient toward the dataset's high-risk profile.
+    """
+
+    def __init__(self, csv_path, rng, phi=0.9):
+        df = pd.read_csv(csv_path)
+        X = df[FEATURE_KEYS].to_numpy(dtype=np.float64)
+        self.mean = X.mean(axis=0)
+        self.cov = np.cov(X, rowvar=False)
+        top = X[df['risk_score'].to_numpy() >= np.quantile(df['risk_score'], 0.9)]
+        # direction in which vitals move as risk rises, scaled per episode severity
+        self.deterioration = top.mean(axis=0) - self.mean
+        self.chol = np.linalg.cholesky(self.cov + 1e-9 * np.eye(len(FEATURE_KEYS)))
+        self.rng = rng
+        self.phi = phi
+        bounds = serializer_bounds()
+        self.low = np.array([bounds[k][0] for k in FEATURE_KEYS])
+        self.high = np.array([bounds[k][1] for k in FEATURE_KEYS])
+        self.decimals = [FEATURE_RESOLUTION[k] for k in FEATURE_KEYS]
+
+    def sample(self, patients, readings, episode_rate):
+        """Returns an array of shape (patients, readings, 6) at device resolution."""
+        rng, F = self.rng, len(FEATURE_KEYS)
+        baseline = self.mean + 0.6 * rng.standard_normal((patients, F)) @ self.chol.T
+
+        # AR(1) within-patient noise with the fitted cross-feature correlation
+        innovations = 0.4 * np.sqrt(1 - self.phi ** 2) * (rng.standard_normal((patients, readings, F)) @ self.chol.T)
+        noise = np.empty_like(innovations)
+        noise[:, 0] = innovations[:, 0] / np.sqrt(1 - self.phi ** 2)
+        for t in range(1, readings):
+            noise[:, t] = self.phi * noise[:, t - 1] + innovations[:, t]
+
+        # deterioration episodes: linear ramp to a random severity, then partial recovery
+        weight = np.zeros((patients, readings))
+        sick = np.flatnonzero(rng.random(patients) < episode_rate)
+        t = np.arange(readings)
+        for p in sick:
+            start = rng.integers(0, readings)
+            ramp = max(1, int(rng.integers(readings // 50 + 1, readings // 10 + 2)))
+            severity = rng.uniform(2.0, 6.0)
+            rising = np.clip((t - start) / ramp, 0.0, 1.0)
+            recovery = np.clip(1.0 - (t - start - 3 * ramp) / (2 * ramp), 0.3, 1.0)
+            weight[p] = severity * rising * recovery
+
+        vitals = baseline[:, None, :] + noise + weight[..., None] * self.deterioration
+        vitals = np.clip(vitals, self.low, self.high)
+        for j, decimals in enumerate(self.decimals):
+            vitals[..., j] = np.round(vitals[..., j], decimals)
+        return vitals
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users, patients and vital-sign time series (with predictions) for scale testing. '
+        'Uses a backend-native bulk path when available: SQLite executemany in one transaction or MySQL '
+        'LOAD DATA LOCAL INFILE (requires OPTIONS={"local_infile": 1}); other backends use chunked bulk_create. '
+        'Assumes no concurrent writers: primary keys are allocated up front. With sharding, users are created '
+        'on default and their patients on the shard each user is assigned to.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--patients-per-user', type=int, default=100)
+        parser.add_argument('--readings', type=int, default=1000, help='Measurements per patient')
+        parser.add_argument('--interval-seconds', type=int, default=300, help='Spacing of readings')
+        parser.add_argument('--episode-rate', type=float, default=0.1, help='Fraction of patients with a deterioration episode')
+        parser.add_argument('--chunk-size', type=int, default=200000, help='Measurements generated and loaded per chunk')
+        parser.add_argument('--method', choices=['auto', 'native', 'bulk_create'], default='auto')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--csv', default=DATA_CSV, help='Dataset the distributions are fitted to')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['csv']):
+            raise CommandError(f"Dataset not found: {options['csv']}")
+        if options['readings'] < 1 or options['users'] < 1 or options['patients_per_user'] < 1:
+            raise CommandError('--users, --patients-per-user and --readings must be positive.')
+        if sharding_enabled() and options['database'] != 'default':
+            raise CommandError('--database cannot be used with sharding; patients are placed on their owner\'s shard.')
+        self.method = options['method']
+
+        rng = np.random.default_rng(options['seed'])
+        self.vitals_model = VitalsModel(options['csv'], rng)
+        self.ai = HealthAI(use_cache=False, monitor_drift=False)
+        self.options = options
+
+        users = self.create_users(options['users'], options['database'])
+        started, self.loaded, total_patients = time.perf_counter(), 0, 0
+        for db, owners in self.group_by_shard(users, options['database']).items():
+            self.use_database(db)
+            patients = self.create_patients(owners, options['patients_per_user'], rng)
+            self.load_readings(patients, started)
+            total_patients += len(patients)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {options["users"]} users, {total_patients} patients and {self.loaded} measurements '
+            f'in {elapsed:.1f}s ({self.loaded / elapsed if elapsed else 0:.0f} rows/s, method={self.method}/{self.vendor})'))
+
+    def use_database(self, db):
+        vendor = connections[db].vendor
+        method = self.options['method']
+        if method == 'auto':
+            method = 'native' if vendor in ('sqlite', 'mysql') else 'bulk_create'
+        if method == 'native' and vendor not in ('sqlite', 'mysql'):
+            raise CommandError(f'No native bulk path for {vendor}; use --method bulk_create.')
+        self.db, self.vendor, self.method = db, vendor, method
+
+    @staticmethod
+    def group_by_shard(users, db):
+        if not sharding_enabled():
+            return {db: users}
+        groups = {}
+        for user in users:
+            groups.setdefault(shard_for_user(user.id), []).append(user)
+        return groups
+
+    def next_id(self, model):
+        # stay in the shard's id class (see core.sharding), spacing ids by the shard stride
+        current = model._base_manager.using(self.db).aggregate(m=Max('id'))['m']
+        return next_shard_id(self.db, current, self.vendor)
+
+    def id_step(self):
+        return SHARD_ID_STRIDE if sharding_enabled() and self.vendor != 'sqlite' else 1
+
+    def load_readings(self, patients, started):
+        options, db = self.options, self.db
+        readings = options['readings']
+        per_chunk = max(1, options['chunk_size'] // readings)
+        interval = timedelta(seconds=options['interval_seconds'])
+        first_ts = timezone.now() - interval * readings
+
+        next_measurement_id = self.next_id(Measurement)
+        next_prediction_id = self.next_id(Prediction)
+
+        for offset in range(0, len(patients), per_chunk):
+            group = patients[offset:offset + per_chunk]
+            vitals = self.vitals_model.sample(len(group), readings, options['episode_rate'])
+            X = vitals.reshape(-1, len(FEATURE_KEYS))
+            result = self.ai.predict_batch(X)
+
+            n, step = len(X), self.id_step()
+            measurement_ids = next_measurement_id + step * np.arange(n)
+            prediction_ids = next_prediction_id + step * np.arange(n)
+            next_measurement_id += step * n
+            next_prediction_id += step * n
+            patient_ids = np.repeat([p.id for p in group], readings)
+            timestamps = [first_ts + interval * t for t in range(readings)] * len(group)
+
+            with transaction.atomic(using=db):
+                self.load_chunk(X, result, measurement_ids, prediction_ids, patient_ids, timestamps)
+                # row of each patient's newest reading (ids may be spaced by the shard stride)
+                last = np.arange(readings - 1, n, readings)
+                PatientRiskState.objects.using(db).bulk_create([
+                    PatientRiskState(patient=p, user_id=p.user_id, measurement_id=int(measurement_ids[i]),
+                                     risk_score=float(result['risk_score'][i]), risk_label=result['risk_label'][i])
+                    for p, i in zip(group, last)
+                ])
+
+            self.loaded += n
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {self.loaded} measurements (+ predictions) loaded on {db}, '
+                              f'{self.loaded / elapsed:.0f} rows/s')
+
+    def create_users(self, users, db):
+        User = get_user_model()
+        run = timezone.now().strftime('%Y%m%d%H%M%S')
+        # one shared unusable password hash; hashing per user would dominate small runs
+        password = make_password(None)
+        next_user_id = (User.objects.using(db).aggregate(m=Max('id'))['m'] or 0) + 1
+        user_objs = [User(id=next_user_id + i, username=f'synthetic_{run}_{i}', password=password)
+                     for i in range(users)]
+        User.objects.using(db).bulk_create(user_objs, batch_size=5000)
+        return user_objs
+
+    def create_patients(self, owners, patients_per_user, rng):
+        db = self.db
+        next_patient_id = self.next_id(Patient)
+        first = rng.choice(FIRST_NAMES, len(owners) * patients_per_user)
+        last = rng.choice(LAST_NAMES, len(owners) * patients_per_user)
+        years = rng.integers(1930, 2010, len(owners) * patients_per_user)
+        patients = [
+            Patient(id=next_patient_id + i * self.id_step(), user=owners[i // patients_per_user],
+                    full_name=f'{first[i]} {last[i]}', dob=f'{years[i]}-01-01')
+            for i in range(len(owners) * patients_per_user)
+        ]
+        Patient.objects.using(db).bulk_create(patients, batch_size=5000)
+        return patients
+
+    # ---------- loaders ----------
+    def load_chunk(self, X, result, measurement_ids, prediction_ids, patient_ids, timestamps):
+        if self.method == 'bulk_create':
+            self.load_bulk_create(X, result, measurement_ids, prediction_ids, patient_ids)
+            return
+        now = timezone.now()
+        fmt = self.format_datetime
+        created = fmt(now)
+        m_columns = ['id', 'patient_id', 'timestamp'] + FEATURE_KEYS + ['notes', 'created_at']
+        m_rows = [
+            (int(mid), int(pid), fmt(ts), *row.tolist(), '', created)
+            for mid, pid, ts, row in zip(measurement_ids, patient_ids, timestamps, X)
+        ]
+        p_columns = ['id', 'measurement_id', 'risk_score', 'risk_label', 'created_at']
+        p_rows = [
+            (int(pid), int(mid), float(score), label, created)
+            for pid, mid, score, label in zip(prediction_ids, measurement_ids, result['risk_score'], result['risk_label'])
+        ]
+        if self.vendor == 'mysql':
+            self.load_data_infile(Measurement._meta.db_table, m_columns, m_rows)
+            self.load_data_infile(Prediction._meta.db_table, p_columns, p_rows)
+        else:
+            self.executemany(Measurement._meta.db_table, m_columns, m_rows)
+            self.executemany(Prediction._meta.db_table, p_columns, p_rows)
+
+    def format_datetime(self, value):
+        # naive UTC, the storage format of both SQLite and MySQL DATETIME(6) columns
+        if settings.USE_TZ:
+            value = timezone.make_naive(value, dt_timezone.utc)
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def executemany(self, table, columns, rows):
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            qn(table), ', '.join(qn(c) for c in columns), ', '.join(['%s'] * len(columns)))
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def load_data_infile(self, table, columns, rows):
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        with tempfile.NamedTemporaryFile('w', newline='', suffix='.csv', delete=False) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerows([r'\N' if v is None else v for v in row] for row in rows)
+            path = f.name
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "LOAD DATA LOCAL INFILE %s INTO TABLE {} FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                    "LINES TERMINATED BY '\\n' ({})".format(qn(table), ', '.join(qn(c) for c in columns)),
+                    [path])
+        finally:
+            os.unlink(path)
+
+    def load_bulk_create(self, X, result, measurement_ids, prediction_ids, patient_ids):
+        # portable fallback; note that auto_now_add overwrites the synthetic timestamps here
+        measurements = [
+            Measurement(id=int(mid), patient_id=int(pid), **dict(zip(FEATURE_KEYS, row.tolist())))
+            for mid, pid, row in zip(measurement_ids, patient_ids, X)
+        ]
+        Measurement.objects.using(self.db).bulk_create(measurements, batch_size=5000)
+        Prediction.objects.using(self.db).bulk_create([
+            Prediction(id=int(pid), measurement_id=int(mid), risk_score=float(score), risk_label=label)
+            for pid, mid, score, label in zip(prediction_ids, measurement_ids, result['risk_score'], result['risk_label'])
+        ], batch_size=5000)
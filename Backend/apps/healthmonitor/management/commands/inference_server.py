@@ -0,0 +1,40 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ai_model import MODEL_PATH
+from core.inference_server import InferenceServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the host-local inference server: holds model.pkl once for all web workers and scores their '
+        'requests in dynamic batches over a Unix socket (HEALTHAI_INFERENCE_SOCKET). Start one per host '
+        'before the workers; they fall back to in-process inference while it is down.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.HEALTHAI_INFERENCE_SOCKET,
+                            help='Socket path (default: HEALTHAI_INFERENCE_SOCKET)')
+        parser.add_argument('--max-batch', type=int, default=settings.HEALTHAI_INFERENCE_MAX_BATCH,
+                            help='Score as soon as this many rows are waiting')
+        parser.add_argument('--max-wait-ms', type=float, default=settings.HEALTHAI_INFERENCE_MAX_WAIT_MS,
+                            help='Longest a request waits for others to join its batch')
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError('Set HEALTHAI_INFERENCE_SOCKET or pass --socket.')
+        server = InferenceServer(options['socket'], model_path=MODEL_PATH,
+                                 max_batch=options['max_batch'], max_wait=options['max_wait_ms'] / 1000.0)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: server.stop())
+        self.stdout.write(f"Serving {MODEL_PATH} on {options['socket']} "
+                          f"(max batch {options['max_batch']}, max wait {options['max_wait_ms']} ms)")
+        try:
+            server.serve_forever()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stopped after {server.stats['batches']} batches, {server.stats['requests']} requests, "
+            f"{server.stats['rows']} rows"))
@@ -0,0 +1,61 @@
+import io
+import pstats
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import load_profile, parse_profile_name, profile_files
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = 'Aggregate request profiles written by core.profiling.ProfilingMiddleware and print the top functions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Profile directory (default: settings.PROFILING_DIR)')
+        parser.add_argument('--view', default=None, help='Only profiles whose view name contains this')
+        parser.add_argument('--since', type=float, default=None, help='Only profiles from the last N hours')
+        parser.add_argument('--min-ms', type=int, default=0, help='Only requests that took at least this long')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='cumulative')
+        parser.add_argument('--top', type=int, default=30, help='Number of functions to print')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles')
+        cutoff = time.time() - options['since'] * 3600 if options['since'] else None
+
+        total = pstats.Stats()
+        durations = defaultdict(list)
+        for path, _ in profile_files(directory):
+            meta = parse_profile_name(path)
+            if meta is None or meta['duration_ms'] < options['min_ms']:
+                continue
+            if options['view'] and options['view'] not in meta['view']:
+                continue
+            if cutoff and meta['timestamp'] < cutoff:
+                continue
+            try:
+                stats = pstats.Stats()
+                stats.stats = load_profile(path)
+                stats.get_top_level_stats()
+            except Exception as e:
+                self.stderr.write(f'Skipping unreadable profile {path}: {e}')
+                continue
+            total.add(stats)
+            durations[meta['view']].append(meta['duration_ms'])
+
+        if not durations:
+            raise CommandError(f'No matching profiles in {directory}.')
+
+        self.stdout.write(f"{'view':<50}{'profiles':>9}{'median ms':>11}{'max ms':>9}")
+        for view, values in sorted(durations.items(), key=lambda item: -len(item[1])):
+            values.sort()
+            self.stdout.write(f'{view:<50}{len(values):>9}{values[len(values) // 2]:>11}{values[-1]:>9}')
+        self.stdout.write('')
+
+        out = io.StringIO()
+        total.stream = out
+        total.sort_stats(options['sort']).print_stats(options['top'])
+        self.stdout.write(out.getvalue())
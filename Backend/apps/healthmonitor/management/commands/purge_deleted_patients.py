@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.healthmonitor.models import Patient, Measurement, Prediction, PurgeJob
+from core.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        'Purge soft-deleted patients: predictions, then measurements, in bounded primary-key batches '
+        '(one short transaction each, progress saved with the batch), then the patient row. '
+        'Interrupted jobs resume where they stopped. Run from cron, or as a worker with --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Measurements per batch')
+        parser.add_argument('--sleep', type=float, default=0.05, help='Pause between batches (throttling)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--poll-seconds', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        while True:
+            purged = 0
+            for alias in shard_aliases():
+                for job in PurgeJob.objects.using(alias).filter(finished_at__isnull=True).order_by('id'):
+                    self.run_job(job, alias, options['batch_size'], options['sleep'])
+                    purged += 1
+            if not options['loop']:
+                if not purged:
+                    self.stdout.write('No pending purge jobs.')
+                return
+            time.sleep(options['poll_seconds'])
+
+    def run_job(self, job, db, batch_size, pause):
+        started = time.perf_counter()
+        while True:
+            ids = list(Measurement.objects.using(db)
+                       .filter(patient_id=job.patient_id, id__gt=job.last_measurement_id)
+                       .order_by('id')
+                       .values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic(using=db):
+                # predictions first, so the measurement delete has no cascade left to collect
+                predictions, _ = Prediction.objects.using(db).filter(measurement_id__in=ids).delete()
+                _, per_model = Measurement.objects.using(db).filter(id__in=ids).delete()
+                job.last_measurement_id = ids[-1]
+                job.predictions_deleted += predictions
+                job.measurements_deleted += per_model.get(Measurement._meta.label, 0)
+                job.save(using=db, update_fields=[
+                    'last_measurement_id', 'predictions_deleted', 'measurements_deleted', 'updated_at'])
+            if pause:
+                time.sleep(pause)
+
+        with transaction.atomic(using=db):
+            Patient.all_objects.using(db).filter(pk=job.patient_id).delete()
+            job.finished_at = timezone.now()
+            job.save(using=db, update_fields=['finished_at', 'updated_at'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged patient {job.patient_id} on {db}: {job.measurements_deleted} measurements, '
+            f'{job.predictions_deleted} predictions in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,216 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max
+
+from apps.healthmonitor.models import Patient, Measurement, Prediction, PatientRiskState, PurgeJob, ShardAssignment
+from core.db_routers import cache_is_shared
+from core.sharding import SHARD_ID_STRIDE, forget_user_shard, next_shard_id, placement_for, shard_aliases
+
+# copy parents before children, delete children before parents
+COPY_ORDER = (Patient, Measurement, Prediction, PatientRiskState, PurgeJob)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move users\' healthmonitor data between shards. A moving user is locked (their API writes get 503), '
+        'their rows are copied in batches with unchanged primary keys and the shard map is flipped. After '
+        'workers have seen the change, the copy is brought up to date and compared with the source, whose rows '
+        'are deleted only if both match. Waits for cached shard map entries to expire unless CACHES is shared. '
+        'Safe to re-run after an interruption.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', default=[], help='User id to move (repeatable)')
+        parser.add_argument('--to', help='Target shard alias for --user')
+        parser.add_argument('--plan', action='store_true',
+                            help='Move every user whose shard differs from hash placement over the current shards')
+        parser.add_argument('--init-sequences', action='store_true',
+                            help='Start each shard\'s id sequences at its own range so ids never collide')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--drain-seconds', type=float, default=5.0,
+                            help='How long in-flight requests get to finish after the shard map changes')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        aliases = shard_aliases()
+        if options['init_sequences']:
+            for alias in aliases:
+                self.init_sequences(alias, options['dry_run'])
+
+        moves = []
+        if options['user']:
+            if options['to'] not in aliases:
+                raise CommandError(f'--to must be one of {aliases}.')
+            moves = [(user_id, options['to']) for user_id in options['user']]
+        elif options['plan']:
+            moves = [(user_id, placement_for(user_id, aliases))
+                     for user_id, alias in ShardAssignment.objects.using('default').values_list('user_id', 'alias')
+                     if alias != placement_for(user_id, aliases)]
+
+        for user_id, target in moves:
+            assignment = ShardAssignment.objects.using('default').filter(user_id=user_id).first()
+            source = assignment.alias if assignment else 'default'
+            if source == target:
+                continue
+            if not get_user_model().objects.using('default').filter(pk=user_id).exists():
+                raise CommandError(f'User {user_id} does not exist.')
+            if options['dry_run']:
+                self.stdout.write(f'Would move user {user_id}: {source} -> {target}')
+                continue
+            started = time.perf_counter()
+            copied = self.move_user(user_id, source, target, options['batch_size'], options['drain_seconds'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Moved user {user_id}: {source} -> {target} ({copied} rows in {time.perf_counter() - started:.1f}s)'))
+
+    def init_sequences(self, alias, dry_run):
+        """Point the shard's id sequences at its own id class (see core.sharding)."""
+        connection = connections[alias]
+        qn = connection.ops.quote_name
+        for model in (Patient, Measurement, Prediction):
+            table = model._meta.db_table
+            current = model._base_manager.using(alias).aggregate(m=Max('id'))['m']
+            start = next_shard_id(alias, current, connection.vendor)
+            if dry_run:
+                self.stdout.write(f'Would start {alias}.{table} ids at {start}')
+                continue
+            with connection.cursor() as cursor:
+                if connection.vendor == 'mysql':
+                    # the stride itself comes from auto_increment_increment/offset (see settings)
+                    cursor.execute(f'ALTER TABLE {qn(table)} AUTO_INCREMENT = {int(start)}')
+                elif connection.vendor == 'postgresql':
+                    cursor.execute(f'ALTER SEQUENCE {qn(table + "_id_seq")} '
+                                   f'INCREMENT BY {SHARD_ID_STRIDE} RESTART WITH {int(start)}')
+                elif connection.vendor == 'sqlite':
+                    cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [table])
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start - 1])
+                else:
+                    raise CommandError(f'Cannot set id sequences on {connection.vendor}.')
+            self.stdout.write(f'{alias}.{table} ids start at {start}')
+
+    def move_user(self, user_id, source, target, batch_size, drain_seconds):
+        ShardAssignment.objects.using('default').update_or_create(
+            user_id=user_id, defaults={'alias': source, 'locked': True})
+        forget_user_shard(user_id)
+        copied = 0
+        try:
+            # workers that looked the user up before the lock may still write to the source
+            self.settle(user_id, drain_seconds)
+            for model in COPY_ORDER:
+                copied += self.sync_rows(model, self.owned(model, user_id, source),
+                                         self.owned(model, user_id, target), batch_size)
+            with transaction.atomic(using='default'):
+                ShardAssignment.objects.using('default').filter(user_id=user_id).update(alias=target)
+            forget_user_shard(user_id)
+            # once no worker reads the source any more, pick up anything that still reached it
+            # during the copy and check the target against it before deleting the source rows
+            self.settle(user_id, drain_seconds)
+            for model in COPY_ORDER:
+                copied += self.sync_rows(model, self.owned(model, user_id, source),
+                                         self.owned(model, user_id, target), batch_size)
+            differing = {model.__name__: n for model in COPY_ORDER
+                         if (n := self.sync_rows(model, self.owned(model, user_id, source),
+                                                 self.owned(model, user_id, target), batch_size, apply=False))}
+            if differing:
+                ShardAssignment.objects.using('default').filter(user_id=user_id).update(alias=source)
+                raise CommandError(
+                    f'User {user_id}: {target} still differs from {source} after the copy ({differing} rows); '
+                    f'kept the user and their rows on {source}. Re-run the move.')
+            for model in reversed(COPY_ORDER):
+                self.delete_rows(model, self.owned(model, user_id, source), batch_size)
+        finally:
+            ShardAssignment.objects.using('default').filter(user_id=user_id).update(locked=False)
+            forget_user_shard(user_id)
+        return copied
+
+    def settle(self, user_id, drain_seconds):
+        """
+        Waits until no worker acts on a shard map entry from before the last change: in-flight
+        requests get `drain_seconds`, and with a per-process cache (which forget_user_shard cannot
+        clear in other workers) every cached entry must also expire.
+        """
+        wait = drain_seconds
+        if not cache_is_shared():
+            wait += getattr(settings, 'SHARD_MAP_CACHE_SECONDS', 60)
+        if wait > 0:
+            self.stdout.write(f'Waiting {wait:g}s for workers to see the shard map of user {user_id}')
+            time.sleep(wait)
+        # drops an entry a worker cached from a lookup that raced the change
+        forget_user_shard(user_id)
+
+    @staticmethod
+    def owned(model, user_id, alias):
+        # base managers, so soft-deleted patients and their pending purges move too
+        if model is PurgeJob:
+            patients = Patient._base_manager.using(alias).filter(user_id=user_id).values('id')
+            return PurgeJob._base_manager.using(alias).filter(patient_id__in=patients)
+        lookup = {
+            Patient: 'user_id',
+            Measurement: 'patient__user_id',
+            Prediction: 'measurement__patient__user_id',
+            PatientRiskState: 'user_id',
+        }[model]
+        return model._base_manager.using(alias).filter(**{lookup: user_id})
+
+    def sync_rows(self, model, source, target, batch_size, apply=True):
+        """
+        Makes `target` hold exactly the rows of `source` (both querysets of one user's rows), walking
+        them in primary-key batches: raw INSERT of missing rows and UPDATE of differing ones with the
+        stored column values (bulk_create would re-stamp auto_now fields), and DELETE of rows the
+        source no longer has. Rows an interrupted earlier run already copied are left alone.
+        Returns the number of rows changed, or with apply=False the number that differ.
+        """
+        fields = model._meta.concrete_fields
+        pk_field = model._meta.pk
+        pk, pk_index = pk_field.attname, fields.index(pk_field)
+        names = [f.attname for f in fields]
+        others = [f for f in fields if f is not pk_field]
+        connection = connections[target.db]
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        insert_sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            table, ', '.join(qn(f.column) for f in fields), ', '.join(['%s'] * len(fields)))
+        update_sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            table, ', '.join(f'{qn(f.column)} = %s' for f in others), qn(pk_field.column))
+        changed, last = 0, None
+        while True:
+            batch, window = source.order_by(pk), target
+            if last is not None:
+                batch, window = batch.filter(pk__gt=last), window.filter(pk__gt=last)
+            rows = list(batch.values_list(*names)[:batch_size])
+            if rows:
+                window = window.filter(pk__lte=rows[-1][pk_index])
+            # the last window is open-ended, so target rows past the source's largest id are found too
+            present = {row[pk_index]: row for row in window.values_list(*names)}
+            inserts = [row for row in rows if row[pk_index] not in present]
+            updates = [row for row in rows if row[pk_index] in present and present[row[pk_index]] != row]
+            deletes = set(present) - {row[pk_index] for row in rows}
+            changed += len(inserts) + len(updates) + len(deletes)
+            if apply and (inserts or updates or deletes):
+                with transaction.atomic(using=target.db):
+                    if deletes:
+                        model._base_manager.using(target.db).filter(pk__in=deletes).delete()
+                    with connection.cursor() as cursor:
+                        if inserts:
+                            cursor.executemany(insert_sql, [
+                                [f.get_db_prep_save(value, connection) for f, value in zip(fields, row)]
+                                for row in inserts])
+                        if updates:
+                            cursor.executemany(update_sql, [
+                                [f.get_db_prep_save(row[names.index(f.attname)], connection) for f in others]
+                                + [row[pk_index]] for row in updates])
+            if not rows:
+                return changed
+            last = rows[-1][pk_index]
+
+    @staticmethod
+    def delete_rows(model, queryset, batch_size):
+        # children go first (see move_user), so each batch's cascade has nothing left to collect
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            model._base_manager.using(queryset.db).filter(pk__in=ids).delete()
@@ -0,0 +1,166 @@
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.healthmonitor.models import Measurement
+from core.ai_model import FEATURE_KEYS, MODEL_PATH, HealthAI, model_file_version
+from core.sharding import shard_aliases
+
+LABELS = ['low', 'medium', 'high', 'invalid']
+SOURCES = ['model', 'rules', 'override', 'invalid']
+DELTA_EDGES = np.linspace(-1.0, 1.0, 41)
+
+# per-process models, set up once by _init_worker
+_models = {}
+
+
+def _init_worker(current_path, candidate_path):
+    import django
+    django.setup()
+    _models['current'] = HealthAI(use_cache=False, model_path=current_path, monitor_drift=False)
+    _models['candidate'] = HealthAI(use_cache=False, model_path=candidate_path, monitor_drift=False)
+
+
+def _score_chunk(X):
+    """Scores one chunk with both models and returns only aggregates, never per-row results."""
+    current = _models['current'].predict_batch(X)
+    candidate = _models['candidate'].predict_batch(X)
+
+    label_idx = {label: i for i, label in enumerate(LABELS)}
+    cur = np.array([label_idx[l] for l in current['risk_label']], dtype=np.intp)
+    cand = np.array([label_idx[l] for l in candidate['risk_label']], dtype=np.intp)
+    transitions = np.zeros((len(LABELS), len(LABELS)), dtype=np.int64)
+    np.add.at(transitions, (cur, cand), 1)
+
+    delta = candidate['risk_score'] - current['risk_score']
+    return {
+        'rows': len(X),
+        'transitions': transitions,
+        'source_current': Counter(current['source']),
+        'source_candidate': Counter(candidate['source']),
+        'delta_sum': float(delta.sum()),
+        'delta_sq_sum': float((delta ** 2).sum()),
+        'delta_abs_sum': float(np.abs(delta).sum()),
+        'delta_abs_max': float(np.abs(delta).max()) if len(delta) else 0.0,
+        'delta_hist': np.histogram(delta, bins=DELTA_EDGES)[0],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay historical measurements through the current and a candidate model and write a '
+        'comparison report. Read-only: stored predictions are never modified.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('candidate', help='Path to the candidate model.pkl')
+        parser.add_argument('--current', default=MODEL_PATH, help='Model to compare against (default: live model.pkl)')
+        parser.add_argument('--output', default='replay_report.json', help='Where to write the JSON report')
+        parser.add_argument('--chunk-size', type=int, default=20000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--start-id', type=int, default=0, help='Replay measurements with id greater than this')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many measurements')
+        parser.add_argument('--database', default=None, help='Database alias to read from (default: every shard)')
+
+    def iter_chunks(self, chunk_size, start_id, limit, database):
+        """Keyset-paginated chunks of (n, 6) float arrays; NaN marks an absent vital."""
+        sent = 0
+        for alias in ([database] if database else shard_aliases()):
+            # soft-deleted patients are awaiting purge; their readings are not part of the history
+            qs = Measurement.objects.using(alias).filter(patient__deleted_at__isnull=True)
+            last_id = start_id
+            while limit is None or sent < limit:
+                size = chunk_size if limit is None else min(chunk_size, limit - sent)
+                rows = list(qs.filter(id__gt=last_id).order_by('id').values_list('id', *FEATURE_KEYS)[:size])
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                sent += len(rows)
+                X = np.array([row[1:] for row in rows], dtype=np.float64)  # None -> nan
+                yield X
+
+    def handle(self, *args, **options):
+        candidate_path, current_path = options['candidate'], options['current']
+        for path in (candidate_path, current_path):
+            if model_file_version(path) is None:
+                raise CommandError(f'Model file not found: {path}')
+        workers = max(1, options['workers'])
+
+        totals = {
+            'rows': 0,
+            'transitions': np.zeros((len(LABELS), len(LABELS)), dtype=np.int64),
+            'source_current': Counter(),
+            'source_candidate': Counter(),
+            'delta_sum': 0.0, 'delta_sq_sum': 0.0, 'delta_abs_sum': 0.0, 'delta_abs_max': 0.0,
+            'delta_hist': np.zeros(len(DELTA_EDGES) - 1, dtype=np.int64),
+        }
+
+        def merge(part):
+            for key in ('rows', 'transitions', 'source_current', 'source_candidate',
+                        'delta_sum', 'delta_sq_sum', 'delta_abs_sum', 'delta_hist'):
+                totals[key] += part[key]
+            totals['delta_abs_max'] = max(totals['delta_abs_max'], part['delta_abs_max'])
+
+        started = time.perf_counter()
+        chunks = self.iter_chunks(options['chunk_size'], options['start_id'], options['limit'], options['database'])
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(current_path, candidate_path)) as pool:
+            pending = set()
+            for X in chunks:
+                # bound memory: at most two chunks per worker in flight
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(future.result())
+                    self.stdout.write(f"  {totals['rows']} rows scored "
+                                      f"({totals['rows'] / (time.perf_counter() - started):.0f} rows/s)")
+                pending.add(pool.submit(_score_chunk, X))
+            for future in pending:
+                merge(future.result())
+        elapsed = time.perf_counter() - started
+
+        report = self.build_report(totals, elapsed, current_path, candidate_path)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {report['rows']} measurements in {elapsed:.1f}s ({report['rows_per_second']:.0f} rows/s); "
+            f"{report['label_changes']} label changes. Report written to {options['output']}"))
+
+    @staticmethod
+    def build_report(totals, elapsed, current_path, candidate_path):
+        n = totals['rows']
+        mean = totals['delta_sum'] / n if n else 0.0
+        variance = max(totals['delta_sq_sum'] / n - mean ** 2, 0.0) if n else 0.0
+        transitions = totals['transitions']
+        return {
+            'rows': n,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': n / elapsed if elapsed else 0.0,
+            'current_model': {'path': os.fspath(current_path), 'version': model_file_version(current_path)},
+            'candidate_model': {'path': os.fspath(candidate_path), 'version': model_file_version(candidate_path)},
+            # transitions[current_label][candidate_label] = count
+            'label_transitions': {
+                a: {b: int(transitions[i, j]) for j, b in enumerate(LABELS)} for i, a in enumerate(LABELS)
+            },
+            'label_changes': int(transitions.sum() - np.trace(transitions)),
+            'source_breakdown': {
+                'current': {s: int(totals['source_current'].get(s, 0)) for s in SOURCES},
+                'candidate': {s: int(totals['source_candidate'].get(s, 0)) for s in SOURCES},
+            },
+            'score_delta': {
+                'mean': mean,
+                'std': variance ** 0.5,
+                'mean_abs': totals['delta_abs_sum'] / n if n else 0.0,
+                'max_abs': totals['delta_abs_max'],
+                'histogram': {
+                    'edges': [round(float(e), 3) for e in DELTA_EDGES],
+                    'counts': [int(c) for c in totals['delta_hist']],
+                },
+            },
+        }
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_risk_state(apps, schema_editor):
+    Patient = apps.get_model('healthmonitor', 'Patient')
+    Prediction = apps.get_model('healthmonitor', 'Prediction')
+    PatientRiskState = apps.get_model('healthmonitor', 'PatientRiskState')
+    db = schema_editor.connection.alias
+    # one query: each patient's newest prediction through correlated subqueries
+    latest = (Prediction.objects.using(db)
+              .filter(measurement__patient=OuterRef('pk'))
+              .order_by('-measurement_id'))
+    rows = (Patient.objects.using(db)
+            .annotate(measurement_id=Subquery(latest.values('measurement_id')[:1]),
+                      risk_score=Subquery(latest.values('risk_score')[:1]),
+                      risk_label=Subquery(latest.values('risk_label')[:1]))
+            .filter(measurement_id__isnull=False)
+            .values_list('id', 'user_id', 'measurement_id', 'risk_score', 'risk_label'))
+    states = []
+    for patient_id, user_id, measurement_id, risk_score, risk_label in rows.iterator(chunk_size=1000):
+        states.append(PatientRiskState(
+            patient_id=patient_id,
+            user_id=user_id,
+            measurement_id=measurement_id,
+            risk_score=risk_score,
+            risk_label=risk_label,
+        ))
+        if len(states) >= 1000:
+            PatientRiskState.objects.using(db).bulk_create(states)
+            states = []
+    PatientRiskState.objects.using(db).bulk_create(states)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthmonitor', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientRiskState',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='risk_state', serialize=False, to='healthmonitor.patient')),
+                ('risk_score', models.FloatField()),
+                ('risk_label', models.CharField(max_length=50)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('measurement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='healthmonitor.measurement')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='patient_risk_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-risk_score'], name='riskstate_user_score_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_risk_state, migrations.RunPython.noop),
+    ]
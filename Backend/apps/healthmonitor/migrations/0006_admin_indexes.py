@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthmonitor', '0005_patient_soft_delete_purgejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['timestamp'], name='measurement_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['risk_label'], name='prediction_label_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthmonitor', '0006_admin_indexes'),
+    ]
+
+    # new indexes first, so the triage queue is never left without one
+    operations = [
+        migrations.AddIndex(
+            model_name='patientriskstate',
+            index=models.Index(fields=['user', '-risk_score', '-updated_at'], name='riskstate_user_triage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientriskstate',
+            index=models.Index(fields=['-risk_score', '-updated_at'], name='riskstate_triage_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='patientriskstate',
+            name='riskstate_user_score_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patientriskstate',
+            name='riskstate_score_idx',
+        ),
+    ]
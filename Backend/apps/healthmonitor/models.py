@@ -1,15 +1,58 @@
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
+
+class ActivePatientManager(models.Manager):
+    """Hides soft-deleted patients; they stay visible through Patient.all_objects until purged."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 class Patient(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='patients')
+    # no database constraint: users live on 'default' while patients may live on another shard
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='patients',
+                             db_constraint=False)
     full_name = models.CharField(max_length=200)
     dob = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped on every write to the patient or its measurements; drives conditional GET validators
+    data_modified_at = models.DateTimeField(default=timezone.now)
+    # set by soft_delete(); the rows are removed later by the purge_deleted_patients command
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActivePatientManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'data_modified_at'], name='patient_user_modified_idx'),
+        ]
 
     def __str__(self):
         return f'{self.full_name}'
 
+    @classmethod
+    def touch(cls, patient_ids):
+        """Mark the patients' data as changed now."""
+        cls.objects.filter(pk__in=list(patient_ids)).update(data_modified_at=timezone.now())
+
+    def soft_delete(self):
+        """
+        Hide the patient now and queue its data for the batched background purge,
+        instead of a cascade that loads every measurement and prediction at once.
+        """
+        db = self._state.db or router.db_for_write(Patient, instance=self)
+        now = timezone.now()
+        with transaction.atomic(using=db):
+            Patient.all_objects.using(db).filter(pk=self.pk).update(deleted_at=now, data_modified_at=now)
+            PatientRiskState.objects.using(db).filter(patient_id=self.pk).delete()
+            PurgeJob.objects.using(db).get_or_create(patient_id=self.pk)
+        self.deleted_at = self.data_modified_at = now
+        from .recent import forget
+        forget(self.pk)
+
 class Measurement(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='measurements')
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -22,6 +65,11 @@ class Measurement(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='measurement_timestamp_idx'),
+        ]
+
     def __str__(self):
         return f'Measurement {self.id} for {self.patient}'
 class Prediction(models.Model):
@@ -30,5 +78,122 @@ class Prediction(models.Model):
     risk_label = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['risk_label'], name='prediction_label_idx'),
+        ]
+
     def __str__(self):
-            return f'Prediction {self.id} on {self.measurement} : ({self.risk_label} {self.risk_score})'
\ No newline at end of file
+            return f'Prediction {self.id} on {self.measurement} : ({self.risk_label} {self.risk_score})'
+
+class PatientRiskState(models.Model):
+    """
+    Latest risk for each patient, updated on every prediction so the triage
+    queue is a single indexed read instead of a scan over all measurements.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='risk_state')
+    # denormalized from patient.user so (user, risk_score) can be indexed together
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='patient_risk_states',
+                             db_constraint=False)
+    measurement = models.ForeignKey(Measurement, on_delete=models.CASCADE, related_name='+')
+    risk_score = models.FloatField()
+    risk_label = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # match the triage order (-risk_score, -updated_at) so ties need no filesort
+            models.Index(fields=['user', '-risk_score', '-updated_at'], name='riskstate_user_triage_idx'),
+            # per-shard top-K for the cross-user (staff) triage queue
+            models.Index(fields=['-risk_score', '-updated_at'], name='riskstate_triage_idx'),
+        ]
+
+    def __str__(self):
+        return f'Risk state for patient {self.patient_id}: ({self.risk_label} {self.risk_score})'
+
+    @classmethod
+    def record(cls, measurement, prediction):
+        """Make `prediction` the current risk of its patient unless a newer reading already is."""
+        patient = measurement.patient
+        values = {
+            'measurement': measurement,
+            'risk_score': prediction.risk_score,
+            'risk_label': prediction.risk_label,
+        }
+        if cls.objects.filter(patient=patient, measurement_id__lte=measurement.id).update(
+                updated_at=timezone.now(), **values):
+            return
+        if cls.objects.filter(patient=patient).exists():
+            return  # a newer reading already holds the slot
+        try:
+            with transaction.atomic():
+                cls.objects.create(patient=patient, user_id=patient.user_id, **values)
+        except IntegrityError:
+            # lost the race to create the row; fall back to the conditional update
+            cls.objects.filter(patient=patient, measurement_id__lte=measurement.id).update(
+                updated_at=timezone.now(), **values)
+
+    @classmethod
+    def refresh(cls, patient):
+        """Recompute the state from the newest scored measurement left for `patient`."""
+        latest = (Prediction.objects
+                  .filter(measurement__patient=patient)
+                  .select_related('measurement')
+                  .order_by('-measurement_id')
+                  .first())
+        if latest is None:
+            cls.objects.filter(patient=patient).delete()
+            return
+        cls.objects.update_or_create(
+            patient=patient,
+            defaults={
+                'user_id': patient.user_id,
+                'measurement': latest.measurement,
+                'risk_score': latest.risk_score,
+                'risk_label': latest.risk_label,
+            },
+        )
+
+class PurgeJob(models.Model):
+    """
+    Progress of purging one soft-deleted patient. Lives on the patient's shard;
+    `last_measurement_id` is the resume point after a crash.
+    """
+    patient_id = models.BigIntegerField(unique=True)
+    last_measurement_id = models.BigIntegerField(default=0)
+    predictions_deleted = models.BigIntegerField(default=0)
+    measurements_deleted = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Purge of patient {self.patient_id}{" (done)" if self.finished_at else ""}'
+
+class ShardAssignment(models.Model):
+    """
+    Which database alias holds a user's healthmonitor data (see core.sharding).
+    Always stored on 'default'; `locked` is set while rebalance_shards moves the user.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='shard_assignment')
+    alias = models.CharField(max_length=64)
+    locked = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'User {self.user_id} on {self.alias}{" (moving)" if self.locked else ""}'
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_data(sender, instance, using, **kwargs):
+    """
+    Cascade a user deletion to their patients when those live on another shard: each is
+    soft-deleted, so the batched PurgeJob removes the data instead of one cascade that
+    loads every measurement and prediction.
+    """
+    alias = (ShardAssignment.objects.using('default')
+             .filter(user_id=instance.pk).values_list('alias', flat=True).first())
+    if alias and alias != using:
+        for patient in Patient.objects.using(alias).filter(user_id=instance.pk).iterator():
+            patient.soft_delete()
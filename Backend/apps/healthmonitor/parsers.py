@@ -0,0 +1,45 @@
+import numpy as np
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from . import wire
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except Exception:
+    HAS_MSGPACK = False
+
+
+class VitalsBinaryParser(BaseParser):
+    """
+    Parses the packed float32 ingest format (see wire.py) into a VitalsBatch.
+    The records stay a NumPy structured array; no per-field Python objects are built.
+    """
+    media_type = wire.MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            patient_id, records = wire.decode(stream.read())
+        except wire.WireFormatError as e:
+            raise ParseError(f'Binary parse error - {e}')
+        return wire.VitalsBatch(patient_id, records)
+
+
+class VitalsMessagePackParser(BaseParser):
+    """
+    msgpack variant: a map {"patient_id": int, "records": bin} where `records`
+    holds the same packed float32 layout as the binary format.
+    """
+    media_type = 'application/x-msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            payload = msgpack.unpackb(stream.read(), raw=False)
+            patient_id = int(payload['patient_id'])
+            records = np.frombuffer(payload['records'], dtype=wire.VITALS_DTYPE)
+        except Exception as e:
+            raise ParseError(f'MessagePack parse error - {e}')
+        return wire.VitalsBatch(patient_id, records)
+
+
+VITALS_PARSERS = [VitalsBinaryParser] + ([VitalsMessagePackParser] if HAS_MSGPACK else [])
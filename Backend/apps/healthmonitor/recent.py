@@ -0,0 +1,71 @@
+"""
+Recent-readings fast path backed by the host-wide shared-memory ring (core.vitals_ring).
+
+Ingest publishes every stored reading after its transaction commits; reads are
+answered from the ring when it holds enough history and otherwise fall back to
+the database once, seeding the ring for the following reads.
+"""
+import logging
+
+from django.db import router, transaction
+
+from core.ai_model import FEATURE_KEYS
+from core.vitals_ring import get_vitals_ring, to_records
+from .models import Patient, Measurement
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('id', 'timestamp', *FEATURE_KEYS, 'prediction__risk_score')
+
+
+def publish(patient, measurements):
+    """Append stored measurements (with `prediction` attached) to the ring once committed."""
+    ring = get_vitals_ring()
+    if ring is None or not measurements:
+        return
+    rows = to_records([
+        (m.id, m.timestamp, *[getattr(m, k) for k in FEATURE_KEYS],
+         getattr(getattr(m, 'prediction', None), 'risk_score', None))
+        for m in measurements
+    ])
+    patient_id, user_id = patient.pk, patient.user_id
+
+    def append():
+        try:
+            ring.append(patient_id, user_id, rows)
+        except Exception as e:
+            logger.exception("Vitals ring append failed: %s", e)
+
+    transaction.on_commit(append, using=router.db_for_write(Measurement, instance=patient))
+
+
+def forget(patient_id):
+    """Drop a patient's cached readings after deletions."""
+    ring = get_vitals_ring()
+    if ring is not None:
+        ring.forget(patient_id)
+
+
+def recent_vitals(patient_id, user_id, n):
+    """
+    (records, source): the latest n readings of `user_id`'s patient as a RECORD_DTYPE
+    array (oldest first) and 'memory' or 'database'; None when there is no such patient.
+    The ring checks ownership itself, so a hit needs no query at all.
+    """
+    ring = get_vitals_ring()
+    if ring is not None:
+        records = ring.read(patient_id, n, user_id=user_id)
+        if records is not None:
+            return records, 'memory'
+
+    if not Patient.objects.filter(id=patient_id, user_id=user_id).exists():
+        return None
+    depth = ring.depth if ring is not None else n
+    rows = list(Measurement.objects
+                .filter(patient_id=patient_id)
+                .order_by('-id')
+                .values_list(*COLUMNS)[:max(n, depth)])
+    records = to_records(rows[::-1])
+    if ring is not None:
+        ring.seed(patient_id, user_id, records[-ring.depth:])
+    return records[len(records) - min(n, len(records)):], 'database'
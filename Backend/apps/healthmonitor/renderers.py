@@ -0,0 +1,69 @@
+import json
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from core.ai_model import FEATURE_KEYS
+from . import wire
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except Exception:
+    HAS_ORJSON = False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed.
+    Meant for views that already hand over plain dicts/lists; anything orjson
+    cannot encode (or a request for indented output) goes through DRF's encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not HAS_ORJSON or data is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def fast_renderers(*extra):
+    """DEFAULT_RENDERER_CLASSES with JSONRenderer swapped for FastJSONRenderer, followed by `extra`."""
+    defaults = [FastJSONRenderer if r is JSONRenderer else r for r in api_settings.DEFAULT_RENDERER_CLASSES]
+    return tuple(defaults) + extra
+
+
+class VitalsBinaryRenderer(BaseRenderer):
+    """
+    Renders measurement lists as packed RESULT_DTYPE records (see wire.py).
+    Accepts a list of serialized measurements, or a dict holding one under
+    'measurements'. Error payloads are rendered as JSON instead.
+    """
+    media_type = wire.MEDIA_TYPE
+    format = 'vitals'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        response = renderer_context.get('response')
+        rows = data.get('measurements') if isinstance(data, dict) else data
+        if (response is not None and response.status_code >= 400) or not isinstance(rows, list):
+            if response is not None:
+                response['Content-Type'] = 'application/json'
+            return json.dumps(data).encode('utf-8')
+
+        out = np.zeros(len(rows), dtype=wire.RESULT_DTYPE)
+        for i, row in enumerate(rows):
+            out['id'][i] = row['id']
+            for k in FEATURE_KEYS:
+                v = row.get(k)
+                out[k][i] = np.nan if v is None else v
+            prediction = row.get('prediction')
+            score = prediction.get('risk_score') if isinstance(prediction, dict) else row.get('risk_score')
+            out['risk_score'][i] = np.nan if score is None else score
+
+        view = renderer_context.get('view')
+        patient_id = int(view.kwargs.get('patient_id', 0)) if view is not None else 0
+        return wire.encode(patient_id, out, dtype=wire.RESULT_DTYPE)
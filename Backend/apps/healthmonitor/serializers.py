@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Patient, Measurement, Prediction
+from django.utils import timezone
+from .models import Patient, Measurement, Prediction, PatientRiskState
 
 class PredictionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,8 +27,83 @@ class MeasurementSerializer(serializers.ModelSerializer):
                 'respiratory_rate','temperature','notes','created_at','prediction')
         read_only_fields = ('patient','timestamp','created_at')
 
+class MeasurementRowSerializer:
+    """
+    Read-only fast path with the same output as MeasurementSerializer.
+    Rows are fetched with values_list() across the prediction join and shaped by a
+    plain function, skipping DRF field objects and model instances entirely.
+    Keep `columns` and `shape_row` in sync with MeasurementSerializer.Meta.fields.
+    """
+    columns = (
+        'id', 'patient_id', 'timestamp', 'heart_rate', 'spo2', 'systolic', 'diastolic',
+        'respiratory_rate', 'temperature', 'notes', 'created_at',
+        'prediction__id', 'prediction__risk_score', 'prediction__risk_label', 'prediction__created_at',
+    )
+
+    def __init__(self):
+        self.tz = timezone.get_current_timezone()
+
+    def format_datetime(self, value):
+        # mirrors serializers.DateTimeField.to_representation with the default ISO 8601 format
+        if value is None:
+            return None
+        value = value.astimezone(self.tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def shape_row(self, row):
+        (pk, patient, ts, hr, spo2, sys, dia, rr, temp, notes, created,
+         p_id, p_score, p_label, p_created) = row
+        dt = self.format_datetime
+        return {
+            'id': pk,
+            'patient': patient,
+            'timestamp': dt(ts),
+            'heart_rate': hr,
+            'spo2': spo2,
+            'systolic': int(sys),
+            'diastolic': int(dia),
+            'respiratory_rate': rr,
+            'temperature': temp,
+            'notes': notes,
+            'created_at': dt(created),
+            'prediction': None if p_id is None else {
+                'id': p_id,
+                'risk_score': p_score,
+                'risk_label': p_label,
+                'created_at': dt(p_created),
+                'measurement': pk,
+            },
+        }
+
+    def many(self, queryset):
+        shape = self.shape_row
+        return [shape(row) for row in queryset.values_list(*self.columns)]
+
+    def one(self, queryset):
+        row = queryset.values_list(*self.columns).first()
+        return None if row is None else self.shape_row(row)
+
 class PatientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
         fields = '__all__'
-        read_only_fields = ('user', 'created_at')
+        read_only_fields = ('user', 'created_at', 'data_modified_at', 'deleted_at')
+
+class LatestVitalsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Measurement
+        fields = ('id','timestamp','heart_rate','spo2','systolic','diastolic',
+                'respiratory_rate','temperature')
+        read_only_fields = fields
+
+class TriageSerializer(serializers.ModelSerializer):
+    patient = serializers.IntegerField(source='patient_id', read_only=True)
+    full_name = serializers.CharField(source='patient.full_name', read_only=True)
+    latest_measurement = LatestVitalsSerializer(source='measurement', read_only=True)
+
+    class Meta:
+        model = PatientRiskState
+        fields = ('patient','full_name','risk_score','risk_label','updated_at','latest_measurement')
+        read_only_fields = fields
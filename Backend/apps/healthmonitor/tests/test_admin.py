@@ -0,0 +1,77 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.healthmonitor import recent
+from apps.healthmonitor.models import Measurement, Patient, PatientRiskState, Prediction
+from apps.users.models import User
+from core.vitals_ring import VitalsRing
+
+VITALS = dict(heart_rate=80, spo2=97, systolic=120, diastolic=80, respiratory_rate=16, temperature=37.0)
+
+
+@override_settings(HEALTHMONITOR_SHARDS=['default'], DATABASE_REPLICAS={})
+class AdminEditTests(TestCase):
+    """Admin edits must move the ETag marker and risk state like the API does."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin-password'))
+        owner = User.objects.create_user('owner', password='owner-password')
+        long_ago = timezone.now() - timedelta(days=1)
+        self.patient = Patient.objects.create(user=owner, full_name='Edited', data_modified_at=long_ago)
+        self.measurements = []
+        for score in (0.2, 0.8):
+            m = Measurement.objects.create(patient=self.patient, **VITALS)
+            p = Prediction.objects.create(measurement=m, risk_score=score, risk_label='low')
+            PatientRiskState.record(m, p)
+            self.measurements.append(m)
+        Patient.objects.filter(pk=self.patient.pk).update(data_modified_at=long_ago)
+        self.long_ago = long_ago
+
+    def assert_touched(self):
+        self.patient.refresh_from_db()
+        self.assertGreater(self.patient.data_modified_at, self.long_ago)
+
+    def test_edit_prediction(self):
+        prediction = self.measurements[1].prediction
+        response = self.client.post(f'/admin/healthmonitor/prediction/{prediction.pk}/change/', {
+            'measurement': self.measurements[1].pk, 'risk_score': 0.5, 'risk_label': 'medium'})
+        self.assertEqual(response.status_code, 302)
+        self.assert_touched()
+        self.assertEqual(PatientRiskState.objects.get(patient=self.patient).risk_label, 'medium')
+
+    def test_delete_measurement(self):
+        newest = self.measurements[1]
+        response = self.client.post(f'/admin/healthmonitor/measurement/{newest.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assert_touched()
+        self.assertEqual(PatientRiskState.objects.get(patient=self.patient).measurement_id, self.measurements[0].pk)
+
+    def test_bulk_delete_measurements(self):
+        response = self.client.post('/admin/healthmonitor/measurement/', {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [m.pk for m in self.measurements]})
+        self.assertEqual(response.status_code, 302)
+        self.assert_touched()
+        self.assertFalse(PatientRiskState.objects.filter(patient=self.patient).exists())
+
+    def test_edit_patient(self):
+        response = self.client.post(f'/admin/healthmonitor/patient/{self.patient.pk}/change/', {
+            'user': self.patient.user_id, 'full_name': 'Renamed', 'dob': ''})
+        self.assertEqual(response.status_code, 302)
+        self.assert_touched()
+
+    def test_delete_measurement_drops_ring_readings(self):
+        directory = tempfile.TemporaryDirectory(prefix='vitals-ring-test-')
+        self.addCleanup(directory.cleanup)
+        ring = VitalsRing(os.path.join(directory.name, 'vitals.ring'), n_slots=16, depth=8)
+        with mock.patch.object(recent, 'get_vitals_ring', return_value=ring):
+            self.assertEqual(recent.recent_vitals(self.patient.pk, self.patient.user_id, 2)[1], 'database')
+            self.assertEqual(recent.recent_vitals(self.patient.pk, self.patient.user_id, 2)[1], 'memory')
+            self.client.post(f'/admin/healthmonitor/measurement/{self.measurements[1].pk}/delete/', {'post': 'yes'})
+            records, source = recent.recent_vitals(self.patient.pk, self.patient.user_id, 2)
+        self.assertEqual(source, 'database')
+        self.assertEqual(records['id'].tolist(), [self.measurements[0].pk])
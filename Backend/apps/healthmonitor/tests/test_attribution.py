@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+import joblib
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from core.ai_model import FEATURE_KEYS, HealthAI
+
+
+def readings(n, rng):
+    return np.column_stack([
+        rng.integers(45, 160, n), rng.integers(86, 100, n), rng.integers(85, 190, n),
+        rng.integers(45, 110, n), rng.integers(8, 32, n), np.round(rng.uniform(35.5, 40.5, n), 1),
+    ]).astype(np.float64)
+
+
+class AttributionTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(7)
+        X = readings(2000, rng)
+        y = np.clip((np.abs(X[:, 0] - 75) / 80 + (98 - X[:, 1]) / 15 + np.abs(X[:, 5] - 37) / 4) / 2, 0, 1)
+        cls.model = Pipeline([('scaler', StandardScaler()),
+                              ('gbr', GradientBoostingRegressor(n_estimators=60, max_depth=4, random_state=0))])
+        cls.model.fit(X, y)
+        directory = tempfile.TemporaryDirectory(prefix='attribution-test-')
+        cls.addClassCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'model.pkl')
+        joblib.dump(cls.model, path)
+        cls.ai = HealthAI(use_cache=False, model_path=path, monitor_drift=False)
+        cls.X = readings(1000, rng)
+
+    def test_contributions_add_up_to_model_predict(self):
+        self.assertIsNotNone(self.ai.attributor)
+        baseline, contributions = self.ai.explain(self.X)
+        self.assertEqual(contributions.shape, (len(self.X), len(FEATURE_KEYS)))
+        np.testing.assert_allclose(baseline + contributions.sum(axis=1), self.model.predict(self.X),
+                                   rtol=0, atol=1e-9)
+
+    def test_explaining_keeps_the_risk_score(self):
+        plain = self.ai.predict_batch(self.X)
+        explained = self.ai.predict_batch(self.X, explain=True)
+        np.testing.assert_array_equal(explained['risk_score'], plain['risk_score'])
+        np.testing.assert_array_equal(explained['source'], plain['source'])
+        self.assertTrue((plain['source'] == 'model').any())
+
+        for row in self.X[:50]:
+            features = dict(zip(FEATURE_KEYS, row))
+            result = self.ai.predict(features, explain=True)
+            self.assertEqual(result['risk_score'], self.ai.predict(features)['risk_score'])
+            if result['source'] == 'model':
+                explanation = result['explanation']
+                self.assertAlmostEqual(explanation['baseline'] + sum(explanation['contributions'].values()),
+                                       float(self.model.predict(row[None])[0]), places=3)
@@ -0,0 +1,25 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.drift import HistogramSketch
+
+
+class HistogramSketchTests(SimpleTestCase):
+    VALUES = [-np.inf, 49.9, 50, 50.2, 99.5, 100, 100.2, np.inf, np.nan]
+
+    def sketch(self):
+        return HistogramSketch(['spo2'], n_bins=100, ranges={'spo2': (50, 100)})
+
+    def test_top_of_range_is_in_the_last_bin(self):
+        one_by_one, batched = self.sketch(), self.sketch()
+        for v in self.VALUES:
+            one_by_one.update([v])
+        batched.update_many(np.array(self.VALUES)[:, None])
+        np.testing.assert_array_equal(one_by_one.counts, batched.counts)
+
+        counts = batched.counts[0]
+        self.assertEqual(counts[0], 2)      # -inf, 49.9
+        self.assertEqual(counts[1], 2)      # 50, 50.2
+        self.assertEqual(counts[100], 2)    # 99.5, 100
+        self.assertEqual(counts[101], 2)    # 100.2, inf
+        self.assertEqual(counts.sum(), 8)   # NaN is absent
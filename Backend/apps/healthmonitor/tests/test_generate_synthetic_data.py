@@ -0,0 +1,37 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from apps.healthmonitor.management.commands.generate_synthetic_data import Command
+from apps.healthmonitor.models import Measurement, PatientRiskState, Prediction
+from core.sharding import SHARD_ID_STRIDE
+
+
+@override_settings(HEALTHMONITOR_SHARDS=['default'], DATABASE_REPLICAS={})
+class GenerateSyntheticDataTests(TestCase):
+    def generate(self):
+        call_command('generate_synthetic_data', '--users', '1', '--patients-per-user', '3', '--readings', '5',
+                     '--method', 'bulk_create', stdout=StringIO())
+
+    def assert_risk_state_is_newest_reading(self):
+        states = PatientRiskState.objects.select_related('measurement')
+        self.assertEqual(len(states), 3)
+        for state in states:
+            newest = Measurement.objects.filter(patient_id=state.patient_id).order_by('-id').first()
+            self.assertEqual(state.measurement_id, newest.id)
+            prediction = Prediction.objects.get(measurement=newest)
+            self.assertEqual((state.risk_score, state.risk_label), (prediction.risk_score, prediction.risk_label))
+
+    def test_risk_state_points_at_newest_reading(self):
+        self.generate()
+        self.assert_risk_state_is_newest_reading()
+
+    def test_ids_spaced_by_shard_stride(self):
+        # what MySQL/PostgreSQL shards use: ids interleaved SHARD_ID_STRIDE apart
+        with mock.patch.object(Command, 'id_step', return_value=SHARD_ID_STRIDE):
+            self.generate()
+        ids = sorted(Measurement.objects.values_list('id', flat=True))
+        self.assertEqual({b - a for a, b in zip(ids, ids[1:])}, {SHARD_ID_STRIDE})
+        self.assert_risk_state_is_newest_reading()
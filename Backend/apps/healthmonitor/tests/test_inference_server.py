@@ -0,0 +1,62 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import joblib
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from core.inference_server import InferenceClient, InferenceServer
+
+
+class InferenceServerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory(prefix='inference-test-')
+        self.addCleanup(directory.cleanup)
+        rng = np.random.default_rng(3)
+        X = rng.uniform([45, 86, 85, 45, 8, 35.5], [160, 100, 190, 110, 32, 40.5], (500, 6))
+        self.model = Pipeline([('scaler', StandardScaler()),
+                               ('gbr', GradientBoostingRegressor(n_estimators=20, random_state=0))])
+        self.model.fit(X, (X[:, 0] - 45) / 115)
+        model_path = os.path.join(directory.name, 'model.pkl')
+        joblib.dump(self.model, model_path)
+        self.X = X[:40]
+
+        self.path = os.path.join(directory.name, 'inference.sock')
+        self.server = InferenceServer(self.path, model_path=model_path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.addCleanup(self.stop_server)
+        self.client = InferenceClient(self.path, retry_seconds=0)
+        deadline = time.monotonic() + 5
+        while self.client.predict(self.X[:1]) is None:
+            self.assertLess(time.monotonic(), deadline, 'inference server did not start')
+            time.sleep(0.01)
+
+    def stop_server(self):
+        self.server.stop()
+        self.thread.join(5)
+
+    def test_scores_match_the_model(self):
+        np.testing.assert_allclose(self.client.predict(self.X), self.model.predict(self.X))
+
+    def test_silent_connection_does_not_block_others(self):
+        silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(silent.close)
+        silent.connect(self.path)
+        time.sleep(0.05)  # let the server accept it before the next request
+        other = InferenceClient(self.path, timeout=0.5, retry_seconds=0)
+        np.testing.assert_allclose(other.predict(self.X), self.model.predict(self.X))
+
+    def test_falls_back_once_the_socket_is_gone(self):
+        fallbacks = self.client.stats['fallbacks']
+        self.stop_server()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(self.client.predict(self.X))
+        self.assertIsNone(InferenceClient(self.path).predict(self.X))
+        self.assertEqual(self.client.stats['fallbacks'], fallbacks + 1)
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.healthmonitor import views
+from apps.healthmonitor.coalescer import IngestCoalescer
+from apps.healthmonitor.models import Patient
+from apps.users.models import User
+
+# respiratory_rate and temperature are optional
+PARTIAL = dict(heart_rate=92, spo2=95, systolic=118, diastolic=76)
+
+
+@override_settings(HEALTHMONITOR_SHARDS=['default'], DATABASE_REPLICAS={})
+class IngestCoalescingTests(TransactionTestCase):
+    """The collector thread uses its own connection, so the rows must be committed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('ingest', password='ingest-password')
+        self.patient = Patient.objects.create(user=self.user, full_name='Ingest')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, **vitals):
+        return self.client.post(f'/api/health/patients/{self.patient.pk}/measurements/', vitals, format='json')
+
+    def test_partial_reading_scored_alike_in_both_modes(self):
+        with override_settings(INGEST_COALESCE=False):
+            single = self.post(**PARTIAL)
+        with override_settings(INGEST_COALESCE=True):
+            grouped = self.post(**PARTIAL)
+        self.assertEqual(single.status_code, 201)
+        self.assertEqual(grouped.status_code, 201)
+        self.assertNotEqual(single.json()['prediction']['risk_label'], 'invalid')
+        for key in ('risk_score', 'risk_label'):
+            self.assertEqual(single.json()['prediction'][key], grouped.json()['prediction'][key])
+
+    def test_submit_gives_up_when_not_picked_up(self):
+        stalled = IngestCoalescer(timeout=0.01)
+        with mock.patch.object(views, 'get_coalescer', return_value=stalled), \
+                mock.patch.object(stalled, '_ensure_thread'):
+            response = self.post(**PARTIAL)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(stalled.stats['timeouts'], 1)
+        self.assertFalse(self.patient.measurements.exists())
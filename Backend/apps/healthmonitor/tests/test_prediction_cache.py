@@ -0,0 +1,27 @@
+from django.test import SimpleTestCase
+
+from core.ai_model import PREDICTION_CACHE, HealthAI
+
+REQUIRED = dict(heart_rate=80, spo2=97, systolic=120, diastolic=80)
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def setUp(self):
+        PREDICTION_CACHE.clear()
+        self.addCleanup(PREDICTION_CACHE.clear)
+        self.ai = HealthAI(monitor_drift=False)
+
+    def test_readings_without_optional_vitals_are_memoized(self):
+        first = self.ai.predict(dict(REQUIRED))
+        self.assertEqual(PREDICTION_CACHE.info()['misses'], 1)
+        # None is the same absence as a missing key
+        self.assertEqual(self.ai.predict({**REQUIRED, 'respiratory_rate': None, 'temperature': None}), first)
+        self.assertEqual(PREDICTION_CACHE.info()['hits'], 1)
+        self.assertEqual(first, HealthAI(use_cache=False, monitor_drift=False).predict(dict(REQUIRED)))
+
+    def test_absent_vitals_are_part_of_the_key(self):
+        keys = {self.ai.cache_key(REQUIRED), self.ai.cache_key({**REQUIRED, 'temperature': 37.0}),
+                self.ai.cache_key({**REQUIRED, 'respiratory_rate': 16}),
+                self.ai.cache_key({**REQUIRED, 'respiratory_rate': 16, 'temperature': 37.0})}
+        self.assertEqual(len(keys), 4)
+        self.assertIsNone(self.ai.cache_key({**REQUIRED, 'temperature': 37.05}))
@@ -0,0 +1,29 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.healthmonitor.models import Measurement, Patient
+from apps.users.models import User
+
+VITALS = dict(heart_rate=80, spo2=97, systolic=120, diastolic=80)
+
+
+@override_settings(HEALTHMONITOR_SHARDS=['default'], DATABASE_REPLICAS={}, VITALS_RING_DEPTH=3)
+class RecentVitalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer', password='viewer-password')
+        self.patient = Patient.objects.create(user=self.user, full_name='Recent')
+        Measurement.objects.bulk_create([Measurement(patient=self.patient, **VITALS) for _ in range(5)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, n):
+        return self.client.get(f'/api/health/patients/{self.patient.pk}/recent/', {'n': n})
+
+    def test_n_is_clamped_to_ring_depth(self):
+        self.assertEqual(len(self.get(1000000).json()['readings']), 3)
+        self.assertEqual(len(self.get(0).json()['readings']), 1)
+
+    def test_non_integer_n_is_rejected(self):
+        response = self.get('many')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('n', response.json())
@@ -0,0 +1,23 @@
+from django.test import TestCase, override_settings
+
+from apps.healthmonitor.management.commands.replay_predictions import Command
+from apps.healthmonitor.models import Measurement, Patient
+from apps.users.models import User
+
+VITALS = dict(heart_rate=80, spo2=97, systolic=120, diastolic=80)
+
+
+@override_settings(HEALTHMONITOR_SHARDS=['default'], DATABASE_REPLICAS={})
+class ReplayPredictionsTests(TestCase):
+    def test_soft_deleted_patients_are_not_replayed(self):
+        user = User.objects.create_user('replayed', password='replayed-password')
+        kept = Patient.objects.create(user=user, full_name='Kept')
+        deleted = Patient.objects.create(user=user, full_name='Deleted')
+        Measurement.objects.bulk_create([Measurement(patient=kept, **VITALS) for _ in range(3)] +
+                                        [Measurement(patient=deleted, heart_rate=150, spo2=90, systolic=100,
+                                                     diastolic=60) for _ in range(2)])
+        deleted.soft_delete()
+
+        chunks = list(Command().iter_chunks(chunk_size=2, start_id=0, limit=None, database=None))
+        self.assertEqual([len(X) for X in chunks], [2, 1])
+        self.assertTrue(all((X[:, 0] == 80).all() for X in chunks))
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.db import router
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.healthmonitor.models import Measurement, Patient
+from apps.users.models import User
+from core.db_routers import STICKY_KEY, replica_reads
+
+
+@override_settings(HEALTHMONITOR_SHARDS=['default'], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    """The replica is a separate test database here, so what a request returns shows where it read."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='reader-password')
+        Patient.objects.using('default').create(user=self.user, full_name='On primary')
+        Patient.objects.using('replica').create(user_id=self.user.pk, full_name='On replica')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def names(self):
+        response = self.client.get('/api/health/patients/')
+        self.assertEqual(response.status_code, 200)
+        return sorted(p['full_name'] for p in response.json())
+
+    def test_router_decisions(self):
+        self.assertEqual(router.db_for_read(Measurement), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Measurement), 'replica')
+            self.assertEqual(router.db_for_write(Measurement), 'default')
+            # only healthmonitor data is read from the replica
+            self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_safe_reads_use_replica(self):
+        self.assertEqual(self.names(), ['On replica'])
+
+    def test_writes_go_to_primary(self):
+        response = self.client.post('/api/health/patients/', {'full_name': 'New'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Patient.objects.using('default').filter(full_name='New').exists())
+        self.assertFalse(Patient.objects.using('replica').filter(full_name='New').exists())
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.client.post('/api/health/patients/', {'full_name': 'New'}, format='json')
+        self.assertTrue(cache.get(STICKY_KEY.format(self.user.pk)))
+        self.assertEqual(self.names(), ['New', 'On primary'])
+        # once the sticky window has expired the replica answers again
+        cache.delete(STICKY_KEY.format(self.user.pk))
+        self.assertEqual(self.names(), ['On replica'])
+
+    def test_sticky_window_is_per_user(self):
+        self.client.post('/api/health/patients/', {'full_name': 'New'}, format='json')
+        other = User.objects.create_user('other', password='other-password')
+        Patient.objects.using('replica').create(user_id=other.pk, full_name='Other on replica')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.names(), ['Other on replica'])
@@ -0,0 +1,201 @@
+import contextvars
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.healthmonitor.management.commands import rebalance_shards
+from apps.healthmonitor.models import Measurement, Patient, PatientRiskState, Prediction, PurgeJob, ShardAssignment
+from apps.users.models import User
+from core.sharding import fan_out, use_shard
+
+SHARDS = {'default', 'shard1', 'shard2'}
+VITALS = dict(heart_rate=80, spo2=97, systolic=120, diastolic=80, respiratory_rate=16, temperature=37.0)
+
+
+def make_user(username, alias):
+    user = User.objects.create_user(username, password=f'{username}-password')
+    ShardAssignment.objects.using('default').create(user=user, alias=alias)
+    return user
+
+
+def add_reading(patient, score, **vitals):
+    """Measurement + prediction on the patient's shard, advancing its risk state."""
+    with use_shard(patient._state.db):
+        measurement = Measurement.objects.create(patient=patient, **{**VITALS, **vitals})
+        prediction = Prediction.objects.create(measurement=measurement, risk_score=score, risk_label='low')
+        PatientRiskState.record(measurement, prediction)
+    return measurement
+
+
+@override_settings(DATABASE_REPLICAS={}, SHARD_MAP_CACHE_SECONDS=60)
+class ShardRoutingTests(TestCase):
+    databases = SHARDS
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('sharded', 'shard1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_requests_use_the_assigned_shard(self):
+        response = self.client.post('/api/health/patients/', {'full_name': 'On shard1'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Patient.objects.using('shard1').filter(full_name='On shard1').exists())
+        self.assertFalse(Patient.objects.using('default').filter(full_name='On shard1').exists())
+
+        Patient.objects.using('default').create(user_id=self.user.pk, full_name='Stray on default')
+        names = [p['full_name'] for p in self.client.get('/api/health/patients/').json()]
+        self.assertEqual(names, ['On shard1'])
+
+    def test_writes_refused_while_moving(self):
+        ShardAssignment.objects.using('default').filter(user=self.user).update(locked=True)
+        response = self.client.post('/api/health/patients/', {'full_name': 'Late'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get('/api/health/patients/').status_code, 200)
+
+    def test_admin_lists_one_shard(self):
+        Patient.objects.using('default').create(user_id=self.user.pk, full_name='Listed on default')
+        Patient.objects.using('shard1').create(user_id=self.user.pk, full_name='Listed on shard1')
+        admin_user = User.objects.create_superuser('admin', password='admin-password')
+        self.client.force_login(admin_user)
+
+        response = self.client.get('/admin/healthmonitor/patient/')
+        self.assertContains(response, 'Listed on default')
+        self.assertNotContains(response, 'Listed on shard1')
+        self.assertContains(response, 'lists one shard at a time')
+        # no "All" choice; the shard shown is the selected one
+        self.assertNotContains(response, '>All</a>')
+        self.assertContains(response, '<li class="selected"><a href="?shard=default">default</a></li>', html=True)
+
+        response = self.client.get('/admin/healthmonitor/patient/?shard=shard1')
+        self.assertContains(response, 'Listed on shard1')
+        self.assertNotContains(response, 'Listed on default')
+
+    def test_user_deletion_queues_purge_on_their_shard(self):
+        patient = Patient.objects.using('shard1').create(user_id=self.user.pk, full_name='Orphaned')
+        add_reading(patient, score=0.4)
+        self.user.delete()
+        # soft-deleted and queued for the batched purge, not cascaded in one go
+        patient = Patient.all_objects.using('shard1').get(pk=patient.pk)
+        self.assertIsNotNone(patient.deleted_at)
+        self.assertTrue(PurgeJob.objects.using('shard1').filter(patient_id=patient.pk).exists())
+        self.assertTrue(Measurement.objects.using('shard1').filter(patient_id=patient.pk).exists())
+
+        call_command('purge_deleted_patients', '--sleep', '0', stdout=StringIO())
+        self.assertFalse(Patient.all_objects.using('shard1').filter(pk=patient.pk).exists())
+        self.assertFalse(Measurement.objects.using('shard1').exists())
+
+
+@override_settings(DATABASE_REPLICAS={})
+class FanOutTests(TransactionTestCase):
+    """fan_out runs in threads with their own connections, so the rows must be committed."""
+    databases = SHARDS
+
+    def setUp(self):
+        cache.clear()
+        call_command('rebalance_shards', '--init-sequences', stdout=StringIO())
+        for index, alias in enumerate(sorted(SHARDS)):
+            user = make_user(f'owner-{alias}', alias)
+            for k in range(2):
+                patient = Patient.objects.using(alias).create(user_id=user.pk, full_name=f'{alias}-{k}')
+                add_reading(patient, score=round(0.1 + 0.3 * k + 0.1 * index, 2))
+
+    def test_results_per_shard_in_callers_context(self):
+        marker = contextvars.ContextVar('marker', default=None)
+        marker.set('caller')
+        result = fan_out(lambda alias: (marker.get(), Patient.objects.count()))
+        self.assertEqual(result, {alias: ('caller', 2) for alias in ('default', 'shard1', 'shard2')})
+
+    def test_triage_merges_all_shards(self):
+        staff = User.objects.create_user('staff', password='staff-password', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        response = client.get('/api/health/triage/?scope=all&limit=4')
+        self.assertEqual(response.status_code, 200)
+        rows = [(r['full_name'], r['risk_score']) for r in response.json()]
+        self.assertEqual(rows, [('shard2-1', 0.6), ('shard1-1', 0.5), ('default-1', 0.4), ('shard2-0', 0.3)])
+
+    def test_admin_object_page_searches_all_shards(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin-password'))
+        patient = Patient.objects.using('shard2').get(full_name='shard2-0')
+        response = self.client.get(f'/admin/healthmonitor/patient/{patient.pk}/change/')
+        self.assertContains(response, 'shard2-0')
+
+
+@override_settings(DATABASE_REPLICAS={}, SHARD_MAP_CACHE_SECONDS=1)
+class RebalanceTests(TestCase):
+    databases = SHARDS
+
+    def setUp(self):
+        cache.clear()
+        call_command('rebalance_shards', '--init-sequences', stdout=StringIO())
+        self.user = make_user('mover', 'shard1')
+        self.patient = Patient.objects.using('shard1').create(user_id=self.user.pk, full_name='Moving')
+        for k in range(3):
+            add_reading(self.patient, score=0.1 * k)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def move(self):
+        call_command('rebalance_shards', '--user', str(self.user.pk), '--to', 'shard2', '--drain-seconds', '0',
+                     stdout=StringIO())
+
+    def assignment(self):
+        return ShardAssignment.objects.using('default').get(user=self.user)
+
+    def test_move_keeps_writes_made_while_locked(self):
+        def straggler(seconds):
+            # the per-process cache cannot be cleared in other workers, so the command waits out its TTL
+            self.assertEqual(seconds, 1)
+            if sleep.call_count == 1:
+                response = self.client.post(f'/api/health/patients/{self.patient.pk}/measurements/', VITALS,
+                                            format='json')
+                self.assertEqual(response.status_code, 503)
+            # a worker that looked the user up before the lock still writes to shard1
+            add_reading(self.patient, score=0.9, heart_rate=130 + sleep.call_count)
+            Patient.objects.using('shard1').filter(pk=self.patient.pk).update(full_name='Renamed')
+
+        with mock.patch.object(rebalance_shards.time, 'sleep', side_effect=straggler) as sleep:
+            self.move()
+        self.assertEqual(sleep.call_count, 2)
+
+        self.assertEqual(self.assignment().alias, 'shard2')
+        self.assertFalse(self.assignment().locked)
+        self.assertFalse(Measurement.objects.using('shard1').exists())
+        self.assertEqual(Patient.objects.using('shard2').get(pk=self.patient.pk).full_name, 'Renamed')
+        self.assertEqual(sorted(Measurement.objects.using('shard2').values_list('heart_rate', flat=True)),
+                         [80, 80, 80, 131, 132])
+        state = PatientRiskState.objects.using('shard2').get(patient_id=self.patient.pk)
+        self.assertEqual(state.measurement.heart_rate, 132)
+
+        response = self.client.get(f'/api/health/patients/{self.patient.pk}/measurements/')
+        self.assertEqual(len(response.json()), 5)
+
+    def test_source_kept_when_copy_differs(self):
+        sync_rows = rebalance_shards.Command.sync_rows
+
+        def still_writing(command, model, source, target, batch_size, apply=True):
+            if not apply and model is Measurement:
+                add_reading(self.patient, score=0.9)
+            return sync_rows(command, model, source, target, batch_size, apply)
+
+        with mock.patch('time.sleep'), \
+                mock.patch.object(rebalance_shards.Command, 'sync_rows', autospec=True, side_effect=still_writing):
+            with self.assertRaises(CommandError):
+                self.move()
+
+        self.assertEqual(self.assignment().alias, 'shard1')
+        self.assertFalse(self.assignment().locked)
+        self.assertEqual(Measurement.objects.using('shard1').count(), 4)
+
+        # a second run finishes the move
+        with mock.patch('time.sleep'):
+            self.move()
+        self.assertEqual(self.assignment().alias, 'shard2')
+        self.assertEqual(Measurement.objects.using('shard2').count(), 4)
+        self.assertFalse(Patient.objects.using('shard1').exists())
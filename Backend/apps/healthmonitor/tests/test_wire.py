@@ -0,0 +1,107 @@
+from unittest import skipUnless
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.healthmonitor import wire
+from apps.healthmonitor.parsers import HAS_MSGPACK
+from apps.healthmonitor.models import Measurement, Patient
+from apps.users.models import User
+
+
+def vitals(*rows):
+    return np.array(list(rows), dtype=wire.VITALS_DTYPE)
+
+
+READING = (80, 97, 120, 80, 16, 37.1)
+NO_OPTIONALS = (90, 95, 130, 85, np.nan, np.nan)
+
+
+class WireFormatTests(SimpleTestCase):
+    def test_round_trip(self):
+        patient_id, records = wire.decode(wire.encode(42, vitals(READING, NO_OPTIONALS)))
+        self.assertEqual(patient_id, 42)
+        batch = wire.VitalsBatch(patient_id, records)
+        self.assertEqual(len(batch), 2)
+        np.testing.assert_array_equal(batch.as_matrix(), [READING, NO_OPTIONALS])
+
+    def test_truncated_payload(self):
+        payload = wire.encode(42, vitals(READING, READING))
+        with self.assertRaisesMessage(wire.WireFormatError, 'shorter than header'):
+            wire.decode(payload[:wire.HEADER.size - 1])
+        with self.assertRaisesMessage(wire.WireFormatError, 'Expected 68 bytes for 2 records, got 67'):
+            wire.decode(payload[:-1])
+
+    def test_bad_magic_and_version(self):
+        records = vitals(READING).tobytes()
+        with self.assertRaisesMessage(wire.WireFormatError, 'Bad magic'):
+            wire.decode(wire.HEADER.pack(b'HMV2', wire.VERSION, 0, 0, 42, 1) + records)
+        with self.assertRaisesMessage(wire.WireFormatError, 'Unsupported wire format version 2'):
+            wire.decode(wire.HEADER.pack(wire.MAGIC, 2, 0, 0, 42, 1) + records)
+
+    def test_count_must_match_body(self):
+        records = vitals(READING, READING).tobytes()
+        for count in (1, 3):
+            with self.assertRaises(wire.WireFormatError):
+                wire.decode(wire.HEADER.pack(wire.MAGIC, wire.VERSION, 0, 0, 42, count) + records)
+
+
+@override_settings(HEALTHMONITOR_SHARDS=['default'], DATABASE_REPLICAS={})
+class BinaryIngestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('device', password='device-password')
+        self.patient = Patient.objects.create(user=self.user, full_name='Wired')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, payload):
+        return self.client.post(f'/api/health/patients/{self.patient.pk}/measurements/', payload,
+                                content_type=wire.MEDIA_TYPE)
+
+    def test_valid_payload_is_stored(self):
+        response = self.post(wire.encode(self.patient.pk, vitals(READING, NO_OPTIONALS)))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['count'], 2)
+        stored = list(Measurement.objects.order_by('id').values_list('respiratory_rate', 'temperature'))
+        # NaN in an optional vital means absent, stored as NULL
+        self.assertEqual(stored, [(16, 37.1), (None, None)])
+
+    def test_malformed_payloads_are_parse_errors(self):
+        payload = wire.encode(self.patient.pk, vitals(READING))
+        for bad in (payload[:-1], b'XXXX' + payload[4:], payload + b'\0' * 4):
+            response = self.post(bad)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Binary parse error', response.json()['detail'])
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_nan_and_out_of_range_vitals_are_rejected(self):
+        response = self.post(wire.encode(self.patient.pk, vitals(
+            READING, (np.nan, 97, 120, 80, 16, 37), (80, 97, 120, 80, 16, 50), (np.inf, 97, 120, 80, 16, 37))))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['records'], [
+            'record 3: heart_rate must be between 30 and 200.',
+            'record 1: heart_rate is required.',
+            'record 2: temperature must be between 35 and 42.',
+        ])
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_patient_must_match_the_url(self):
+        response = self.post(wire.encode(self.patient.pk + 1, vitals(READING)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('patient_id', response.json())
+
+    @skipUnless(HAS_MSGPACK, 'msgpack is not installed')
+    def test_messagepack_payloads(self):
+        import msgpack
+        url = f'/api/health/patients/{self.patient.pk}/measurements/'
+        records = vitals(READING, NO_OPTIONALS).tobytes()
+        response = self.client.post(url, msgpack.packb({'patient_id': self.patient.pk, 'records': records}),
+                                    content_type='application/x-msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['count'], 2)
+
+        truncated = msgpack.packb({'patient_id': self.patient.pk, 'records': records[:-1]})
+        response = self.client.post(url, truncated, content_type='application/x-msgpack')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('MessagePack parse error', response.json()['detail'])
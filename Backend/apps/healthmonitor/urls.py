@@ -4,13 +4,21 @@ from .views import (
     PatientDetailView,
     MeasurementListCreateView,
     MeasurementDetailView,
-    PredictionForMeasurementView
+    PredictionForMeasurementView,
+    TriageView,
+    RecentVitalsView,
+    ModelStatsView,
+    DriftReportView,
 )
 
 urlpatterns = [
     path('patients/', PatientListCreateView.as_view(), name='patients_list_create'),
     path('patients/<int:id>/', PatientDetailView.as_view(), name='patient_detail'),
     path('patients/<int:patient_id>/measurements/', MeasurementListCreateView.as_view(), name='measurements_create'),
+    path('patients/<int:patient_id>/recent/', RecentVitalsView.as_view(), name='patient_recent_vitals'),
     path('measurements/<int:id>/', MeasurementDetailView.as_view(), name='measurement_detail'),
     path('measurements/<int:measurement_id>/prediction/', PredictionForMeasurementView.as_view(), name='measurement_prediction'),
+    path('triage/', TriageView.as_view(), name='triage'),
+    path('model/stats/', ModelStatsView.as_view(), name='model_stats'),
+    path('model/drift/', DriftReportView.as_view(), name='model_drift'),
 ]
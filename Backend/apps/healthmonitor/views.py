@@ -1,25 +1,141 @@
-from rest_framework import generics, permissions, status
+from rest_framework import generics, permissions, status, serializers
 from rest_framework.response import Response
-from .models import Patient, Measurement, Prediction
-from .serializers import PatientSerializer, MeasurementSerializer, PredictionSerializer
+from rest_framework.views import APIView
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import APIException
+from .models import Patient, Measurement, Prediction, PatientRiskState
+from .serializers import PatientSerializer, MeasurementSerializer, PredictionSerializer, TriageSerializer, MeasurementRowSerializer
 from django.shortcuts import get_object_or_404
-from core.ai_model import HealthAI
+from core.ai_model import FEATURE_KEYS, HealthAI, drift_report, model_file_version
+from core.vitals_ring import get_vitals_ring
+from core.inference_server import get_inference_client
+from core.db_routers import replica_reads, mark_recent_write, recently_wrote
+from core.sharding import fan_out, lookup_shard, sharding_enabled, use_shard
+from .ingest import validate_vitals, store_scored_measurements
+from .coalescer import get_coalescer
+from . import recent
+from .parsers import VITALS_PARSERS
+from .renderers import VitalsBinaryRenderer, fast_renderers
+from .wire import VitalsBatch
+from django.conf import settings
 from django.http import Http404
+from django.db import router, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag, patch_vary_headers
+from django.utils.http import http_date
+import heapq
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
-class PatientListCreateView(generics.ListCreateAPIView):
+def explain_requested(request):
+    """?explain=1 asks for per-vital contributions to the model score."""
+    return request.query_params.get('explain', '').lower() in ('1', 'true', 'yes')
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your data is being moved to another database. Retry shortly.'
+    default_code = 'shard_moving'
+
+class ShardRoutingMixin:
+    """
+    Run the request against the shard holding the user's data (see core.sharding).
+    Writes are refused with 503 while rebalance_shards is moving the user.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user_id = getattr(request.user, 'pk', None)
+        if user_id is None or not sharding_enabled():
+            return
+        alias, locked = lookup_shard(user_id)
+        if locked and request.method not in permissions.SAFE_METHODS:
+            raise ShardMoving()
+        self._shard_context = use_shard(alias)
+        self._shard_context.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        context = getattr(self, '_shard_context', None)
+        if context is not None:
+            self._shard_context = None
+            context.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests from the read replica unless the user wrote recently;
+    unsafe requests read and write on the primary and start the sticky window.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user_id = getattr(request.user, 'pk', None)
+        if request.method in permissions.SAFE_METHODS and not recently_wrote(user_id):
+            self._replica_context = replica_reads()
+            self._replica_context.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        context = getattr(self, '_replica_context', None)
+        if context is not None:
+            self._replica_context = None
+            context.__exit__(None, None, None)
+        elif request.method not in permissions.SAFE_METHODS and response.status_code < 400:
+            mark_recent_write(getattr(request.user, 'pk', None))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for GET from a cheap change marker.
+    Subclasses return (marker datetime, extra validator parts) from get_validator(),
+    or None to skip; the response body is only built when the client copy is stale.
+    """
+
+    def get_validator(self):
+        """(marker datetime, extra validator parts) for the current request, or None for a plain GET."""
+        return None
+
+    def get(self, request, *args, **kwargs):
+        validator = self.get_validator()
+        if validator is None:
+            return super().get(request, *args, **kwargs)
+        modified, parts = validator
+        etag = quote_etag('-'.join(str(p) for p in (
+            format(int(modified.timestamp() * 1e6), 'x'), *parts, request.accepted_media_type)))
+        last_modified = int(modified.timestamp())
+        # HTTP dates have one-second resolution; only honour If-Modified-Since once that
+        # second is over so a second write within it cannot be answered with a stale 304
+        settled = last_modified < int(timezone.now().timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified if settled else None)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+class PatientListCreateView(ShardRoutingMixin, ReplicaReadMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = PatientSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
         return Patient.objects.filter(user=self.request.user)
 
+    def get_validator(self):
+        # count catches deletions, the max marker catches creations and edits
+        marker = self.get_queryset().aggregate(modified=Max('data_modified_at'), count=Count('id'))
+        if marker['modified'] is None:
+            return None
+        return marker['modified'], (marker['count'],)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class PatientDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PatientDetailView(ShardRoutingMixin, ReplicaReadMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = PatientSerializer
     permission_classes = (permissions.IsAuthenticated,)
     lookup_field = 'id'
@@ -27,49 +143,112 @@ class PatientDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Patient.objects.filter(user=self.request.user)
 
-class MeasurementListCreateView(generics.ListCreateAPIView):
+    def perform_update(self, serializer):
+        serializer.save(data_modified_at=timezone.now())
+
+    def perform_destroy(self, instance):
+        # hide now, purge in the background (purge_deleted_patients) instead of a blocking cascade
+        instance.soft_delete()
+
+class MeasurementListCreateView(ShardRoutingMixin, ReplicaReadMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = MeasurementSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    # JSON stays the default; gateways may POST packed float32 batches instead (see wire.py)
+    parser_classes = list(api_settings.DEFAULT_PARSER_CLASSES) + VITALS_PARSERS
+    renderer_classes = fast_renderers(VitalsBinaryRenderer)
+    max_batch_size = 10000
 
     def get_queryset(self):
         patient_id = self.kwargs.get('patient_id')
-        return Measurement.objects.filter(patient__id=patient_id, patient__user=self.request.user)
+        return Measurement.objects.filter(patient__id=patient_id, patient__user=self.request.user,
+                                          patient__deleted_at__isnull=True)
+
+    def get_validator(self):
+        modified = (Patient.objects
+                    .filter(id=self.kwargs.get('patient_id'), user=self.request.user)
+                    .values_list('data_modified_at', flat=True)
+                    .first())
+        return None if modified is None else (modified, ())
+
+    def list(self, request, *args, **kwargs):
+        # read fast path: one joined values_list() query shaped without DRF field objects
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        return Response(MeasurementRowSerializer().many(queryset))
 
     def perform_create(self, serializer):
         patient = get_object_or_404(Patient, id=self.kwargs.get('patient_id'), user=self.request.user)
-        measurement = serializer.save(patient=patient)
-
+        coalescer = get_coalescer()
+        if coalescer is not None:
+            # scored and committed together with concurrent readings (INGEST_COALESCE)
+            serializer.instance, self.explanation = coalescer.submit(
+                patient, serializer.validated_data, explain=explain_requested(self.request))
+            return
+        data = serializer.validated_data
         try:
-            ai = HealthAI()
-            result = ai.predict({
-                'heart_rate': measurement.heart_rate,
-                'spo2': measurement.spo2,
-                'systolic': measurement.systolic,
-                'diastolic': measurement.diastolic,
-                'respiratory_rate': measurement.respiratory_rate,
-                'temperature': measurement.temperature,
-            })
-
-            if "error" in result:
-                logger.error(f"AI Error for measurement {measurement.id}: {result.get('detail')}")
-                score = 0.0
-                label = "invalid"
-            else:
-                score = float(result['risk_score'])
-                label = result['risk_label']
-
-            Prediction.objects.create(
-                measurement=measurement,
-                risk_score=score,
-                risk_label=label
-            )
-
+            result = HealthAI().predict({k: data.get(k) for k in FEATURE_KEYS},
+                                        explain=explain_requested(self.request))
         except Exception as e:
-            logger.exception(f"AI failure for measurement {measurement.id}: {e}")
+            logger.exception(f"AI failure for patient {patient.id}: {e}")
+            result = None
+
+        # measurement, prediction and risk state commit together, and the ETag marker only
+        # moves once they are all written, so a concurrent GET cannot cache a half-scored state
+        db = router.db_for_write(Measurement, instance=patient)
+        with transaction.atomic(using=db):
+            measurement = serializer.save(patient=patient)
+            if result is not None:
+                self.explanation = result.get('explanation')
+                if "error" in result:
+                    logger.error(f"AI Error for measurement {measurement.id}: {result.get('detail')}")
+                    score = 0.0
+                    label = "invalid"
+                else:
+                    score = float(result['risk_score'])
+                    label = result['risk_label']
+                prediction = Prediction.objects.create(
+                    measurement=measurement,
+                    risk_score=score,
+                    risk_label=label
+                )
+                PatientRiskState.record(measurement, prediction)
+            Patient.touch([patient.pk])
+        if result is not None:
+            recent.publish(patient, [measurement])
+
+
+    def create_batch(self, request, batch):
+        """Validate, score and store a decoded binary batch with vectorized code paths."""
+        patient = get_object_or_404(Patient, id=self.kwargs.get('patient_id'), user=request.user)
+        if batch.patient_id != patient.id:
+            raise serializers.ValidationError({'patient_id': ['Does not match the patient in the URL.']})
+        if len(batch) == 0 or len(batch) > self.max_batch_size:
+            raise serializers.ValidationError({'records': [f'Send between 1 and {self.max_batch_size} records.']})
 
+        X = batch.as_matrix()
+        errors = validate_vitals(X)
+        if errors:
+            raise serializers.ValidationError({'records': errors})
+
+        explain = explain_requested(request)
+        result = HealthAI().predict_batch(X, explain=explain)
+        measurements = store_scored_measurements(patient, X, result)
+        rows = [
+            {'id': m.id, 'risk_score': m.prediction.risk_score, 'risk_label': m.prediction.risk_label}
+            for m in measurements
+        ]
+        if explain:
+            for row, contributions in zip(rows, result['contributions']):
+                row['explanation'] = HealthAI.explanation(result['baseline'], contributions)
+        return Response({
+            'patient': patient.id,
+            'count': len(measurements),
+            'measurements': rows,
+        }, status=status.HTTP_201_CREATED)
 
     # override create to ensure response includes nested prediction
     def create(self, request, *args, **kwargs):
+        if isinstance(request.data, VitalsBatch):
+            return self.create_batch(request, request.data)
         response = super().create(request, *args, **kwargs)
         # re-serialize the created object including prediction
         try:
@@ -78,28 +257,66 @@ class MeasurementListCreateView(generics.ListCreateAPIView):
             if created_id:
                 instance = Measurement.objects.select_related('prediction').get(id=created_id, patient__user=request.user)
                 data = MeasurementSerializer(instance, context={'request': request}).data
+                if explain_requested(request) and data.get('prediction'):
+                    data['prediction']['explanation'] = getattr(self, 'explanation', None)
                 return Response(data, status=status.HTTP_201_CREATED)
         except Exception:
             pass
         return response
 
-class MeasurementDetailView(generics.RetrieveDestroyAPIView):
+class MeasurementDetailView(ShardRoutingMixin, ReplicaReadMixin, generics.RetrieveDestroyAPIView):
     serializer_class = MeasurementSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = fast_renderers()
     lookup_field = 'id'
 
     def get_queryset(self):
-        return Measurement.objects.filter(patient__user=self.request.user)
+        return Measurement.objects.filter(patient__user=self.request.user, patient__deleted_at__isnull=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        data = MeasurementRowSerializer().one(self.get_queryset().filter(id=self.kwargs.get('id')))
+        if data is None:
+            raise Http404
+        return Response(data)
+
+    def perform_destroy(self, instance):
+        patient = instance.patient
+        instance.delete()
+        PatientRiskState.refresh(patient)
+        Patient.touch([patient.pk])
+        recent.forget(patient.pk)
 
-class PredictionForMeasurementView(generics.RetrieveAPIView):
+class PredictionForMeasurementView(ShardRoutingMixin, ReplicaReadMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = PredictionSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    def get_validator(self):
+        modified = (Measurement.objects
+                    .filter(id=self.kwargs.get('measurement_id'), patient__user=self.request.user,
+                            patient__deleted_at__isnull=True)
+                    .values_list('patient__data_modified_at', flat=True)
+                    .first())
+        if modified is None:
+            return None
+        # explanations come from the current model, so a model swap must change the ETag
+        return modified, ((model_file_version(),) if explain_requested(self.request) else ())
+
+    def retrieve(self, request, *args, **kwargs):
+        prediction = self.get_object()
+        data = self.get_serializer(prediction).data
+        if explain_requested(request):
+            m = prediction.measurement
+            X = np.array([[np.nan if getattr(m, k) is None else getattr(m, k) for k in FEATURE_KEYS]], dtype=np.float64)
+            result = HealthAI(monitor_drift=False).predict_batch(X, explain=True)
+            data['explanation'] = HealthAI.explanation(result['baseline'], result['contributions'][0])
+        return Response(data)
+
     def get_object(self):
         measurement = get_object_or_404(
             Measurement,
             id=self.kwargs.get('measurement_id'),
-            patient__user=self.request.user
+            patient__user=self.request.user,
+            patient__deleted_at__isnull=True,
         )
 
         try:
@@ -107,3 +324,106 @@ class PredictionForMeasurementView(generics.RetrieveAPIView):
         except Prediction.DoesNotExist:
             raise Http404("Prediction does not exist for this measurement.")
 
+class TriageView(ShardRoutingMixin, ReplicaReadMixin, generics.ListAPIView):
+    """
+    Highest-risk patients of the current user, ordered by their latest risk_score.
+    Reads the maintained PatientRiskState table, so cost depends on `limit`, not on patient count.
+    Staff may pass ?scope=all for the queue across all users, merged from every shard.
+    """
+    serializer_class = TriageSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    default_limit = 20
+    max_limit = 500
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', self.default_limit))
+        except (TypeError, ValueError):
+            limit = self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def all_users(self):
+        return self.request.query_params.get('scope') == 'all' and self.request.user.is_staff
+
+    def get_queryset(self):
+        # a reading stored while its patient was being deleted can re-create the state row
+        qs = PatientRiskState.objects.filter(patient__deleted_at__isnull=True)
+        if not self.all_users():
+            qs = qs.filter(user=self.request.user)
+        label = self.request.query_params.get('label')
+        if label:
+            qs = qs.filter(risk_label=label)
+        return (qs.select_related('patient', 'measurement')
+                  .order_by('-risk_score', '-updated_at')[:self.get_limit()])
+
+    def list(self, request, *args, **kwargs):
+        if not (self.all_users() and sharding_enabled()):
+            return super().list(request, *args, **kwargs)
+        # top-K per shard in parallel, then a K-way merge of the already sorted lists
+        per_shard = fan_out(lambda alias: list(self.get_queryset()))
+        merged = heapq.merge(*per_shard.values(), key=lambda s: (-s.risk_score, -s.updated_at.timestamp()))
+        rows = list(merged)[:self.get_limit()]
+        return Response(self.get_serializer(rows, many=True).data)
+
+class RecentVitalsView(ShardRoutingMixin, ReplicaReadMixin, APIView):
+    """
+    Latest readings of a patient with short-window trends, served from the host's
+    shared-memory ring (see core.vitals_ring) without a database query when it is warm.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = fast_renderers()
+    default_n = 50
+
+    def get_n(self):
+        """?n= clamped to 1..VITALS_RING_DEPTH, the most readings the ring keeps per patient."""
+        try:
+            n = int(self.request.query_params.get('n', self.default_n))
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({'n': ['A whole number is required.']})
+        return max(1, min(n, settings.VITALS_RING_DEPTH))
+
+    def get(self, request, patient_id):
+        found = recent.recent_vitals(patient_id, request.user.pk, self.get_n())
+        if found is None:
+            raise Http404
+        records, source = found
+        readings = [
+            {'id': int(r['id']), 'timestamp': float(r['timestamp']),
+             **{k: (None if r[k] != r[k] else round(float(r[k]), 2)) for k in (*FEATURE_KEYS, 'risk_score')}}
+            for r in records
+        ]
+        return Response({
+            'patient': patient_id,
+            'source': source,
+            'readings': readings,
+            'trends': HealthAI.short_window_trends(records),
+        })
+
+class ModelStatsView(APIView):
+    """
+    Prediction cache, ingest group and inference server client statistics of the worker serving
+    the request, and vitals ring occupancy.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        ring = get_vitals_ring()
+        coalescer = get_coalescer()
+        inference = get_inference_client()
+        return Response({
+            'prediction_cache': HealthAI.cache_info(),
+            'vitals_ring': ring.stats() if ring is not None else None,
+            'ingest_coalescer': dict(coalescer.stats) if coalescer is not None else None,
+            'inference_server': dict(inference.stats, socket=inference.path) if inference is not None else None,
+        })
+
+class DriftReportView(APIView):
+    """Input drift of live traffic against the training distribution (PSI / KS per feature)."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        report = drift_report()
+        if report is None:
+            return Response({'detail': 'No drift reference available; retrain the model to create one.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(report)
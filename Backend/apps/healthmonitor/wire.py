@@ -0,0 +1,67 @@
+"""
+Compact binary wire format for device ingest.
+
+A payload is a fixed header followed by `count` packed little-endian records:
+
+    header  <4sBBHQI   magic b'HMV1', version, flags, reserved, patient_id, count
+    record  6 x <f4    heart_rate, spo2, systolic, diastolic, respiratory_rate, temperature
+
+Absent optional vitals (respiratory_rate, temperature) are sent as NaN.
+Responses use the same header with RESULT_DTYPE records (measurement id + vitals + risk score).
+"""
+import struct
+import numpy as np
+from core.ai_model import FEATURE_KEYS
+
+MEDIA_TYPE = 'application/vnd.healthmonitor.vitals'
+MAGIC = b'HMV1'
+VERSION = 1
+
+HEADER = struct.Struct('<4sBBHQI')
+
+VITALS_DTYPE = np.dtype([(k, '<f4') for k in FEATURE_KEYS])
+RESULT_DTYPE = np.dtype([('id', '<u8')] + [(k, '<f4') for k in FEATURE_KEYS] + [('risk_score', '<f4')])
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+class VitalsBatch:
+    """A decoded ingest payload: target patient and a structured array of VITALS_DTYPE records."""
+
+    def __init__(self, patient_id, records):
+        self.patient_id = patient_id
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def as_matrix(self):
+        """
+        (n, 6) float64 matrix in FEATURE_KEYS order, as expected by HealthAI.predict_batch.
+        Values are rounded to 3 decimals to drop float32 noise (37.1 -> 37.0999984 -> 37.1).
+        """
+        matrix = self.records.view('<f4').reshape(len(self.records), len(FEATURE_KEYS))
+        return np.round(matrix.astype(np.float64), 3)
+
+
+def decode(payload, dtype=VITALS_DTYPE):
+    """Returns (patient_id, records) without copying the record bytes."""
+    if len(payload) < HEADER.size:
+        raise WireFormatError('Payload shorter than header.')
+    magic, version, _flags, _reserved, patient_id, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise WireFormatError('Bad magic number.')
+    if version != VERSION:
+        raise WireFormatError(f'Unsupported wire format version {version}.')
+    expected = HEADER.size + count * dtype.itemsize
+    if len(payload) != expected:
+        raise WireFormatError(f'Expected {expected} bytes for {count} records, got {len(payload)}.')
+    records = np.frombuffer(payload, dtype=dtype, count=count, offset=HEADER.size)
+    return patient_id, records
+
+
+def encode(patient_id, records, dtype=VITALS_DTYPE):
+    records = np.ascontiguousarray(records, dtype=dtype)
+    return HEADER.pack(MAGIC, VERSION, 0, 0, patient_id, len(records)) + records.tobytes()
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 # Middleware configuration : https://docs.djangoproject.com/en/3.2/topics/http/middleware/
 # Middleware is a way to process requests globally before they reach the view or after the view has processed them.
 MIDDLEWARE = [
+    # first, so a profile covers the whole request; removes itself unless profiling is configured
+    'core.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,6 +78,58 @@ DATABASES = {
     }
 }
 
+# Optional read replica: healthmonitor list/export/aggregation/triage reads are routed to it
+# by core.db_routers.HealthMonitorRouter; writes and read-your-own-writes stay on 'default'.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', os.getenv('DB_PORT')),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Horizontal sharding of healthmonitor data by user (core.sharding). Each extra alias in
+# HEALTHMONITOR_EXTRA_SHARDS (comma separated, e.g. "shard1,shard2") is configured from
+# DB_<ALIAS>_NAME / DB_<ALIAS>_HOST / DB_<ALIAS>_PORT, falling back to the default database's values.
+HEALTHMONITOR_SHARDS = ['default'] + [a for a in os.getenv('HEALTHMONITOR_EXTRA_SHARDS', '').split(',') if a]
+for _alias in HEALTHMONITOR_SHARDS[1:]:
+    _prefix = f'DB_{_alias.upper()}_'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(_prefix + 'NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv(_prefix + 'HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv(_prefix + 'PORT', DATABASES['default']['PORT']),
+    }
+if len(HEALTHMONITOR_SHARDS) > 1:
+    # interleave auto-increment ids by shard (core.sharding.SHARD_ID_STRIDE) so they are globally unique;
+    # merged into each alias's own copy of OPTIONS (shards start as copies of 'default'), keeping any init_command
+    for _index, _alias in enumerate(HEALTHMONITOR_SHARDS):
+        _options = dict(DATABASES[_alias].get('OPTIONS', {}))
+        _init = f'SET SESSION auto_increment_increment = 64, auto_increment_offset = {_index + 1}'
+        _options['init_command'] = '; '.join(filter(None, [_options.get('init_command'), _init]))
+        DATABASES[_alias]['OPTIONS'] = _options
+
+# Cache holding the user -> shard map and the replica sticky window. The default LocMemCache lives in
+# each process, so with several workers a write only pins reads to the primary in the worker that handled
+# it (read-your-own-writes holds per worker, not per user). Run a shared backend in that case, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1;
+# `manage.py check` warns (healthmonitor.W001) when a replica or shards are configured without one.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds the user -> shard map is cached (use a shared cache when running several workers)
+SHARD_MAP_CACHE_SECONDS = int(os.getenv('SHARD_MAP_CACHE_SECONDS', 60))
+
+DATABASE_ROUTERS = ['core.db_routers.HealthMonitorRouter']
+
+# Seconds a user's reads stay on the primary after they write. Stickiness is stored in CACHES
+# (see above), so it only follows the user across workers with a shared backend.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
 # Custom user model definition 
 AUTH_USER_MODEL = 'users.User'
 
@@ -156,6 +210,49 @@ LOGGING = {
     },
 }
 
+# HealthAI: size of the in-process LRU of predictions for repeated readings (0 disables it)
+HEALTHAI_CACHE_SIZE = int(os.getenv('HEALTHAI_CACHE_SIZE', 4096))
+
+# HealthAI input drift monitoring: per-worker sketches are merged into this snapshot file.
+# Off by default since every worker then writes the file; turn it on where the report is used.
+HEALTHAI_DRIFT_MONITORING = os.getenv('HEALTHAI_DRIFT_MONITORING', 'False') == 'True'
+HEALTHAI_DRIFT_SNAPSHOT = os.getenv('HEALTHAI_DRIFT_SNAPSHOT', str(BASE_DIR / 'drift_snapshot.npz'))
+HEALTHAI_DRIFT_FLUSH_SECONDS = int(os.getenv('HEALTHAI_DRIFT_FLUSH_SECONDS', 60))
+
+# Shared-memory ring of each active patient's latest readings (core.vitals_ring), shared by all
+# workers on a host. Off unless a path is set; use tmpfs, e.g. /dev/shm/healthmonitor-vitals.ring.
+# About n_slots * depth * 88 bytes; delete the file after changing the sizes.
+VITALS_RING_PATH = os.getenv('VITALS_RING_PATH', '')
+VITALS_RING_SLOTS = int(os.getenv('VITALS_RING_SLOTS', 4096))
+VITALS_RING_DEPTH = int(os.getenv('VITALS_RING_DEPTH', 128))
+
+# Group commit for single-reading POSTs (apps/healthmonitor/coalescer.py): concurrent readings in a worker
+# process are scored and stored together, waiting at most MAX_WAIT_MS for up to MAX_BATCH of them.
+# Off by default; only useful with threaded workers.
+INGEST_COALESCE = os.getenv('INGEST_COALESCE', 'False') == 'True'
+INGEST_COALESCE_MAX_BATCH = int(os.getenv('INGEST_COALESCE_MAX_BATCH', 64))
+INGEST_COALESCE_MAX_WAIT_MS = float(os.getenv('INGEST_COALESCE_MAX_WAIT_MS', 5))
+# Longest a request waits for its group to be picked up (it then gets 503), and again for it to be stored
+INGEST_COALESCE_TIMEOUT_SECONDS = float(os.getenv('INGEST_COALESCE_TIMEOUT_SECONDS', 10))
+
+# Shared inference server (core/inference_server.py, `manage.py inference_server`): one process per host
+# holds the model and batches requests from all workers over this Unix socket. Empty = every worker
+# scores in-process. Workers fall back to their own model when the server does not answer within
+# TIMEOUT seconds, and retry the server RETRY_SECONDS later.
+HEALTHAI_INFERENCE_SOCKET = os.getenv('HEALTHAI_INFERENCE_SOCKET', '')
+HEALTHAI_INFERENCE_MAX_BATCH = int(os.getenv('HEALTHAI_INFERENCE_MAX_BATCH', 256))
+HEALTHAI_INFERENCE_MAX_WAIT_MS = float(os.getenv('HEALTHAI_INFERENCE_MAX_WAIT_MS', 2))
+HEALTHAI_INFERENCE_TIMEOUT = float(os.getenv('HEALTHAI_INFERENCE_TIMEOUT', 1.0))
+HEALTHAI_INFERENCE_RETRY_SECONDS = float(os.getenv('HEALTHAI_INFERENCE_RETRY_SECONDS', 5))
+
+# Request profiling (core.profiling): cProfile a random share of requests, or any request sending
+# PROFILING_HEADER with the PROFILING_TOKEN secret. Both off by default. Inspect with `manage.py profile_report`.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.0))
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_HEADER = 'X-Profile'
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_BYTES = int(os.getenv('PROFILING_MAX_BYTES', 200 * 1024 * 1024))
+
 # Email configuration
 EMAIL_SETTINGS = {
     'EMAIL_BACKEND': os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend'),
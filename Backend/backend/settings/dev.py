@@ -21,3 +21,34 @@ if DB_NAME and DB_USER:
             'PORT': DB_PORT,
         }
     }
+
+# Local replica testing with two SQLite files: SQLITE_REPLICA=True
+# (run `migrate` for both aliases, or copy db.sqlite3 to db-replica.sqlite3 to simulate replication)
+if os.getenv('SQLITE_REPLICA') == 'True':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db-replica.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+# Local sharding with several SQLite files: SQLITE_SHARDS=3 uses db.sqlite3 plus
+# db-shard1.sqlite3 and db-shard2.sqlite3 (run `migrate --database <alias>` for each)
+if int(os.getenv('SQLITE_SHARDS', 1)) > 1:
+    HEALTHMONITOR_SHARDS = ['default'] + [f'shard{i}' for i in range(1, int(os.getenv('SQLITE_SHARDS')))]
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+    }
+    for _alias in HEALTHMONITOR_SHARDS[1:]:
+        DATABASES[_alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'db-{_alias}.sqlite3',
+        }
@@ -0,0 +1,24 @@
+"""
+Settings for the test suite: `python manage.py test --settings=backend.settings.test`.
+
+SQLite only. Besides `default` there is a `replica` that is NOT mirrored (so a test
+can tell which database answered a read) and two extra shards. Tests that are not
+about sharding or replicas narrow HEALTHMONITOR_SHARDS / DATABASE_REPLICAS with
+override_settings.
+"""
+from .base import *
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / f'test-{alias}.sqlite3'}
+    for alias in ('default', 'replica', 'shard1', 'shard2')
+}
+HEALTHMONITOR_SHARDS = ['default', 'shard1', 'shard2']
+
+# one process: the per-process cache is shared by everything a test does
+SILENCED_SYSTEM_CHECKS = ['healthmonitor.W001']
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+HEALTHAI_DRIFT_MONITORING = False
@@ -1,8 +1,14 @@
 # health_ai.py
 import os
+import atexit
+import threading
+from collections import OrderedDict
 import numpy as np
 from django.conf import settings
 import logging
+from core.attribution import TreeAttributor
+from core.drift import DriftMonitor, HistogramSketch, compare as compare_sketches
+from core.inference_server import get_inference_client
 
 MODEL_PATH = os.path.join(
     getattr(settings, "BASE_DIR", os.path.dirname(os.path.abspath(__file__))),
@@ -17,6 +23,152 @@ try:
 except Exception:
     HAS_JOBLIB = False
 
+FEATURE_KEYS = ['heart_rate','spo2','systolic','diastolic','respiratory_rate','temperature']
+
+# decimals kept by bedside monitors for each vital; readings at this resolution are memoizable
+FEATURE_RESOLUTION = {
+    'heart_rate': 0,
+    'spo2': 0,
+    'systolic': 0,
+    'diastolic': 0,
+    'respiratory_rate': 0,
+    'temperature': 1,
+}
+
+
+class PredictionCache:
+    """
+    Thread-safe bounded LRU of predict() results.
+    Entries are keyed on (model_version, quantized feature tuple); a new
+    model version clears the cache so stale scores are never served.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+PREDICTION_CACHE = PredictionCache(getattr(settings, 'HEALTHAI_CACHE_SIZE', 4096))
+
+# reference input distribution written next to model.pkl by scripts/train_model.py
+DRIFT_REFERENCE_PATH = os.path.join(os.path.dirname(MODEL_PATH), "drift_reference.npz")
+
+# live input sketch of this process, folded into the shared snapshot file periodically
+DRIFT_MONITOR = DriftMonitor(
+    getattr(settings, 'HEALTHAI_DRIFT_SNAPSHOT', os.path.join(os.path.dirname(MODEL_PATH), "drift_snapshot.npz")),
+    flush_seconds=getattr(settings, 'HEALTHAI_DRIFT_FLUSH_SECONDS', 60),
+    enabled=getattr(settings, 'HEALTHAI_DRIFT_MONITORING', False),
+)
+atexit.register(DRIFT_MONITOR.flush)
+
+
+def drift_report(reset=False):
+    """
+    Compares the merged serving snapshot with the training reference.
+    Returns None when no reference sketch exists (retrain to create one).
+    """
+    if not os.path.exists(DRIFT_REFERENCE_PATH):
+        return None
+    DRIFT_MONITOR.flush()
+    snapshot = DRIFT_MONITOR.read_snapshot()
+    report = {
+        'reference': DRIFT_REFERENCE_PATH,
+        'snapshot': DRIFT_MONITOR.snapshot_path,
+        'features': compare_sketches(HistogramSketch.load(DRIFT_REFERENCE_PATH), snapshot),
+    }
+    if reset:
+        DRIFT_MONITOR.reset_snapshot()
+    return report
+
+# loaded models are shared by every HealthAI instance in the process and
+# reloaded only when the file changes on disk: {path: (version, model, attributor)}
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def model_file_version(path=MODEL_PATH):
+    """Cheap identity of the model file: mtime + size, or None if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def load_model(path=MODEL_PATH):
+    """
+    Returns (model, version). Reuses the process-wide copy unless the file changed,
+    in which case the model is reloaded and the prediction cache invalidated.
+    """
+    path = os.fspath(path)
+    version = model_file_version(path)
+    if not HAS_JOBLIB or version is None:
+        return None, None
+    loaded = _loaded.get(path)
+    if loaded is not None and loaded[0] == version:
+        return loaded[1], version
+    with _load_lock:
+        loaded = _loaded.get(path)
+        if loaded is None or loaded[0] != version:
+            try:
+                model = joblib.load(path)
+                logger.info("HealthAI: loaded model from %s", path)
+            except Exception as e:
+                logger.exception("Failed to load model: %s", e)
+                model = None
+            # per-tree attribution tables are built once here, not per request
+            loaded = _loaded[path] = (version, model, TreeAttributor.for_model(model))
+            PREDICTION_CACHE.clear()
+    return loaded[1], version
+
+
+def model_attributor(model, path=MODEL_PATH):
+    """The TreeAttributor built for `model` when it was loaded from `path`, or None."""
+    loaded = _loaded.get(os.fspath(path))
+    if loaded is None or loaded[1] is not model:
+        return None
+    return loaded[2]
+
 class HealthAI:
     """
     Improved hybrid HealthAI:
@@ -46,15 +198,28 @@ class HealthAI:
         'temperature_hypothermia': 30.0,  # very low temp
     }
 
-    def __init__(self):
-        self.model = None
-        if HAS_JOBLIB and os.path.exists(MODEL_PATH):
-            try:
-                self.model = joblib.load(MODEL_PATH)
-                logger.info("HealthAI: loaded model from %s", MODEL_PATH)
-            except Exception as e:
-                logger.exception("Failed to load model: %s", e)
-                self.model = None
+    def __init__(self, use_cache=True, model_path=MODEL_PATH, monitor_drift=True):
+        self.model_path = model_path
+        # the shared inference server (HEALTHAI_INFERENCE_SOCKET) only serves MODEL_PATH
+        self.inference = get_inference_client() if os.fspath(model_path) == os.fspath(MODEL_PATH) else None
+        if self.inference is None:
+            self._model, self.model_version = load_model(model_path)
+        else:
+            # loaded lazily, only for the fallback path and explanations
+            self._model, self.model_version = None, model_file_version(model_path)
+        self.use_cache = use_cache
+        # offline tools (replay, synthetic data) turn this off so only live traffic is sketched
+        self.monitor_drift = monitor_drift
+
+    @property
+    def model(self):
+        if self._model is None and self.inference is not None:
+            self._model, _ = load_model(self.model_path)
+        return self._model
+
+    @property
+    def attributor(self):
+        return model_attributor(self.model, self.model_path)
 
     # ---------- Validation ----------
     def validate_features(self, features: dict):
@@ -114,6 +279,9 @@ class HealthAI:
         Accepts X as 2D numpy array.
         Model is now a Pipeline with StandardScaler + GradientBoostingRegressor.
         """
+        remote = self.inference.predict(X) if self.inference is not None else None
+        if remote is not None:
+            return float(max(0.0, min(1.0, remote[0])))
         if self.model is None:
             return None
 
@@ -203,12 +371,71 @@ class HealthAI:
         score = min(1.0, score)
         return float(round(score, 3))
 
+    # ---------- Memoization ----------
+    def cache_key(self, features: dict):
+        """
+        Returns (model_version, quantized feature tuple) when every vital present is a
+        number already at device resolution, else None (the reading is scored uncached).
+        Absent vitals (missing or None) are keyed as None.
+        """
+        key = []
+        for k in FEATURE_KEYS:
+            v = features.get(k)
+            if v is None:
+                key.append(None)
+                continue
+            if isinstance(v, bool) or not isinstance(v, (int, float, np.integer, np.floating)):
+                return None
+            q = round(float(v), FEATURE_RESOLUTION[k])
+            if q != float(v):
+                return None
+            key.append(q)
+        return (self.model_version, tuple(key))
+
+    @staticmethod
+    def cache_info():
+        """Hit-rate statistics of the in-process prediction cache."""
+        info = PREDICTION_CACHE.info()
+        info['model_version'] = _loaded.get(os.fspath(MODEL_PATH), (None,))[0] or model_file_version()
+        return info
+
     # ---------- Public predict interface ----------
-    def predict(self, features: dict):
+    def predict(self, features: dict, explain=False):
         """
         features: dict with keys heart_rate, spo2, systolic, diastolic, respiratory_rate, temperature
         returns: dict with risk_score (0..1), risk_label, source ('model'|'rules'|'override'), reason
+        With explain=True it also has `explanation` (see explanation()); None unless source is 'model'.
+        Results for readings at device resolution are served from PREDICTION_CACHE.
+        A vital given as None is absent, like NaN in predict_batch.
         """
+        features = {k: v for k, v in features.items() if v is not None}
+        if self.monitor_drift:
+            self._record_drift(features)
+        key = self.cache_key(features) if self.use_cache else None
+        cached = PREDICTION_CACHE.get(key) if key is not None else None
+        if cached is not None:
+            result = dict(cached)
+            if explain and result.get('source') == 'model':
+                explained = self.explain([[float(features.get(k, 0)) for k in FEATURE_KEYS]])
+                if explained is not None:
+                    result['explanation'] = self.explanation(explained[0], explained[1][0])
+        else:
+            result = self._predict(features, explain)
+            if key is not None:
+                PREDICTION_CACHE.put(key, {k: v for k, v in result.items() if k != 'explanation'})
+        if explain:
+            result.setdefault('explanation', None)
+        return result
+
+    @staticmethod
+    def _record_drift(features: dict):
+        try:
+            row = [np.nan if features.get(k) is None else float(features[k]) for k in FEATURE_KEYS]
+        except (TypeError, ValueError):
+            return
+        DRIFT_MONITOR.record(row)
+
+    def _predict(self, features: dict, explain=False):
         # 1) Validate inputs
         ok, err = self.validate_features(features)
         if not ok:
@@ -233,11 +460,15 @@ class HealthAI:
             }
 
         # 3) Try model prediction (safe)
-        keys = ['heart_rate','spo2','systolic','diastolic','respiratory_rate','temperature']
-        X = np.array([[float(features.get(k, 0)) for k in keys]])
+        X = np.array([[float(features.get(k, 0)) for k in FEATURE_KEYS]])
+        explained = self.explain(X) if explain else None
         score = None
         try:
-            score = self._model_predict(X)
+            if explained is not None:
+                # the attribution walk ends in the same leaves as model.predict, so its total is the score
+                score = float(max(0.0, min(1.0, explained[0] + explained[1][0].sum())))
+            else:
+                score = self._model_predict(X)
         except Exception as e:
             logger.exception("Model predict wrapper error: %s", e)
             score = None
@@ -256,12 +487,135 @@ class HealthAI:
         # 5) model returned a valid score -> return it
         score = float(max(0.0, min(1.0, score)))
         label = self.score_to_label(score)
-        return {
+        result = {
             "risk_score": float(round(score, 3)),
             "risk_label": label,
             "source": "model",
             "reason": "model_probability"
         }
+        if explained is not None:
+            result["explanation"] = self.explanation(explained[0], explained[1][0])
+        return result
+
+    # ---------- Batch predict interface ----------
+    # defaults the scalar path uses for vitals that are absent from the features dict
+    RULE_DEFAULTS = np.array([0.0, 100.0, 120.0, 80.0, 16.0, 36.6])
+    HARD_RULE_REASONS = ['heart_rate_zero', 'low_spo2', 'severe_hypotension',
+                         'hypothermia_extreme', 'hyperpyrexia_with_instability']
+
+    def predict_batch(self, X, explain=False):
+        """
+        Vectorized equivalent of predict() for many readings at once.
+        X: array-like of shape (n, 6) in FEATURE_KEYS order; NaN marks an absent vital.
+        returns: dict of arrays risk_score, risk_label, source, reason (length n).
+        Rows failing validation get source 'invalid' and score 0.0.
+        With explain=True it also has `baseline` (None without attribution) and an (n, 6)
+        `contributions` array, NaN for rows the model did not score.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURE_KEYS))
+        n = X.shape[0]
+        if self.monitor_drift:
+            DRIFT_MONITOR.record_many(X)
+        present = ~np.isnan(X)
+        low = np.array([self.SAFE_BOUNDS[k][0] for k in FEATURE_KEYS])
+        high = np.array([self.SAFE_BOUNDS[k][1] for k in FEATURE_KEYS])
+        with np.errstate(invalid='ignore'):
+            valid = (~present | ((X >= low) & (X <= high))).all(axis=1)
+
+        F = np.where(present, X, self.RULE_DEFAULTS)
+        hr, spo2, sys, dia, rr, temp = F.T
+        t = self.CRITICAL_THRESHOLDS
+        hard_conditions = [
+            hr <= t['heart_rate_zero'],
+            spo2 <= t['spo2_critical'],
+            (sys <= t['systolic_extremely_low']) | (dia <= 30),
+            temp <= t['temperature_hypothermia'],
+            (temp >= 40.0) & (hr >= 120) & (rr >= 30),
+        ]
+        hard_idx = np.select(hard_conditions, np.arange(len(hard_conditions)), default=-1)
+        hard = valid & (hard_idx >= 0)
+
+        score = np.zeros(n)
+        source = np.full(n, 'invalid', dtype=object)
+        reason = np.full(n, 'invalid_input', dtype=object)
+
+        score[hard] = 1.0
+        source[hard] = 'override'
+        reason[hard] = np.array(self.HARD_RULE_REASONS, dtype=object)[hard_idx[hard]]
+
+        scored = valid & ~hard
+        model_input = np.where(present, X, 0.0)[scored]
+        explained = self.explain(model_input) if explain and len(model_input) else None
+        if explained is not None:
+            # the attribution walk ends in the same leaves as model.predict, so its total is the score
+            model_scores = np.clip(explained[0] + explained[1].sum(axis=1), 0.0, 1.0)
+        else:
+            model_scores = self._model_predict_batch(model_input)
+        if model_scores is None:
+            model_scores = np.full(scored.sum(), np.nan)
+        model_ok = ~np.isnan(model_scores)
+        rows = np.flatnonzero(scored)
+
+        ok_rows = rows[model_ok]
+        score[ok_rows] = np.clip(model_scores[model_ok], 0.0, 1.0)
+        source[ok_rows] = 'model'
+        reason[ok_rows] = 'model_probability'
+
+        for i in rows[~model_ok]:
+            score[i] = self.rule_based_score(dict(zip(FEATURE_KEYS, F[i])))
+            source[i] = 'rules'
+            reason[i] = 'model_unavailable_or_ood'
+
+        # label from the unrounded score, exactly like score_to_label in the scalar path
+        label = np.where(score < 0.33, 'low', np.where(score < 0.66, 'medium', 'high')).astype(object)
+        label[~valid] = 'invalid'
+        out = {'risk_score': np.round(score, 3), 'risk_label': label, 'source': source, 'reason': reason}
+        if explain:
+            out['baseline'] = None
+            out['contributions'] = np.full(X.shape, np.nan)
+            if explained is not None:
+                out['baseline'], out['contributions'][scored] = explained
+        return out
+
+    def _model_predict_batch(self, X):
+        """Model scores for a 2D array (NaN where the model gave no usable value), or None."""
+        remote = self.inference.predict(X) if self.inference is not None and len(X) else None
+        if remote is not None:
+            return np.clip(remote, 0.0, 1.0)
+        if self.model is None or len(X) == 0 or not hasattr(self.model, "predict"):
+            return None
+        try:
+            pred = np.asarray(self.model.predict(X), dtype=np.float64)
+        except Exception as e:
+            logger.exception("Model batch prediction failed: %s", e)
+            return None
+        return np.clip(pred, 0.0, 1.0)
+
+    # ---------- Feature attribution ----------
+    def explain(self, X):
+        """
+        Per-feature contributions to the model score for model inputs X (n, 6), computed
+        from the fitted trees (core.attribution). Returns (baseline, (n, 6) array) where
+        baseline + row sum is the unclipped model output, or None when the loaded model
+        is not a supported tree ensemble.
+        """
+        if self.attributor is None:
+            return None
+        try:
+            return self.attributor.baseline, self.attributor.explain(X)
+        except Exception as e:
+            logger.exception("Feature attribution failed: %s", e)
+            return None
+
+    @staticmethod
+    def explanation(baseline, contributions):
+        """JSON-ready form of one explained row: {'baseline', 'contributions': {vital: value}}."""
+        if baseline is None or np.isnan(contributions).any():
+            return None
+        return {
+            'baseline': round(float(baseline), 4),
+            'contributions': {k: round(float(v), 4) for k, v in zip(FEATURE_KEYS, contributions)},
+        }
 
     @staticmethod
     def score_to_label(score: float):
@@ -271,3 +625,32 @@ class HealthAI:
             return 'medium'
         else:
             return 'high'
+
+    @staticmethod
+    def short_window_trends(history):
+        """
+        Per-vital trend over a patient's recent readings: a structured array with a
+        `timestamp` (epoch seconds) field and one field per vital, oldest first, such
+        as core.vitals_ring's zero-copy windows. Slopes are per hour (least squares).
+        """
+        trends = {}
+        if history is None or len(history) == 0:
+            return trends
+        hours = (np.asarray(history['timestamp'], dtype=np.float64) - float(history['timestamp'][-1])) / 3600.0
+        for key in FEATURE_KEYS:
+            values = np.asarray(history[key], dtype=np.float64)
+            present = ~np.isnan(values)
+            if not present.any():
+                continue
+            v, t = values[present], hours[present]
+            slope = None
+            if len(v) >= 2 and np.ptp(t) > 0:
+                slope = float(np.polyfit(t, v, 1)[0])
+            trends[key] = {
+                'mean': round(float(v.mean()), 2),
+                'min': round(float(v.min()), 2),
+                'max': round(float(v.max()), 2),
+                'delta': round(float(v[-1] - v[0]), 2),
+                'slope_per_hour': None if slope is None else round(slope, 3),
+            }
+        return trends
@@ -0,0 +1,158 @@
+"""
+Per-feature contributions for tree ensemble predictions (path attribution, as in
+Saabas' treeinterpreter).
+
+Walking a tree from the root to a leaf, every split moves the node value by
+value[child] - value[node]; that change is credited to the split feature. The
+prediction is then exactly
+
+    baseline + sum of the feature contributions
+
+where the baseline is the ensemble's output before any split. For the squared
+error GradientBoostingRegressor this repo trains (and for random forests) the
+contributions add up to the model's unclipped prediction.
+
+Everything that depends only on the trees is computed at model load: the
+trees are flattened into padded (n_trees, max_nodes) arrays of children, split
+features and thresholds, and every leaf stores the summed contributions of its
+root-to-leaf path, already scaled by the tree weight. explain() then walks all
+trees for all rows together, one tree level per numpy step, and adds up the
+contributions stored at the leaves reached.
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# rows explained per numpy pass; keeps the (rows, trees) index arrays cache-sized
+CHUNK_ROWS = 256
+# up to this many rows one (rows, trees, features) gather beats a gather per feature
+SMALL_CHUNK_ROWS = 16
+
+
+class TreeAttributor:
+    def __init__(self, model, preprocess, trees, weight, base):
+        self.model = model
+        self.preprocess = preprocess
+        self.n_trees = len(trees)
+        self.n_features = trees[0].n_features
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        # nodes are renumbered breadth first so the right child always follows the
+        # left one. Leaves and padding point to themselves with an infinite
+        # threshold, so walking max_depth levels is safe for trees of any depth.
+        width = max(tree.node_count for tree in trees)
+        self.roots = (np.arange(self.n_trees) * width).astype(np.int32)
+        size = self.n_trees * width
+        self.left = np.arange(size, dtype=np.int32)
+        self.feature = np.zeros(size, dtype=np.int32)
+        self.threshold = np.full(size, np.inf)
+        # the whole root-to-leaf contribution, stored at every leaf
+        leaf_contributions = np.zeros((self.n_features, size))
+
+        root_values = 0.0
+        for tree, offset in zip(trees, self.roots):
+            value = tree.value[:, 0, 0]
+            root_values += value[0]
+            order = [(0, np.zeros(self.n_features))]  # (sklearn node, contribution so far)
+            position = 0
+            while position < len(order):
+                node, path = order[position]
+                i = offset + position
+                left, right = tree.children_left[node], tree.children_right[node]
+                if left < 0:
+                    leaf_contributions[:, i] = path
+                else:
+                    f = tree.feature[node]
+                    self.left[i] = offset + len(order)
+                    self.feature[i] = f
+                    self.threshold[i] = tree.threshold[node]
+                    for child in (left, right):
+                        child_path = path.copy()
+                        child_path[f] += weight * (value[child] - value[node])
+                        order.append((child, child_path))
+                position += 1
+        self.leaf_contributions = np.ascontiguousarray(leaf_contributions.T)
+        self.leaf_columns = list(leaf_contributions)
+        self.baseline = float(base + weight * root_values)
+
+    @classmethod
+    def for_model(cls, model):
+        """Attributor for a fitted model, or None when the model is not a supported tree ensemble."""
+        if model is None:
+            return None
+        # imported here rather than at module level: workers that leave inference to
+        # core.inference_server never load a model and so never pay for sklearn
+        try:
+            from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+            from sklearn.pipeline import Pipeline
+        except Exception:
+            return None
+        preprocess, estimator = None, model
+        if isinstance(model, Pipeline):
+            preprocess, estimator = model[:-1], model[-1]
+        try:
+            if isinstance(estimator, GradientBoostingRegressor) and estimator.loss == 'squared_error':
+                trees = [e[0].tree_ for e in estimator.estimators_]
+                zeros = np.zeros((1, estimator.n_features_in_))
+                base = 0.0 if estimator.init_ == 'zero' else float(np.ravel(estimator.init_.predict(zeros))[0])
+                return cls(model, _Preprocess(preprocess), trees, estimator.learning_rate, base)
+            if isinstance(estimator, (RandomForestRegressor, ExtraTreesRegressor)):
+                trees = [e.tree_ for e in estimator.estimators_]
+                return cls(model, _Preprocess(preprocess), trees, 1.0 / len(trees), 0.0)
+        except Exception as e:
+            logger.exception("Feature attribution unavailable for this model: %s", e)
+        return None
+
+    def explain(self, X):
+        """
+        Contributions for the model inputs X (n, n_features), as an (n, n_features)
+        array whose rows add up to prediction - baseline.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features)
+        # trees compare float32 inputs against float64 thresholds, like sklearn does
+        Z = self.preprocess(X).astype(np.float32)
+        out = np.empty(X.shape)
+        for start in range(0, len(Z), CHUNK_ROWS):
+            out[start:start + CHUNK_ROWS] = self._explain_chunk(Z[start:start + CHUNK_ROWS])
+        return out
+
+    def _explain_chunk(self, Z):
+        n = len(Z)
+        # feature-major copy: the value of feature f in row r sits at f * n + r
+        values = np.ascontiguousarray(Z.T).ravel()
+        value_offset = self.feature * np.int32(n)
+        rows = np.arange(n, dtype=np.int32)[:, None]
+        node = np.broadcast_to(self.roots, (n, self.n_trees))
+        for _ in range(self.max_depth):
+            go_right = values.take(value_offset.take(node) + rows) > self.threshold.take(node)
+            node = self.left.take(node) + go_right
+        if n <= SMALL_CHUNK_ROWS:
+            return self.leaf_contributions.take(node, axis=0).sum(axis=1)
+        return np.column_stack([c.take(node).sum(axis=1) for c in self.leaf_columns])
+
+
+class _Preprocess:
+    """The pipeline steps before the trees; a lone StandardScaler is applied in numpy, skipping sklearn's input checks."""
+
+    def __init__(self, steps):
+        self.steps = steps if steps is not None and len(steps) else None
+        self.scaler = None
+        if self.steps is not None and len(self.steps) == 1:
+            from sklearn.preprocessing import StandardScaler
+            if isinstance(self.steps[0], StandardScaler):
+                self.scaler = self.steps[0]
+
+    def __call__(self, X):
+        if self.steps is None:
+            return X
+        if self.scaler is None:
+            return self.steps.transform(X)
+        # same operations as StandardScaler.transform
+        if self.scaler.with_mean:
+            X = X - self.scaler.mean_
+        if self.scaler.with_std:
+            X = X / self.scaler.scale_
+        return X
@@ -0,0 +1,130 @@
+"""
+Database routing for healthmonitor data: shards and read replicas.
+
+Sharded models (see SHARDED_MODELS) are written to and read from the shard of
+their owner (core.sharding); every other model lives on `default`.
+
+Read-only healthmonitor queries go to the replica of that primary only inside a
+`replica_reads()` block (entered by ReplicaReadMixin for safe requests); all
+writes stay on the primary. After a user writes, their reads stick to the
+primary for REPLICA_STICKY_SECONDS so they always see their own changes
+despite replication lag.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.sharding import current_shard, shard_aliases, shard_for_user
+
+REPLICA = 'replica'
+STICKY_KEY = 'db-sticky:{}'
+
+# healthmonitor models that live on the owner's shard
+SHARDED_MODELS = {'patient', 'measurement', 'prediction', 'patientriskstate', 'purgejob'}
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def replicas():
+    """{primary alias: replica alias}"""
+    default = {'default': REPLICA} if REPLICA in settings.DATABASES else {}
+    return getattr(settings, 'DATABASE_REPLICAS', default)
+
+
+def replica_configured():
+    return bool(replicas())
+
+
+# cache backends that keep nothing another worker process can see
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def cache_is_shared():
+    """Whether the default cache (sticky window, shard map) is visible to every worker process."""
+    return settings.CACHES.get('default', {}).get('BACKEND') not in PROCESS_LOCAL_CACHES
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route healthmonitor reads inside the block to the replica (when one is configured)."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def mark_recent_write(user_id):
+    """Pin `user_id`'s reads to the primary for the sticky window."""
+    if replica_configured() and user_id is not None:
+        cache.set(STICKY_KEY.format(user_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def recently_wrote(user_id):
+    return user_id is not None and bool(cache.get(STICKY_KEY.format(user_id)))
+
+
+class HealthMonitorRouter:
+    route_app_labels = {'healthmonitor'}
+
+    def _is_sharded(self, model):
+        return model._meta.app_label in self.route_app_labels and model._meta.model_name in SHARDED_MODELS
+
+    def _primary(self, model, hints):
+        if not self._is_sharded(model):
+            return 'default'
+        shard = current_shard()
+        if shard:
+            return shard
+        # outside a shard context follow the instance, its owner, or the related object it was built from
+        instance = hints.get('instance')
+        if instance is None:
+            return 'default'
+        if instance._meta.label == settings.AUTH_USER_MODEL:
+            # related managers such as user.patients
+            return shard_for_user(instance.pk) if instance.pk is not None else 'default'
+        if not self._is_sharded(type(instance)):
+            return 'default'
+        if instance._state.db:
+            return self._primary_of(instance._state.db)
+        if getattr(instance, 'user_id', None) is not None:
+            return shard_for_user(instance.user_id)
+        for obj in instance._state.fields_cache.values():
+            if obj is not None and self._is_sharded(type(obj)) and obj._state.db:
+                return self._primary_of(obj._state.db)
+        return 'default'
+
+    @staticmethod
+    def _primary_of(alias):
+        for primary, replica in replicas().items():
+            if replica == alias:
+                return primary
+        return alias
+
+    def db_for_read(self, model, **hints):
+        primary = self._primary(model, hints)
+        if model._meta.app_label in self.route_app_labels and _replica_reads.get():
+            return replicas().get(primary, primary)
+        return primary
+
+    def db_for_write(self, model, **hints):
+        return self._primary(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # user rows live on default while their patients may live on any shard
+        if obj1._state.db in settings.DATABASES and obj2._state.db in settings.DATABASES:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # shards carry the full schema (so foreign keys resolve) but only sharded
+        # healthmonitor tables hold data; shard-map style tables stay on default
+        if db != 'default' and db in shard_aliases() and app_label in self.route_app_labels:
+            if model_name is not None and model_name not in SHARDED_MODELS:
+                return False
+        return None
@@ -0,0 +1,249 @@
+"""
+Constant-memory input drift monitoring.
+
+HistogramSketch keeps a fixed-bin histogram per feature (plus under/overflow
+bins), so an update is O(1) and sketches from different workers merge by
+addition. The training script saves a reference sketch next to model.pkl;
+serving processes accumulate a live sketch and periodically fold it into a
+shared snapshot file, which is compared with the reference (PSI and KS).
+
+Pure NumPy on purpose: scripts/train_model.py imports it without Django.
+"""
+import os
+import time
+import tempfile
+import threading
+import logging
+import numpy as np
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except Exception:
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+# (low, high) covered by the regular bins; spans HealthAI.SAFE_BOUNDS
+SKETCH_RANGES = {
+    'heart_rate': (20, 250),
+    'spo2': (50, 100),
+    'systolic': (30, 300),
+    'diastolic': (20, 200),
+    'respiratory_rate': (5, 60),
+    'temperature': (25.0, 45.0),
+}
+SKETCH_BINS = 100
+
+# conventional PSI reading: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant shift
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+
+class HistogramSketch:
+    """Per-feature fixed-bin histogram; bin 0 is underflow and bin n_bins+1 overflow."""
+
+    def __init__(self, features=tuple(SKETCH_RANGES), n_bins=SKETCH_BINS, ranges=SKETCH_RANGES, counts=None):
+        self.features = list(features)
+        self.n_bins = n_bins
+        self.low = np.array([ranges[f][0] for f in self.features], dtype=np.float64)
+        self.high = np.array([ranges[f][1] for f in self.features], dtype=np.float64)
+        self.scale = n_bins / (self.high - self.low)
+        self.counts = np.zeros((len(self.features), n_bins + 2), dtype=np.int64) if counts is None else counts
+        self._rows = np.arange(len(self.features))
+        # plain-Python copies for the single-row hot path, where NumPy call overhead dominates
+        self._bounds = [(float(lo), float(sc)) for lo, sc in zip(self.low, self.scale)]
+
+    def _bin(self, X):
+        # clip before the cast so +-inf land in the under/overflow bins
+        pos = np.clip((X - self.low) * self.scale, -1.0, self.n_bins + 0.5)
+        idx = np.floor(pos).astype(np.int64) + 1
+        # the last bin is closed: a reading at the top of the range (SpO2 100) is not overflow
+        idx[pos == self.n_bins] = self.n_bins
+        return idx
+
+    def update(self, row):
+        """Add one reading (vector in `features` order; NaN = absent)."""
+        counts, n_bins = self.counts, self.n_bins
+        for j, v in enumerate(row):
+            if v != v:  # NaN
+                continue
+            low, scale = self._bounds[j]
+            pos = (v - low) * scale
+            counts[j, 0 if pos < 0 else (min(int(pos), n_bins - 1) + 1 if pos <= n_bins else n_bins + 1)] += 1
+
+    def update_many(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.features))
+        idx = self._bin(np.where(np.isnan(X), self.low, X))
+        for j in range(len(self.features)):
+            present = ~np.isnan(X[:, j])
+            self.counts[j] += np.bincount(idx[present, j], minlength=self.n_bins + 2)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def total(self):
+        return self.counts.sum(axis=1)
+
+    def reset(self):
+        self.counts[:] = 0
+
+    def edges(self, j):
+        return np.linspace(self.low[j], self.high[j], self.n_bins + 1)
+
+    def quantile(self, j, q):
+        """Approximate quantile of feature j from the bin counts (linear within a bin)."""
+        counts = self.counts[j]
+        n = counts.sum()
+        if n == 0:
+            return None
+        cdf = np.cumsum(counts) / n
+        b = int(np.searchsorted(cdf, q))
+        if b == 0:
+            return float(self.low[j])
+        if b > self.n_bins:
+            return float(self.high[j])
+        prev = cdf[b - 1]
+        frac = (q - prev) / (cdf[b] - prev) if cdf[b] > prev else 0.0
+        width = (self.high[j] - self.low[j]) / self.n_bins
+        return float(self.low[j] + (b - 1 + frac) * width)
+
+    # ---------- persistence ----------
+    def save(self, path):
+        """Atomically write the sketch to `path` (.npz)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, counts=self.counts, low=self.low, high=self.high,
+                         features=np.array(self.features), n_bins=self.n_bins)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            features = [str(f) for f in data['features']]
+            ranges = {f: (lo, hi) for f, lo, hi in zip(features, data['low'], data['high'])}
+            return cls(features, int(data['n_bins']), ranges, counts=data['counts'].astype(np.int64))
+
+
+# ---------- comparison ----------
+def population_stability_index(reference, current, eps=1e-4):
+    p = np.maximum(reference / max(reference.sum(), 1), eps)
+    q = np.maximum(current / max(current.sum(), 1), eps)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def ks_statistic(reference, current):
+    """Kolmogorov-Smirnov distance between the two binned distributions."""
+    if reference.sum() == 0 or current.sum() == 0:
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(reference) / reference.sum() - np.cumsum(current) / current.sum())))
+
+
+def compare(reference, current):
+    """Per-feature drift of `current` against `reference` (sketches with identical binning)."""
+    if reference.features != current.features or reference.counts.shape != current.counts.shape:
+        raise ValueError('Sketches use different features or binning.')
+    report = {}
+    for j, feature in enumerate(reference.features):
+        ref, cur = reference.counts[j], current.counts[j]
+        psi = population_stability_index(ref, cur) if cur.sum() else 0.0
+        report[feature] = {
+            'psi': round(psi, 4),
+            'ks': round(ks_statistic(ref, cur), 4),
+            'reference_count': int(ref.sum()),
+            'current_count': int(cur.sum()),
+            'reference_median': reference.quantile(j, 0.5),
+            'current_median': current.quantile(j, 0.5),
+            'status': ('no_data' if not cur.sum() else
+                       'significant' if psi > PSI_SIGNIFICANT else
+                       'moderate' if psi > PSI_MODERATE else 'stable'),
+        }
+    return report
+
+
+class DriftMonitor:
+    """
+    Process-local live sketch that is folded into a shared snapshot file at most
+    every `flush_seconds`. The fold runs under an exclusive file lock, so workers
+    on the same host can share one snapshot.
+    """
+
+    def __init__(self, snapshot_path, flush_seconds=60.0, enabled=True):
+        self.snapshot_path = os.fspath(snapshot_path)
+        self.flush_seconds = flush_seconds
+        self.enabled = enabled
+        self.pending = HistogramSketch()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, row):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.pending.update(row)
+        self._maybe_flush()
+
+    def record_many(self, X):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.pending.update_many(X)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Add pending counts to the snapshot file and start a new pending sketch."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self.pending.counts.any():
+                return
+            pending, self.pending = self.pending, HistogramSketch()
+        try:
+            with self._file_lock():
+                snapshot = self.read_snapshot()
+                snapshot.merge(pending)
+                snapshot.save(self.snapshot_path)
+        except Exception as e:
+            logger.exception("Drift snapshot flush failed: %s", e)
+            with self._lock:
+                self.pending.merge(pending)
+
+    def read_snapshot(self):
+        if os.path.exists(self.snapshot_path):
+            return HistogramSketch.load(self.snapshot_path)
+        return HistogramSketch()
+
+    def reset_snapshot(self):
+        with self._file_lock():
+            if os.path.exists(self.snapshot_path):
+                os.unlink(self.snapshot_path)
+
+    def _file_lock(self):
+        return _FileLock(self.snapshot_path + '.lock')
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        if HAS_FCNTL:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if HAS_FCNTL:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
@@ -0,0 +1,406 @@
+"""
+Host-local inference service shared by all web workers (HEALTHAI_INFERENCE_SOCKET).
+
+One server process (`manage.py inference_server`) holds the model and listens
+on a Unix domain socket. Every client connection (one per worker thread)
+hands the server a shared-memory segment when it connects: a memfd passed
+over the socket with SCM_RIGHTS. The segment holds `capacity` rows of float64
+model inputs followed by `capacity` float64 outputs. A request is a 12-byte
+header (request id, rows) after the client has written its rows into the
+segment; the server writes the scores back in place and answers with a
+16-byte header (request id, rows, status). Feature data never goes through
+the socket and nothing is pickled.
+
+The server batches dynamically: once a request arrives it keeps collecting
+requests from all connections for up to max_wait seconds, until max_batch
+rows are pending or until every connected client is waiting, then scores them
+with a single model.predict call. While
+the model runs, new requests queue up in the socket buffers and form the
+next batch.
+
+Only the model call is remote. HealthAI keeps validation, hard rules, caching
+and drift monitoring in the worker. It falls back to its in-process model
+whenever the server cannot answer; after a failure the client stops trying
+for HEALTHAI_INFERENCE_RETRY_SECONDS.
+"""
+import logging
+import mmap
+import os
+import selectors
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 6
+HELLO = struct.Struct('<4sII')       # magic, protocol version, capacity (rows)
+REQUEST = struct.Struct('<QI')       # request id, rows
+RESPONSE = struct.Struct('<QIi')     # request id, rows, status
+MAGIC = b'HMIS'
+VERSION = 1
+
+STATUS_OK = 0
+STATUS_NO_MODEL = 1
+STATUS_ERROR = 2
+STATUS_BAD_REQUEST = 3
+
+DEFAULT_CAPACITY = 4096
+# seconds an accepted connection may take to send its HELLO before it is dropped
+HANDSHAKE_TIMEOUT = 1.0
+
+
+def segment_size(capacity):
+    return capacity * (N_FEATURES + 1) * 8
+
+
+def _segment_views(buffer, capacity):
+    """(inputs (capacity, N_FEATURES), outputs (capacity,)) float64 views of a mapped segment."""
+    inputs = np.frombuffer(buffer, dtype=np.float64, count=capacity * N_FEATURES).reshape(capacity, N_FEATURES)
+    outputs = np.frombuffer(buffer, dtype=np.float64, count=capacity, offset=capacity * N_FEATURES * 8)
+    return inputs, outputs
+
+
+def _anonymous_segment(size):
+    """File descriptor of an unnamed shared-memory file of `size` bytes."""
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create('healthai-inference')
+    else:
+        # unlinked temporary file; the descriptor keeps it alive
+        fd, path = tempfile.mkstemp(prefix='healthai-inference-')
+        os.unlink(path)
+    os.ftruncate(fd, size)
+    return fd
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('inference server closed the connection')
+        data += chunk
+    return data
+
+
+# ---------- client ----------
+
+class _Connection:
+    def __init__(self, path, timeout, capacity):
+        self.capacity = capacity
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        fd = _anonymous_segment(segment_size(capacity))
+        try:
+            self.sock.connect(path)
+            self.buffer = mmap.mmap(fd, segment_size(capacity))
+            socket.send_fds(self.sock, [HELLO.pack(MAGIC, VERSION, capacity)], [fd])
+        except Exception:
+            self.sock.close()
+            raise
+        finally:
+            os.close(fd)  # the mapping and the server's copy keep the segment alive
+        self.inputs, self.outputs = _segment_views(self.buffer, capacity)
+        self.next_id = 0
+
+    def predict(self, X):
+        out = np.empty(len(X))
+        for start in range(0, len(X), self.capacity):
+            rows = X[start:start + self.capacity]
+            n = len(rows)
+            self.next_id += 1
+            self.inputs[:n] = rows
+            self.sock.sendall(REQUEST.pack(self.next_id, n))
+            request_id, answered, status = RESPONSE.unpack(_recv_exactly(self.sock, RESPONSE.size))
+            if request_id != self.next_id or answered != n:
+                raise ConnectionError('out of sync with the inference server')
+            if status != STATUS_OK:
+                return None
+            out[start:start + n] = self.outputs[:n]
+        return out
+
+    def close(self):
+        self.sock.close()
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass  # views still referenced; released with them
+
+
+class InferenceClient:
+    """Per-process client; each thread gets its own connection and segment."""
+
+    def __init__(self, path, timeout=1.0, retry_seconds=5.0, capacity=DEFAULT_CAPACITY):
+        self.path, self.timeout, self.retry_seconds, self.capacity = path, timeout, retry_seconds, capacity
+        self._local = threading.local()
+        self._down_until = 0.0
+        self.stats = {'requests': 0, 'rows': 0, 'fallbacks': 0}
+
+    def predict(self, X):
+        """Raw model outputs for model inputs X (n, 6), or None when the server cannot answer."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, N_FEATURES)
+        self.stats['requests'] += 1
+        if time.monotonic() < self._down_until:
+            self.stats['fallbacks'] += 1
+            return None
+        try:
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = _Connection(self.path, self.timeout, self.capacity)
+            out = conn.predict(X)
+        except (OSError, ValueError) as e:
+            self._drop()
+            self._down_until = time.monotonic() + self.retry_seconds
+            logger.warning("Inference server %s unavailable (%s); using the in-process model for %ss",
+                           self.path, e, self.retry_seconds)
+            out = None
+        if out is None:
+            self.stats['fallbacks'] += 1
+        else:
+            self.stats['rows'] += len(X)
+        return out
+
+    def _drop(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+
+_clients = {}
+
+
+def get_inference_client():
+    """This process's InferenceClient, or None when HEALTHAI_INFERENCE_SOCKET is unset."""
+    from django.conf import settings
+    path = getattr(settings, 'HEALTHAI_INFERENCE_SOCKET', '')
+    if not path or not hasattr(socket, 'AF_UNIX'):
+        return None
+    # keyed by pid: connections must not be shared with forked children
+    pid = os.getpid()
+    client = _clients.get(pid)
+    if client is None:
+        _clients.clear()
+        client = _clients[pid] = InferenceClient(
+            path,
+            timeout=getattr(settings, 'HEALTHAI_INFERENCE_TIMEOUT', 1.0),
+            retry_seconds=getattr(settings, 'HEALTHAI_INFERENCE_RETRY_SECONDS', 5.0))
+    return client
+
+
+# ---------- server ----------
+
+class _Client:
+    def __init__(self, sock, buffer, capacity):
+        self.sock, self.buffer, self.capacity = sock, buffer, capacity
+        self.inputs, self.outputs = _segment_views(buffer, capacity)
+        self.pending = b''
+
+
+class _Handshake:
+    """A connection accepted but still waiting for its HELLO and segment descriptor."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.message = b''
+        self.fds = []
+        self.deadline = time.monotonic() + HANDSHAKE_TIMEOUT
+
+
+class InferenceServer:
+    def __init__(self, path, model_path=None, max_batch=256, max_wait=0.002):
+        self.path, self.model_path = path, model_path
+        self.max_batch, self.max_wait = max_batch, max_wait
+        self.selector = selectors.DefaultSelector()
+        self.stats = {'batches': 0, 'requests': 0, 'rows': 0, 'clients': 0}
+        self._stop = False
+
+    def serve_forever(self):
+        from core.ai_model import MODEL_PATH, load_model
+        self.model_path = self.model_path or MODEL_PATH
+        model, version = load_model(self.model_path)
+        if model is None:
+            logger.warning("No model at %s yet; answering STATUS_NO_MODEL until one appears", self.model_path)
+
+        self._remove_stale_socket()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        os.chmod(self.path, 0o660)
+        listener.listen(128)
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ, None)
+        logger.info("Inference server listening on %s (max batch %d rows, max wait %.1f ms)",
+                    self.path, self.max_batch, self.max_wait * 1000)
+        try:
+            self._loop(listener)
+        finally:
+            self.selector.close()
+            listener.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def stop(self):
+        self._stop = True
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)  # left behind by a server that died
+        else:
+            raise RuntimeError(f'Another inference server is listening on {self.path}.')
+        finally:
+            probe.close()
+
+    def _loop(self, listener):
+        queued = []  # (client, request id, rows) in arrival order
+        first_at = None
+        while not self._stop:
+            if queued:
+                timeout = max(0.0, first_at + self.max_wait - time.monotonic())
+            else:
+                timeout = 1.0  # wake up now and then to notice stop() and expired handshakes
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self._accept(listener)
+                    continue
+                if isinstance(key.data, _Handshake):
+                    self._handshake(key.data)
+                    continue
+                for request in self._read(key.data):
+                    if not queued:
+                        first_at = time.monotonic()
+                    queued.append(request)
+            self._expire_handshakes()
+            rows = sum(n for _, _, n in queued)
+            # clients wait for each answer, so once every connection has asked nobody else can join
+            if queued and (rows >= self.max_batch or len(queued) >= self.stats['clients']
+                           or time.monotonic() >= first_at + self.max_wait):
+                self._score(queued)
+                queued = []
+
+    def _accept(self, listener):
+        """
+        Accept a connection without waiting for its handshake: the loop reads the HELLO
+        once it arrives, so a slow or silent client cannot hold up everyone else's requests.
+        """
+        try:
+            sock, _ = listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, _Handshake(sock))
+
+    def _handshake(self, pending):
+        try:
+            message, fds, _, _ = socket.recv_fds(pending.sock, HELLO.size - len(pending.message), 1)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._reject(pending, e)
+            return
+        pending.fds.extend(fds)
+        if not message:
+            self._reject(pending, 'closed during the handshake')
+            return
+        pending.message += message
+        if len(pending.message) < HELLO.size:
+            return
+        try:
+            magic, version, capacity = HELLO.unpack(pending.message)
+            if magic != MAGIC or version != VERSION or len(pending.fds) != 1:
+                raise ValueError(f'bad handshake {magic!r} v{version}')
+            buffer = mmap.mmap(pending.fds[0], segment_size(capacity))
+        except Exception as e:
+            self._reject(pending, e)
+            return
+        self._close_fds(pending)
+        self.selector.modify(pending.sock, selectors.EVENT_READ, _Client(pending.sock, buffer, capacity))
+        self.stats['clients'] += 1
+
+    def _expire_handshakes(self):
+        now = time.monotonic()
+        expired = [key.data for key in self.selector.get_map().values()
+                   if isinstance(key.data, _Handshake) and key.data.deadline <= now]
+        for pending in expired:
+            self._reject(pending, f'no handshake within {HANDSHAKE_TIMEOUT}s')
+
+    def _reject(self, pending, reason):
+        logger.warning("Rejected inference client: %s", reason)
+        self._close_fds(pending)
+        self.selector.unregister(pending.sock)
+        pending.sock.close()
+
+    @staticmethod
+    def _close_fds(pending):
+        for fd in pending.fds:
+            os.close(fd)
+        pending.fds = []
+
+    def _read(self, client):
+        """Complete requests received from `client` (closing it on disconnect)."""
+        try:
+            data = client.sock.recv(64 * REQUEST.size)
+        except BlockingIOError:
+            return []
+        except OSError:
+            data = b''
+        if not data:
+            self._close(client)
+            return []
+        data = client.pending + data
+        count = len(data) // REQUEST.size
+        client.pending = data[count * REQUEST.size:]
+        return [(client, *REQUEST.unpack_from(data, i * REQUEST.size)) for i in range(count)]
+
+    def _close(self, client):
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        client.inputs = client.outputs = None
+        try:
+            client.buffer.close()
+        except BufferError:
+            pass
+        self.stats['clients'] -= 1
+
+    def _score(self, queued):
+        from core.ai_model import load_model
+        valid = [(c, rid, n) for c, rid, n in queued if 0 < n <= c.capacity and c.inputs is not None]
+        status = STATUS_OK
+        if valid:
+            # load_model only stats the file unless it changed, so retrained models are picked up
+            model, _ = load_model(self.model_path)
+            if model is None:
+                status = STATUS_NO_MODEL
+            else:
+                X = np.concatenate([c.inputs[:n] for c, _, n in valid])
+                try:
+                    scores = np.asarray(model.predict(X), dtype=np.float64)
+                except Exception as e:
+                    logger.exception("Batch of %d rows failed: %s", len(X), e)
+                    status = STATUS_ERROR
+                else:
+                    offset = 0
+                    for c, _, n in valid:
+                        c.outputs[:n] = scores[offset:offset + n]
+                        offset += n
+                    self.stats['batches'] += 1
+                    self.stats['rows'] += len(X)
+        for c, rid, n in queued:
+            if c.inputs is None:
+                continue  # disconnected meanwhile
+            answer = status if 0 < n <= c.capacity else STATUS_BAD_REQUEST
+            try:
+                c.sock.sendall(RESPONSE.pack(rid, n, answer))
+            except OSError:
+                self._close(c)
+        self.stats['requests'] += len(queued)
@@ -0,0 +1,124 @@
+"""
+Opt-in request profiling for production.
+
+ProfilingMiddleware runs cProfile around a random PROFILING_SAMPLE_RATE share
+of requests, and around any request whose PROFILING_HEADER carries the
+PROFILING_TOKEN secret. Each profile is written as gzip-compressed pstats
+data named after the view and the request duration; the directory is kept
+under PROFILING_MAX_BYTES by deleting the oldest files.
+
+Unsampled requests cost one random() call, and with profiling disabled the
+middleware removes itself at startup (MiddlewareNotUsed).
+"""
+import cProfile
+import gzip
+import hmac
+import logging
+import marshal
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = '.prof.gz'
+# <epoch ms>-<pid>-<view>-<duration ms>ms.prof.gz
+PROFILE_NAME = re.compile(r'^(?P<ts>\d+)-(?P<pid>\d+)-(?P<view>.+)-(?P<ms>\d+)ms\.prof\.gz$')
+
+
+def profile_files(directory):
+    """(path, stat) of every profile in `directory`, oldest first."""
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith(PROFILE_SUFFIX)]
+    except FileNotFoundError:
+        return []
+    files = [(e.path, e.stat()) for e in entries]
+    return sorted(files, key=lambda f: f[1].st_mtime)
+
+
+def parse_profile_name(name):
+    """{'view', 'duration_ms', 'timestamp'} from a profile file name, or None."""
+    match = PROFILE_NAME.match(os.path.basename(name))
+    if match is None:
+        return None
+    return {'view': match['view'], 'duration_ms': int(match['ms']), 'timestamp': int(match['ts']) / 1000}
+
+
+def load_profile(path):
+    """The raw pstats dictionary stored in `path`."""
+    with gzip.open(path, 'rb') as f:
+        return marshal.load(f)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0))
+        self.token = getattr(settings, 'PROFILING_TOKEN', '')
+        if self.sample_rate <= 0 and not self.token:
+            raise MiddlewareNotUsed
+        self.header = 'HTTP_' + getattr(settings, 'PROFILING_HEADER', 'X-Profile').upper().replace('-', '_')
+        self.directory = os.fspath(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+        self.max_bytes = int(getattr(settings, 'PROFILING_MAX_BYTES', 200 * 1024 * 1024))
+
+    def __call__(self, request):
+        requested = self.token and self.header in request.META
+        if not requested and random.random() >= self.sample_rate:
+            return self.get_response(request)
+        if requested and not hmac.compare_digest(request.META[self.header], self.token):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active in this thread
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - started
+
+        try:
+            name = self.save(profiler, request, duration)
+        except Exception as e:
+            logger.exception("Could not write request profile: %s", e)
+        else:
+            if requested:
+                response['X-Profile-Id'] = name
+        return response
+
+    def save(self, profiler, request, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        view = re.sub(r'[^A-Za-z0-9_.]+', '_', view)[:80]
+        name = f'{int(time.time() * 1000)}-{os.getpid()}-{view}-{int(duration * 1000)}ms{PROFILE_SUFFIX}'
+
+        profiler.create_stats()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        tmp = path + '.tmp'
+        with gzip.open(tmp, 'wb', compresslevel=6) as f:
+            marshal.dump(profiler.stats, f)
+        os.replace(tmp, path)
+        self.rotate()
+        return name
+
+    def rotate(self):
+        """Delete the oldest profiles until the directory fits in max_bytes."""
+        files = profile_files(self.directory)
+        total = sum(st.st_size for _, st in files)
+        for path, st in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # rotated by another worker
+            total -= st.st_size
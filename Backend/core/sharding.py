@@ -0,0 +1,123 @@
+"""
+Horizontal sharding of healthmonitor data by owning user.
+
+Every user's patients, measurements, predictions and risk state live on one
+database alias from settings.HEALTHMONITOR_SHARDS. The user -> alias map is
+stored in ShardAssignment on 'default' (new users are placed by hashing their
+id) and cached for SHARD_MAP_CACHE_SECONDS. Request code runs inside
+use_shard(alias), which HealthMonitorRouter honours for every sharded model;
+cross-shard work goes through fan_out().
+
+With a single alias (the default) sharding is a no-op and costs nothing.
+"""
+import contextvars
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+SHARD_KEY = 'shard:{}'
+# Sharded tables allocate primary keys in disjoint classes, so ids are unique across shards and
+# rows keep their ids when rebalance_shards moves them. MySQL and PostgreSQL interleave
+# (id % SHARD_ID_STRIDE == shard index + 1, matching MySQL's auto_increment_offset); SQLite, which always continues after the largest id
+# ever stored, uses ranges starting at index << SHARD_ID_BITS (good enough for local testing).
+SHARD_ID_STRIDE = 64
+SHARD_ID_BITS = 48
+
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+def shard_aliases():
+    return list(getattr(settings, 'HEALTHMONITOR_SHARDS', ['default']))
+
+
+def sharding_enabled():
+    return len(shard_aliases()) > 1
+
+
+def shard_index(alias):
+    aliases = shard_aliases()
+    return aliases.index(alias) if alias in aliases else 0
+
+
+def next_shard_id(alias, current_max, vendor):
+    """First primary key `alias` may use after `current_max` (the table's largest id)."""
+    current_max = current_max or 0
+    if not sharding_enabled():
+        return current_max + 1
+    index = shard_index(alias)
+    if vendor == 'sqlite':
+        return max(current_max, index << SHARD_ID_BITS) + 1
+    residue = (index + 1) % SHARD_ID_STRIDE
+    return current_max + 1 + (residue - current_max - 1) % SHARD_ID_STRIDE
+
+
+def placement_for(user_id, aliases=None):
+    """Initial shard of a user: stable hash of the id over the configured aliases."""
+    aliases = aliases or shard_aliases()
+    return aliases[zlib.crc32(str(user_id).encode()) % len(aliases)]
+
+
+def lookup_shard(user_id):
+    """Returns (alias, locked) for `user_id`, assigning a shard on first use."""
+    if not sharding_enabled():
+        return 'default', False
+    key = SHARD_KEY.format(user_id)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    from apps.healthmonitor.models import ShardAssignment
+    assignment, _ = ShardAssignment.objects.using('default').get_or_create(
+        user_id=user_id, defaults={'alias': placement_for(user_id)})
+    value = (assignment.alias, assignment.locked)
+    cache.set(key, value, getattr(settings, 'SHARD_MAP_CACHE_SECONDS', 60))
+    return value
+
+
+def shard_for_user(user_id):
+    return lookup_shard(user_id)[0]
+
+
+def forget_user_shard(user_id):
+    cache.delete(SHARD_KEY.format(user_id))
+
+
+def current_shard():
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(alias):
+    """Route sharded models to `alias` inside the block."""
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def fan_out(fn, aliases=None):
+    """
+    Runs fn(alias) for every shard in parallel (one thread each) inside use_shard(alias)
+    and returns {alias: result}. Each call runs in a copy of the caller's context, so
+    context variables (e.g. replica_reads()) carry over. Each thread closes its
+    connection when done.
+    """
+    aliases = list(aliases or shard_aliases())
+
+    def run(alias):
+        try:
+            with use_shard(alias):
+                return fn(alias)
+        finally:
+            connections[alias].close()
+
+    if len(aliases) == 1:
+        with use_shard(aliases[0]):
+            return {aliases[0]: fn(aliases[0])}
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run, alias) for alias in aliases]
+        return {alias: future.result() for alias, future in zip(aliases, futures)}
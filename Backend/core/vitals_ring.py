@@ -0,0 +1,302 @@
+"""
+Host-wide shared-memory ring buffer of each active patient's latest readings.
+
+All workers on a host map the same file (put it on tmpfs, e.g. /dev/shm).
+Layout: a header, a table of `n_slots` slot entries and, per slot, a ring of
+`depth` packed records stored twice (positions i and i + depth), so the latest
+n readings are always one contiguous slice.
+
+Slots are found by open addressing over PROBE neighbours of hash(patient_id);
+when all are taken the least recently written one is evicted. Writers are
+serialized with flock; readers take no lock and use the slot's sequence
+counter (a seqlock): the counter is odd while a write is in progress, and a
+read is retried if it changed while the window was being copied.
+
+A slot that was seeded from the database holds the patient's complete recent
+history; one started by ingest alone only knows readings since then.
+"""
+import logging
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except Exception:
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HMRB'
+VERSION = 1
+HEADER = struct.Struct('<4sIIII')  # magic, version, n_slots, depth, record size
+HEADER_SIZE = 64
+PROBE = 8
+READ_RETRIES = 16
+
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('timestamp', '<f8'),
+    ('heart_rate', '<f4'),
+    ('spo2', '<f4'),
+    ('systolic', '<f4'),
+    ('diastolic', '<f4'),
+    ('respiratory_rate', '<f4'),
+    ('temperature', '<f4'),
+    ('risk_score', '<f4'),
+])
+
+SLOT_DTYPE = np.dtype([
+    ('patient_id', '<i8'),  # 0 = free
+    ('user_id', '<i8'),
+    ('seq', '<u8'),
+    ('count', '<u8'),       # records ever written to the slot
+    ('complete', '<u8'),    # 1 once seeded with the patient's history from the database
+    ('last_used', '<f8'),
+])
+
+
+class VitalsRing:
+    def __init__(self, path, n_slots=4096, depth=128):
+        self.path = os.fspath(path)
+        self.n_slots, self.depth = n_slots, depth
+        self._thread_lock = threading.Lock()
+
+        data_offset = HEADER_SIZE + n_slots * SLOT_DTYPE.itemsize
+        size = data_offset + n_slots * 2 * depth * RECORD_DTYPE.itemsize
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+        with self._file_lock():
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, n_slots, depth, RECORD_DTYPE.itemsize), 0)
+            header = HEADER.unpack(os.pread(self.fd, HEADER.size, 0))
+        if header != (MAGIC, VERSION, n_slots, depth, RECORD_DTYPE.itemsize):
+            os.close(self.fd)
+            raise ValueError(f'{self.path} has a different layout {header[1:]}; delete it after changing the ring size.')
+
+        self.buffer = np.memmap(self.path, dtype=np.uint8, mode='r+', shape=(size,))
+        self.slots = self.buffer[HEADER_SIZE:data_offset].view(SLOT_DTYPE)
+        self.records = self.buffer[data_offset:].view(RECORD_DTYPE).reshape(n_slots, 2 * depth)
+        # per-field views of the slot table; indexing these is much cheaper than slots[i][field]
+        self._patient = self.slots['patient_id']
+        self._seq = self.slots['seq']
+        self._count = self.slots['count']
+
+    # ---------- locking ----------
+    def _file_lock(self):
+        return _FlockContext(self.fd)
+
+    def _write_lock(self):
+        return _WriteLock(self._thread_lock, self.fd)
+
+    # ---------- slot lookup ----------
+    def _candidates(self, patient_id):
+        start = (patient_id * 0x9E3779B97F4A7C15 >> 16) % self.n_slots
+        return [(start + i) % self.n_slots for i in range(PROBE)]
+
+    def _find(self, patient_id):
+        start = (patient_id * 0x9E3779B97F4A7C15 >> 16) % self.n_slots
+        window = self._patient[start:start + PROBE]
+        hits = np.flatnonzero(window == patient_id)
+        if len(hits):
+            return start + int(hits[0])
+        if start + PROBE > self.n_slots:  # probe wraps around the table
+            for i in self._candidates(patient_id):
+                if self._patient[i] == patient_id:
+                    return i
+        return None
+
+    def _claim(self, patient_id, user_id):
+        """Slot for `patient_id`, taking a free or the least recently used one. Caller holds the write lock."""
+        candidates = self._candidates(patient_id)
+        for i in candidates:
+            if self.slots['patient_id'][i] == patient_id:
+                return i
+        free = [i for i in candidates if self.slots['patient_id'][i] == 0]
+        i = free[0] if free else min(candidates, key=lambda c: self.slots['last_used'][c])
+        slot = self.slots[i:i + 1]
+        slot['seq'] += 1
+        slot['patient_id'], slot['user_id'], slot['count'], slot['complete'] = patient_id, user_id, 0, 0
+        slot['seq'] += 1
+        return i
+
+    # ---------- writes ----------
+    def append(self, patient_id, user_id, rows):
+        """
+        Append readings (a RECORD_DTYPE array, oldest first) to the patient's ring. Readings
+        the slot already holds are skipped: a reader may have seeded it from a query that saw
+        them before this append (ingest appends on commit). Readings older than the newest
+        one held, from a concurrent commit that landed first, are merged in id order.
+        """
+        rows = np.asarray(rows, dtype=RECORD_DTYPE)
+        with self._write_lock():
+            i = self._claim(patient_id, user_id)
+            held = min(int(self._count[i]), self.depth)
+            if not held or not len(rows) or rows['id'].min() > self._window(i, 1)['id'][0]:
+                self._write(i, rows[-self.depth:])
+                return
+            current = self._window(i, held).copy()
+            rows = rows[~np.isin(rows['id'], current['id'])]
+            if not len(rows):
+                return
+            merged = np.sort(np.concatenate([current, rows]), order='id')[-self.depth:]
+            slot = self.slots[i:i + 1]
+            slot['seq'] += 1
+            slot['count'] = 0
+            self._write(i, merged, bump=False)
+            slot['seq'] += 1
+
+    def seed(self, patient_id, user_id, rows):
+        """
+        Install the patient's history loaded from the database. Readings that ingest
+        appended after that query (higher ids) are kept on top.
+        """
+        rows = np.asarray(rows, dtype=RECORD_DTYPE)
+        with self._write_lock():
+            i = self._claim(patient_id, user_id)
+            if self.slots['complete'][i]:
+                return
+            newer = self._window(i, min(int(self.slots['count'][i]), self.depth)).copy()
+            if len(rows):
+                newer = newer[newer['id'] > rows['id'].max()]
+            merged = np.concatenate([rows, newer])[-self.depth:]
+            slot = self.slots[i:i + 1]
+            slot['seq'] += 1
+            slot['count'] = 0
+            self._write(i, merged, bump=False)
+            slot['complete'] = 1
+            slot['seq'] += 1
+
+    def _write(self, i, rows, bump=True):
+        seq = self._seq
+        if bump:
+            seq[i] += 1  # odd: readers retry
+        count, depth = int(self._count[i]), self.depth
+        ring = self.records[i]
+        positions = (count + np.arange(len(rows))) % depth
+        ring[positions] = rows
+        ring[positions + depth] = rows
+        self._count[i] = count + len(rows)
+        self.slots['last_used'][i] = time.time()
+        if bump:
+            seq[i] += 1
+
+    def forget(self, patient_id):
+        """Drop the patient's slot (after deletions, so stale readings are never served)."""
+        with self._write_lock():
+            i = self._find(patient_id)
+            if i is None:
+                return
+            slot = self.slots[i:i + 1]
+            slot['seq'] += 1
+            slot['patient_id'], slot['count'], slot['complete'] = 0, 0, 0
+            slot['seq'] += 1
+
+    # ---------- reads ----------
+    def _window(self, i, n, count=None):
+        """Zero-copy view of the latest n records of slot i, oldest first (unvalidated)."""
+        count = int(self._count[i]) if count is None else count
+        start = (count - n) % self.depth
+        return self.records[i, start:start + n]
+
+    def read(self, patient_id, n=None, user_id=None):
+        """
+        The latest n readings (oldest first) as a RECORD_DTYPE array, or None when
+        the ring cannot answer: unknown patient, another user's patient, or fewer
+        than n readings in a slot that was not seeded with the full history.
+        """
+        n = self.depth if n is None else n
+        if n > self.depth:
+            return None
+        for _ in range(READ_RETRIES):
+            i = self._find(patient_id)
+            if i is None:
+                return None
+            seq = int(self._seq[i])
+            if seq & 1:
+                continue
+            owner, count, complete = self.slots[['user_id', 'count', 'complete']][i].item()
+            available = min(count, self.depth)
+            window = self._window(i, min(n, available), count).copy()
+            if int(self._seq[i]) != seq or int(self._patient[i]) != patient_id:
+                continue  # torn by a concurrent write; retry
+            if user_id is not None and owner != user_id:
+                return None
+            if available < n and not complete:
+                return None
+            return window
+        return None
+
+    def stats(self):
+        used = self.slots['patient_id'] != 0
+        return {
+            'path': self.path,
+            'slots': self.n_slots,
+            'slots_used': int(used.sum()),
+            'slots_complete': int((used & (self.slots['complete'] == 1)).sum()),
+            'depth': self.depth,
+            'bytes': int(self.buffer.size),
+        }
+
+
+class _FlockContext:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __enter__(self):
+        if HAS_FCNTL:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if HAS_FCNTL:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+class _WriteLock:
+    # flock excludes other processes; threads of one process share the descriptor, so also a mutex
+    def __init__(self, thread_lock, fd):
+        self.thread_lock = thread_lock
+        self.flock = _FlockContext(fd)
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        self.flock.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.flock.__exit__(*exc)
+        self.thread_lock.release()
+
+
+_rings = {}
+
+
+def get_vitals_ring():
+    """This process's VitalsRing, or None when disabled (VITALS_RING_PATH unset) or unavailable."""
+    from django.conf import settings
+    path = getattr(settings, 'VITALS_RING_PATH', '')
+    if not path or not HAS_FCNTL:
+        return None
+    # keyed by pid: a ring opened before a fork must not share its flock descriptor with the children
+    pid = os.getpid()
+    if pid not in _rings:
+        try:
+            _rings.clear()
+            _rings[pid] = VitalsRing(path, settings.VITALS_RING_SLOTS, settings.VITALS_RING_DEPTH)
+        except Exception as e:
+            logger.error("Vitals ring disabled: %s", e)
+            _rings[pid] = None
+    return _rings[pid]
+
+
+def to_records(rows):
+    """RECORD_DTYPE array from (id, timestamp datetime, 6 vitals, risk_score) tuples."""
+    out = np.zeros(len(rows), dtype=RECORD_DTYPE)
+    for k, (pk, ts, *values) in enumerate(rows):
+        out[k] = (pk, ts.timestamp(), *[np.nan if v is None else v for v in values])
+    return out
@@ -0,0 +1,93 @@
+'''
+Benchmark the cost of per-feature attribution (HealthAI explain=True) on top of inference:
+single readings through HealthAI.predict and batches through HealthAI.predict_batch,
+with and without explanations. Also checks that baseline + contributions reproduces
+the model output and that explained batches report the same scores. Needs a
+trained model.pkl.
+
+Usage: python scripts/bench_attribution.py [--sizes 1 100 1000 10000] [--repeat 5] [--singles 2000]
+'''
+import os
+import sys
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.dev')
+
+import django
+from django.conf import settings
+
+# no database access; keep Django from needing the configured server
+settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+django.setup()
+
+import numpy as np
+
+from core.ai_model import FEATURE_KEYS, HealthAI
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def readings(n, rng):
+    return np.column_stack([
+        rng.integers(45, 160, n), rng.integers(86, 100, n), rng.integers(85, 190, n),
+        rng.integers(45, 110, n), rng.integers(8, 32, n), np.round(rng.uniform(35.5, 40.5, n), 1),
+    ]).astype(np.float64)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--singles', type=int, default=2000, help='Readings scored one by one through predict()')
+    args = parser.parse_args()
+
+    ai = HealthAI(use_cache=False, monitor_drift=False)
+    if ai.attributor is None:
+        logger.error("No supported tree model loaded; train one with scripts/train_model.py first.")
+        sys.exit(1)
+    logger.info(f"{ai.attributor.n_trees} trees, max depth {ai.attributor.max_depth}, "
+                f"baseline {ai.attributor.baseline:.4f}")
+    rng = np.random.default_rng(42)
+
+    X = readings(max(args.sizes), rng)
+    explained = ai.predict_batch(X, explain=True)
+    model_rows = explained['source'] == 'model'
+    raw = np.asarray(ai.model.predict(X[model_rows]), dtype=np.float64)
+    total = explained['baseline'] + explained['contributions'][model_rows].sum(axis=1)
+    logger.info(f"max |baseline + contributions - model output| over {model_rows.sum()} rows: "
+                f"{np.abs(total - raw).max():.2e}")
+    # with explain=True the scores come from the attribution walk; they must match model.predict's
+    changed = (ai.predict_batch(X)['risk_score'] != explained['risk_score']).sum()
+    logger.info(f"risk scores differing between explain and plain batches: {changed}")
+
+    singles = [dict(zip(FEATURE_KEYS, row)) for row in readings(args.singles, rng)]
+    changed = sum(ai.predict(f)['risk_score'] != ai.predict(f, explain=True)['risk_score'] for f in singles)
+    logger.info(f"risk scores differing between explain and plain predict(): {changed}")
+    plain = best_of(lambda: [ai.predict(f) for f in singles], args.repeat) / len(singles)
+    with_explain = best_of(lambda: [ai.predict(f, explain=True) for f in singles], args.repeat) / len(singles)
+    logger.info(f"predict(): {plain * 1e6:8.1f} us | with explain {with_explain * 1e6:8.1f} us "
+                f"| overhead {(with_explain / plain - 1) * 100:5.1f}%")
+
+    for size in sorted(args.sizes):
+        batch = X[:size]
+        plain = best_of(lambda: ai.predict_batch(batch), args.repeat)
+        with_explain = best_of(lambda: ai.predict_batch(batch, explain=True), args.repeat)
+        logger.info(f"predict_batch({size:>6}): {plain * 1000:8.2f} ms | with explain {with_explain * 1000:8.2f} ms "
+                    f"| overhead {(with_explain / plain - 1) * 100:5.1f}%")
+
+
+if __name__ == '__main__':
+    main()
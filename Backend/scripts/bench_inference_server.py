@@ -0,0 +1,159 @@
+'''
+Benchmark the shared inference server (HEALTHAI_INFERENCE_SOCKET) against a model per worker:
+starts --workers processes, like web workers, each with --threads threads scoring single
+readings through HealthAI.predict (cache off), once with every worker holding its own model
+and once with one InferenceServer process (what `manage.py inference_server` runs) batching
+for all of them. Reports predictions per second and the host memory used: the summed PSS
+(proportional set size, so shared pages are counted once) of the workers plus the server.
+Needs a trained model.pkl and Linux (/proc/<pid>/smaps_rollup; falls back to RSS).
+
+Usage: python scripts/bench_inference_server.py [--workers 4] [--threads 4] [--seconds 5] [--max-batch 256] [--wait-ms 2]
+'''
+import os
+import sys
+import time
+import argparse
+import logging
+import signal
+import tempfile
+import multiprocessing
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.dev')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def setup_django():
+    import django
+    from django.conf import settings
+    # no database access; keep Django from needing the configured server
+    settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+    django.setup()
+
+
+def memory_kb(pid):
+    """PSS of a process in kB (RSS where smaps_rollup is unavailable)."""
+    for name, field in (('smaps_rollup', 'Pss:'), ('status', 'VmRSS:')):
+        try:
+            with open(f'/proc/{pid}/{name}') as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+def serve(socket_path, max_batch, wait_ms):
+    setup_django()
+    from core.inference_server import InferenceServer
+    server = InferenceServer(socket_path, max_batch=max_batch, max_wait=wait_ms / 1000.0)
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    server.serve_forever()
+
+
+def worker(threads, seconds, ready, start, measured, results):
+    import threading
+    setup_django()
+    import numpy as np
+    from core.ai_model import FEATURE_KEYS, HealthAI
+
+    ai = HealthAI(use_cache=False, monitor_drift=False)
+    rng = np.random.default_rng(os.getpid())
+    readings = [dict(zip(FEATURE_KEYS, row)) for row in np.column_stack([
+        rng.integers(45, 160, 1000), rng.integers(86, 100, 1000), rng.integers(85, 190, 1000),
+        rng.integers(45, 110, 1000), rng.integers(8, 32, 1000), np.round(rng.uniform(35.5, 40.5, 1000), 1),
+    ]).tolist()]
+    counts, sources = [0] * threads, set()
+    warm = threading.Barrier(threads + 1)
+
+    def run(k):
+        ai.predict_batch(np.array([list(readings[k].values())]))  # model load or this thread's connection
+        warm.wait()
+        start.wait()
+        done, deadline = 0, time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            sources.add(ai.predict(readings[(k * 37 + done) % len(readings)])['source'])
+            done += 1
+        counts[k] = done
+
+    pool = [threading.Thread(target=run, args=(k,)) for k in range(threads)]
+    for t in pool:
+        t.start()
+    warm.wait()
+    ready.put(os.getpid())
+    for t in pool:
+        t.join()
+    stats = dict(ai.inference.stats) if ai.inference is not None else None
+    results.put((sum(counts), sorted(sources), stats))
+    measured.wait()  # stay alive until the parent has read our memory
+
+
+def run_mode(ctx, args, socket_path):
+    os.environ['HEALTHAI_INFERENCE_SOCKET'] = socket_path or ''
+    server = None
+    if socket_path:
+        server = ctx.Process(target=serve, args=(socket_path, args.max_batch, args.wait_ms))
+        server.start()
+        for _ in range(300):
+            if os.path.exists(socket_path) or not server.is_alive():
+                break
+            time.sleep(0.1)
+        if not os.path.exists(socket_path):
+            server.kill()
+            raise SystemExit('inference server did not start')
+
+    ready, results = ctx.Queue(), ctx.Queue()
+    start, measured = ctx.Event(), ctx.Event()
+    procs = [ctx.Process(target=worker, args=(args.threads, args.seconds, ready, start, measured, results))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.get()
+    started = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in procs]
+    wall = time.perf_counter() - started
+    pids = [p.pid for p in procs] + ([server.pid] if server else [])
+    memory = sum(memory_kb(pid) for pid in pids) / 1024
+    server_memory = memory_kb(server.pid) / 1024 if server else 0.0
+    measured.set()
+    for p in procs:
+        p.join()
+    if server:
+        server.terminate()
+        server.join()
+    os.environ.pop('HEALTHAI_INFERENCE_SOCKET')
+    return wall, outcomes, memory, server_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent requests per worker')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--max-batch', type=int, default=256, help='HEALTHAI_INFERENCE_MAX_BATCH')
+    parser.add_argument('--wait-ms', type=float, default=2.0, help='HEALTHAI_INFERENCE_MAX_WAIT_MS')
+    args = parser.parse_args()
+
+    # fresh interpreters, as separate web workers would be; forking would share the parent's pages
+    ctx = multiprocessing.get_context('spawn')
+    socket_path = os.path.join(tempfile.mkdtemp(prefix='bench-inference-'), 'inference.sock')
+    logger.info(f"{args.workers} workers x {args.threads} threads, {args.seconds}s per mode")
+    for mode, path in (('model per worker', None), ('shared server', socket_path)):
+        wall, outcomes, memory, server_memory = run_mode(ctx, args, path)
+        predictions = sum(count for count, _, _ in outcomes)
+        sources = sorted({s for _, srcs, _ in outcomes for s in srcs})
+        fallbacks = sum(stats['fallbacks'] for _, _, stats in outcomes if stats)
+        per_worker = (memory - server_memory) / args.workers
+        extra = f", server {server_memory:.0f} MB | {fallbacks} fallbacks" if path else ''
+        logger.info(f"{mode:<16}: {predictions / wall:8.0f} predictions/s | host PSS {memory:6.0f} MB "
+                    f"({per_worker:.0f} MB per worker{extra}) | sources {sources}")
+
+
+if __name__ == '__main__':
+    main()
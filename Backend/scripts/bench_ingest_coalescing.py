@@ -0,0 +1,139 @@
+'''
+Benchmark single-reading ingest with and without group commit (INGEST_COALESCE):
+concurrent clients POST one measurement per request to the measurements endpoint and
+the script reports throughput and latency percentiles for both modes.
+
+Runs in one process with a thread per client, like a threaded worker, against a
+throwaway SQLite file in WAL mode (commits are fsynced, as on a real server), or with
+--configured-db against the database of DJANGO_SETTINGS_MODULE (e.g. MySQL; it must be
+migrated, and bench users and patients are added to it). Absolute numbers depend on the
+database's commit cost; compare the two modes.
+
+Usage: python scripts/bench_ingest_coalescing.py [--clients 1 8 32] [--requests 200] [--wait-ms 2] [--max-batch 64] [--configured-db]
+'''
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.dev')
+
+import django
+from django.conf import settings
+
+# decided before django.setup(), which fixes the database
+CONFIGURED_DB = '--configured-db' in sys.argv
+if not CONFIGURED_DB:
+    DB_DIR = tempfile.mkdtemp(prefix='bench-ingest-')
+    settings.DATABASES = {'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(DB_DIR, 'db.sqlite3'),
+        'OPTIONS': {'timeout': 60, 'transaction_mode': 'IMMEDIATE', 'init_command': 'PRAGMA journal_mode=WAL;'},
+    }}
+settings.DEBUG = False
+settings.ALLOWED_HOSTS = ['*']
+django.setup()
+
+import numpy as np
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.users.models import User
+from apps.healthmonitor.models import Patient, Measurement
+from apps.healthmonitor import coalescer
+from apps.healthmonitor.ingest import _mysql_id_step
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def reading(rng):
+    return {
+        'heart_rate': int(rng.integers(50, 130)), 'spo2': int(rng.integers(90, 100)),
+        'systolic': int(rng.integers(95, 165)), 'diastolic': int(rng.integers(55, 100)),
+        'respiratory_rate': int(rng.integers(10, 26)), 'temperature': round(float(rng.uniform(36.0, 38.8)), 1),
+    }
+
+
+def run(targets, clients, requests_per_client):
+    """POST from `clients` threads at once; returns (wall seconds, latencies, failures)."""
+    latencies, failures = [], []
+    barrier = threading.Barrier(clients + 1)
+
+    def client(k):
+        token, patient_id = targets[k % len(targets)]
+        http = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = f'/api/health/patients/{patient_id}/measurements/'
+        rng = np.random.default_rng(k)
+        mine = []
+        barrier.wait()
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = http.post(url, reading(rng), content_type='application/json')
+            mine.append(time.perf_counter() - start)
+            if response.status_code != 201:
+                failures.append(response.status_code)
+        latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, np.array(latencies), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='Total POSTs per run')
+    parser.add_argument('--wait-ms', type=float, default=2.0, help='INGEST_COALESCE_MAX_WAIT_MS')
+    parser.add_argument('--max-batch', type=int, default=64, help='INGEST_COALESCE_MAX_BATCH')
+    parser.add_argument('--configured-db', action='store_true',
+                        help='Use the database of DJANGO_SETTINGS_MODULE instead of a throwaway SQLite file')
+    args = parser.parse_args()
+
+    if not CONFIGURED_DB:
+        call_command('migrate', verbosity=0)
+    run_id = time.strftime('%Y%m%d%H%M%S')
+    targets = []
+    for i in range(max(args.clients)):
+        user = User.objects.create_user(f'bench{run_id}_{i}', password='bench-password')
+        patient = Patient.objects.create(user=user, full_name=f'Bench {i}')
+        targets.append((str(AccessToken.for_user(user)), patient.id))
+    settings.INGEST_COALESCE_MAX_WAIT_MS = args.wait_ms
+    settings.INGEST_COALESCE_MAX_BATCH = args.max_batch
+    connection = connections['default']
+    if connection.features.can_return_rows_from_bulk_insert:
+        insert_path = 'bulk insert'
+    elif connection.vendor == 'mysql' and _mysql_id_step(connection) is not None:
+        insert_path = 'bulk insert, ids from LAST_INSERT_ID()'
+    else:
+        insert_path = 'one INSERT per row'
+    logger.info(f"database: {connection.vendor} {settings.DATABASES['default']['NAME']} | group insert: {insert_path}")
+
+    run(targets[:1], 1, 5)  # warm up: model load, first connections
+    for clients in args.clients:
+        for mode in ('per request', 'group commit'):
+            settings.INGEST_COALESCE = mode == 'group commit'
+            coalescer._coalescers.clear()
+            stored = Measurement.objects.count()
+            wall, latencies, failures = run(targets, clients, max(1, args.requests // clients))
+            stats = coalescer.get_coalescer().stats if settings.INGEST_COALESCE else None
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            groups = f" | {stats['measurements'] / max(stats['groups'], 1):5.1f} per group" if stats else ''
+            logger.info(f"{clients:>3} clients {mode:<12}: {len(latencies) / wall:7.1f} req/s | "
+                        f"p50 {p50:6.1f} ms p95 {p95:6.1f} ms p99 {p99:6.1f} ms | "
+                        f"{Measurement.objects.count() - stored} stored, {len(failures)} failed{groups}")
+
+
+if __name__ == '__main__':
+    main()
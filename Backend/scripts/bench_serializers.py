@@ -0,0 +1,101 @@
+'''
+Benchmark the measurement list read path: DRF MeasurementSerializer + JSONRenderer
+versus MeasurementRowSerializer (values_list + row shaping) + FastJSONRenderer.
+Runs against a throwaway in-memory SQLite database.
+
+Usage: python scripts/bench_serializers.py [--sizes 1000 10000 100000] [--repeat 3]
+'''
+import os
+import sys
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.dev')
+
+import django
+from django.conf import settings
+
+settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+django.setup()
+
+import numpy as np
+from django.core.management import call_command
+from rest_framework.renderers import JSONRenderer
+
+from apps.users.models import User
+from apps.healthmonitor.models import Patient, Measurement, Prediction
+from apps.healthmonitor.serializers import MeasurementSerializer, MeasurementRowSerializer
+from apps.healthmonitor.renderers import FastJSONRenderer, HAS_ORJSON
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def populate(patient, n, rng):
+    measurements = [
+        Measurement(patient=patient, heart_rate=float(hr), spo2=float(sp), systolic=float(sy),
+                    diastolic=float(di), respiratory_rate=float(rr), temperature=float(t))
+        for hr, sp, sy, di, rr, t in zip(rng.integers(50, 130, n), rng.integers(88, 100, n),
+                                         rng.integers(90, 170, n), rng.integers(50, 100, n),
+                                         rng.integers(10, 26, n), np.round(rng.uniform(36, 39, n), 1))
+    ]
+    Measurement.objects.bulk_create(measurements, batch_size=2000)
+    scores = np.round(rng.uniform(0, 1, n), 3)
+    Prediction.objects.bulk_create(
+        [Prediction(measurement=m, risk_score=float(s), risk_label='low') for m, s in zip(measurements, scores)],
+        batch_size=2000)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user('bench', password='bench-password')
+    rng = np.random.default_rng(42)
+    logger.info(f"orjson available: {HAS_ORJSON}")
+
+    loaded = 0
+    for size in sorted(args.sizes):
+        patient = Patient.objects.create(user=user, full_name=f'Bench {size}')
+        populate(patient, size, rng)
+        loaded += size
+        qs = Measurement.objects.filter(patient=patient).order_by('id')
+
+        def current():
+            # what the list view did before: no select_related, one prediction query per row
+            return JSONRenderer().render(MeasurementSerializer(qs, many=True).data)
+
+        def current_joined():
+            return JSONRenderer().render(MeasurementSerializer(qs.select_related('prediction'), many=True).data)
+
+        def fast():
+            return FastJSONRenderer().render(MeasurementRowSerializer().many(qs))
+
+        repeat = 1 if size >= 100000 else args.repeat
+        results = {
+            'serializer': best_of(current, repeat),
+            'serializer+select_related': best_of(current_joined, repeat),
+            'row serializer': best_of(fast, repeat),
+        }
+        logger.info(f"{size:>7} rows: " + " | ".join(
+            f"{name} {t * 1000:8.1f} ms" for name, t in results.items()))
+        logger.info(f"{'':>7}       speedup vs serializer+select_related: "
+                    f"{results['serializer+select_related'] / results['row serializer']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
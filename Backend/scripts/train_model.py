@@ -15,12 +15,16 @@ from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import joblib
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from core.drift import HistogramSketch
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Use medical_training_dataset_5000.csv from data folder
 DATA_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'medical_training_dataset_5000.csv')
 MODEL_OUT = os.path.join(os.path.dirname(__file__), '..', 'model.pkl')
+DRIFT_REFERENCE_OUT = os.path.join(os.path.dirname(__file__), '..', 'drift_reference.npz')
 
 FEATURE_COLS = ['heart_rate', 'spo2', 'systolic', 'diastolic', 'respiratory_rate', 'temperature']
 TARGET_COL = 'risk_score'
@@ -100,6 +104,13 @@ def train_and_evaluate(model, X_train, X_test, y_train, y_test):
     
     return train_r2, test_r2, train_mae, test_mae
 
+def save_drift_reference(X_train, path=DRIFT_REFERENCE_OUT):
+    """Histogram sketch of the training inputs; serving drift is measured against it"""
+    sketch = HistogramSketch(FEATURE_COLS)
+    sketch.update_many(X_train.to_numpy(dtype=np.float64))
+    sketch.save(path)
+    logger.info(f"✓ Drift reference sketch saved to {path}")
+
 def main():
     logger.info("Starting model training pipeline...")
     
@@ -119,6 +130,7 @@ def main():
     # Save model
     joblib.dump(model, MODEL_OUT)
     logger.info(f"✓ Model saved to {MODEL_OUT}")
+    save_drift_reference(X_train)
     
     # Quick sanity check
     sample_features = X_test.iloc[0:1]